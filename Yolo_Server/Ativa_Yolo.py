@@ -1,15 +1,87 @@
-import os
 import time
-from track_yolo import run_recognize
-from li import log_interpreter
-from api_gpt import callOpenAI
+
+_inicio_import = time.perf_counter()
+
+import os
+import gc
+import sys
+import json
+import queue
+import argparse
+import threading
+import subprocess
+import multiprocessing as mp
+from exportar_modelo import preparar_backend, BACKEND, INT8
+from inferencia_roi import caminho_regioes, carregar_regioes
+from li import SceneAnalyzer
+from sessoes_video import caminho_segmento, ler_segmento, AnalisadorTrecho, juntar_trecho, juntar_atrasados
+from jogadas import analisar_cena, MODO_ANALISE
+from fila_jobs import iniciar_servidor_jobs, dentro_da_pasta
+import metricas
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog é opcional: sem ele a pasta é varrida periodicamente
+    Observer = None
+
+# track_yolo (cv2) e ultralytics (torch) só são importados onde o modelo
+# é usado, então o processo principal sobe em frações de segundo
+TEMPO_IMPORT = time.perf_counter() - _inicio_import
 
 PASTA_VIDEOS = r"./uploads/"  # <- ALTERE AQUI
+PASTA_JOBS = r"./jobs/"       # cada job ganha sua própria subpasta aqui
 
-INTERVALO_VERIFICACAO = 5  # em segundos, tempo entre varreduras
+INTERVALO_VERIFICACAO = 5  # em segundos, tempo entre varreduras (só sem watchdog)
 TEMPO_ESPERA_ARQUIVO = 2   # segundos para verificar se o arquivo terminou de ser escrito
 NUM_CHECAGENS_TAMANHO = 3  # quantas vezes conferir se o tamanho estabilizou
 
+MODEL_PATH = os.getenv("YOLO_MODELO")  # None = caminho padrão de track_yolo
+THREADS_POR_WORKER = 2     # threads do torch em cada worker
+NUM_WORKERS = max(1, (os.cpu_count() or 1) // THREADS_POR_WORKER)
+TAMANHO_LOTE = 8           # frames por chamada do detector (1 = model.track frame a frame)
+GUARDAR_LOG = False        # grava também o log_output.ylog de cada job (ver log_colunar)
+USAR_REGIOES = True        # detecção só nas regiões de movimento mandadas pelo cliente (ver inferencia_roi)
+
+# Frames quase iguais ao último inferido repetem as detecções dele (ver
+# cache_frames; None = todo frame amostrado passa pelo detector)
+CACHE_FRAMES = {
+    "limiar": 6.0,             # maior diferença de cinza numa célula da miniatura 32x32
+    "max_repetidos": 30,       # repetições seguidas antes de inferir de novo
+}
+
+# Backend de inferência: "pytorch", "onnx" ou "openvino" (env YOLO_BACKEND),
+# em INT8 com YOLO_INT8=1. A primeira exportação INT8 calibra com os vídeos
+# (ou imagens) desta pasta.
+PASTA_CALIBRACAO = os.getenv("YOLO_CALIBRACAO")
+
+# Amostragem adaptativa dos frames que vão para o modelo (None = todos os frames)
+AMOSTRAGEM = {
+    "taxa_min": 0.25,          # em cena parada, 1 a cada 4 frames
+    "taxa_max": 1.0,           # com movimento, todos os frames
+    "limiar_movimento": 0.1,   # deslocamento relativo ao tamanho da caixa
+    "frames_estaveis": 3,
+}
+
+# Início quente: o processo principal carrega e aquece o modelo uma vez e
+# os workers nascem dele por fork, já com o modelo (pesos compartilhados
+# por cópia sob escrita). Só com backend pytorch e onde há fork; senão
+# cada worker carrega o seu (início frio).
+INICIO_QUENTE = os.getenv("YOLO_INICIO_QUENTE", "1") == "1"
+
+# Modelo carregado uma vez por processo worker (ver _inicializar_worker),
+# ou herdado do processo principal no início quente
+_modelo = None
+_tempos_inicio = {}   # tempos de início deste processo (ver medir_inicio)
+_primeira_inferencia = None
+
+# Somados entre o processo principal e os workers no /metrics do HTTP_listener
+JOBS_NA_FILA = metricas.medidor("jobs_na_fila", "Jobs entregues ao pool que nenhum worker pegou ainda.")
+JOBS_EM_EXECUCAO = metricas.medidor("jobs_em_execucao", "Jobs sendo processados pelos workers.")
+JOB_ESPERA = metricas.histograma("job_espera_segundos", "Tempo entre o fim do upload e um worker pegar o job.")
+JOB_DURACAO = metricas.histograma("job_duracao_segundos", "Tempo de processamento de um job no worker.")
+JOBS = metricas.contador("jobs_total", "Jobs processados por resultado.", rotulos=("resultado",))
+
 
 def arquivo_pronto(caminho_arquivo: str) -> bool:
     """
@@ -36,28 +108,170 @@ def arquivo_pronto(caminho_arquivo: str) -> bool:
     return False
 
 
-def enviar_arquivo(caminho_arquivo: str) -> bool:
+def _carregar_modelo(model_path, backend, int8, threads=THREADS_POR_WORKER):
+    """
+    Importa torch/ultralytics e carrega + aquece o modelo neste processo.
+    Retorna (modelo, tempos) com os segundos de "imports", "modelo" e
+    "primeira_inferencia".
+    """
+    inicio = time.perf_counter()
+    import torch
+    torch.set_num_threads(threads)
+    from track_yolo import carregar_modelo
+    importar = time.perf_counter() - inicio
+
+    tempos = {}
+    modelo = carregar_modelo(model_path, backend=backend, int8=int8, tempos=tempos)
+    tempos["imports"] = tempos.get("imports", 0.0) + importar
+    return modelo, tempos
+
+
+def _inicializar_worker(model_path, backend="pytorch", int8=False):
+    """
+    Roda uma vez em cada processo do pool: carrega e aquece o modelo,
+    que fica vivo para todos os jobs daquele worker. No início quente o
+    modelo já veio do processo principal e não há o que carregar.
+    """
+    global _modelo, _tempos_inicio
+
+    inicio = time.perf_counter()
+    metricas.registro.zerar()
+
+    if _modelo is None:
+        _modelo, _tempos_inicio = _carregar_modelo(model_path, backend, int8)
+        origem = "carregado"
+    else:
+        import torch
+        torch.set_num_threads(THREADS_POR_WORKER)
+        _tempos_inicio = {}
+        origem = "herdado do processo principal"
+    _tempos_inicio["origem"] = origem
+    _tempos_inicio["pronto"] = time.perf_counter() - inicio
+
+    metricas.iniciar_exportacao()
+    print(f"[INICIO] Worker {os.getpid()} pronto em {_tempos_inicio['pronto']:.2f}s (modelo {origem})")
+
+
+def criar_pool(quente=INICIO_QUENTE, workers=NUM_WORKERS):
+    """
+    Cria o pool de workers. No início quente, carrega e aquece o modelo
+    aqui antes do fork. Retorna (pool, tempos do processo principal).
+    """
+    global _modelo
+
+    tempos = {}
+    quente = quente and BACKEND == "pytorch" and "fork" in mp.get_all_start_methods()
+    if quente:
+        # Aquecido com uma thread só: o pool de threads do OpenMP não
+        # sobrevive ao fork, e um filho de um pai que já o usou trava na
+        # primeira inferência. Cada worker ajusta as suas threads depois.
+        _modelo, tempos = _carregar_modelo(MODEL_PATH, BACKEND, INT8, threads=1)
+        # Tira os objetos já existentes das varreduras do coletor, que
+        # escreveriam nas páginas compartilhadas e forçariam cópias
+        gc.freeze()
+        contexto = mp.get_context("fork")
+    else:
+        contexto = mp.get_context()
+
+    print(f"[INICIO] Início {'quente' if quente else 'frio'}: {workers} worker(s)")
+    tempos["modo"] = "quente" if quente else "frio"
+    pool = contexto.Pool(workers, initializer=_inicializar_worker, initargs=(MODEL_PATH, BACKEND, INT8))
+    return pool, tempos
+
+
+def preparar_job(caminho_video: str) -> str:
     """
-    Envia o arquivo .mp4 para a URL_DESTINO via HTTP POST.
-    Retorna True se deu certo (status 2xx), False caso contrário.
+    Cria a pasta de trabalho do job e move o vídeo (e as regiões de
+    movimento e os dados do trecho, se o cliente mandou) para dentro dela.
+    Mover tira o arquivo de PASTA_VIDEOS, então ele não é pego de novo
+    na próxima varredura nem sobrescrito por um novo upload.
+    Retorna o caminho do vídeo dentro da pasta do job.
     """
-    nome_arquivo = os.path.basename(caminho_arquivo)
-    print(f"Enviando arquivo: {nome_arquivo}")
+    nome = os.path.splitext(os.path.basename(caminho_video))[0]
+    pasta_job = os.path.join(PASTA_JOBS, f"{nome}_{time.time_ns()}")
+    os.makedirs(pasta_job, exist_ok=True)
 
+    destino = os.path.join(pasta_job, os.path.basename(caminho_video))
+    for caminho in (caminho_regioes, caminho_segmento):
+        if os.path.exists(caminho(caminho_video)):
+            os.replace(caminho(caminho_video), caminho(destino))
+    os.replace(caminho_video, destino)
+    return destino
+
+
+def processar_job(caminho_video: str):
+    """
+    Roda tracking, interpretação do log e análise das jogadas
+    para um vídeo. Todos os arquivos do job ficam na pasta do vídeo.
+    Se o vídeo é um trecho de uma sessão (ver sessoes_video), os objetos
+    de cada frame voltam no resumo para entrar na linha do tempo dela.
+    Executa dentro de um worker do pool.
+    """
+    from track_yolo import run_recognize
+
+    pasta_job = os.path.dirname(caminho_video)
+    log_path = os.path.join(pasta_job, "log_output.ylog")
+    cena_path = os.path.join(pasta_job, "scene_description.json")
+
+    inicio = time.time()
+    estatisticas = {}
+    segmento = ler_segmento(caminho_video)
+    # A cena é analisada durante o tracking, frame a frame
+    analisador = AnalisadorTrecho() if segmento else SceneAnalyzer()
+    JOBS_EM_EXECUCAO.inc()
     try:
-        with open(caminho_arquivo, "rb") as f:
-            files = {"file": (nome_arquivo, f, "video/mp4")}
-            run_recognize()
-            print("passou")
-            log_interpreter("./log_output.json", "./scene_description.json")
+        run_recognize(caminho_video, log_path if GUARDAR_LOG else None, model=_modelo,
+                      tamanho_lote=TAMANHO_LOTE, amostragem=AMOSTRAGEM,
+                      estatisticas=estatisticas, analisador=analisador,
+                      regioes=carregar_regioes(caminho_video) if USAR_REGIOES else None,
+                      cache=CACHE_FRAMES)
+    except Exception:
+        JOBS.inc(resultado="erro")
+        raise
+    finally:
+        JOBS_EM_EXECUCAO.dec()
+    tempos = {"tracking": time.time() - inicio}
 
-            callOpenAI()
-            return True
+    marca = time.time()
+    analisador.save(cena_path)
+    tempos["cena"] = time.time() - marca
 
+    resposta = None
+    if MODO_ANALISE != "llm":
+        marca = time.time()
+        resposta = analisar_cena(cena_path, modo="local")
+        tempos["jogadas"] = time.time() - marca
 
-    except Exception as e:
-        print(f"✗ Exceção ao enviar {nome_arquivo}: {e}")
-        return False
+    JOB_DURACAO.observar(time.time() - inicio)
+    JOBS.inc(resultado="ok")
+    return {
+        "video": caminho_video,
+        "cena": cena_path,
+        "frames_com_objetos": analisador.frames,
+        "duracao": time.time() - inicio,
+        "tempos": tempos,
+        "estatisticas": estatisticas,
+        "ok": resposta is not None,
+        "segmento": segmento,
+        "quadros": analisador.quadros if segmento else None,
+        # A chamada ao modelo de linguagem fica com o processo principal,
+        # para o worker já pegar o próximo vídeo
+        "analisar_llm": resposta is None and MODO_ANALISE != "local",
+    }
+
+
+def _job_do_pool(caminho_video: str, pronto_em: float):
+    """
+    Entrada do job no worker: tira o job da fila nas métricas e mede
+    quanto ele esperou desde o upload.
+    """
+    JOBS_NA_FILA.dec()
+    JOB_ESPERA.observar(max(0.0, time.time() - pronto_em))
+    return processar_job(caminho_video)
+
+
+# Jobs concluídos pelo pool, à espera de _pos_processar
+_concluidos = queue.Queue()
 
 
 def remover_arquivo(caminho_arquivo: str) -> None:
@@ -65,48 +279,315 @@ def remover_arquivo(caminho_arquivo: str) -> None:
     Remove o arquivo do disco.
     """
     try:
-        os.remove("uploads\saida.mp4")
-        print(f"\nArquivo uploads\saida.mp4' removido com sucesso!")
+        os.remove(caminho_arquivo)
+        print(f"\nArquivo {caminho_arquivo} removido com sucesso!")
     except Exception as e:
         print(f"\nErro ao remover arquivo: {e}")
 
 
-def monitorar_pasta():
-    print(f"Monitorando pasta: {PASTA_VIDEOS}")
+def _job_concluido(resumo):
+    """
+    Callback do pool: roda na thread de resultados do pool, que para de
+    entregar os demais resultados se uma exceção escapar daqui. Só repassa
+    o resumo para a thread de _pos_processar.
+    """
+    _concluidos.put(resumo)
+
+
+def _pos_processar():
+    """
+    Thread que junta o trecho, chama o modelo de linguagem e remove o vídeo
+    de cada job concluído; um erro num job não derruba os seguintes. Sem
+    jobs chegando, pula as lacunas vencidas das sessões (trechos que não
+    chegaram, ver sessoes_video).
+    """
+    while True:
+        try:
+            resumo = _concluidos.get(timeout=INTERVALO_VERIFICACAO)
+        except queue.Empty:
+            try:
+                juntar_atrasados()
+            except Exception as e:
+                print(f"✗ Erro ao juntar trechos atrasados: {e}")
+            continue
+        try:
+            _finalizar_job(resumo)
+        except Exception as e:
+            print(f"✗ Erro ao finalizar job {resumo.get('video')}: {e}")
+
+
+def _finalizar_job(resumo):
+    print(
+        f"[JOB] {resumo['video']} concluído em {resumo['duracao']:.2f}s "
+        f"({resumo['frames_com_objetos']} frames com objetos)"
+    )
+    if resumo.get("segmento"):
+        juntar_trecho(resumo["segmento"], resumo["quadros"])
+    estatisticas = resumo["estatisticas"]
+    print(
+        f"[JOB]   frames inferidos: {estatisticas.get('frames_inferidos', 0)} "
+        f"de {estatisticas.get('frames_decodificados', 0)} decodificados"
+    )
+    for nome, estagio in estatisticas.get("estagios", {}).items():
+        print(f"[JOB]   {nome}: {estagio['fps']:.1f} fps ({estagio['tempo']:.2f}s ocupado)")
+
+    if resumo["analisar_llm"]:
+        from api_gpt import enviar_para_llm
+
+        print(f"[JOB] {resumo['video']}: aguardando o modelo de linguagem")
+        enviar_para_llm(resumo["cena"]).add_done_callback(
+            lambda futuro: _analise_llm_concluida(resumo, futuro)
+        )
+    elif resumo["ok"]:
+        remover_arquivo(resumo["video"])
+
 
+def _analise_llm_concluida(resumo, futuro):
+    """
+    Roda na thread do cliente do modelo de linguagem quando a resposta chega.
+    """
+    try:
+        content = futuro.result()
+    except Exception as e:
+        print(f"✗ Erro ao chamar a API para {resumo['video']}: {e}")
+        return
+
+    print(f"[JOB] Resposta do modelo para {resumo['video']}:")
+    print(content)
+    remover_arquivo(resumo["video"])
+
+
+def _job_falhou(e):
+    print(f"✗ Exceção ao processar job: {e}")
+
+
+def _aguardar_e_enfileirar(caminho_video: str, fila) -> None:
+    """
+    Para arquivos colocados na pasta à mão: espera o tamanho estabilizar
+    antes de virar job.
+    """
+    if arquivo_pronto(caminho_video):
+        fila.put({"video": caminho_video, "pronto_em": time.time()})
+    else:
+        print(f"Arquivo ainda sendo escrito, pulando por enquanto: {caminho_video}")
+
+
+def _varrer_pasta(fila) -> None:
+    """
+    Fallback sem watchdog: varre PASTA_VIDEOS a cada INTERVALO_VERIFICACAO.
+    """
     while True:
         try:
-            # Varre todos os arquivos na pasta
             for entrada in os.scandir(PASTA_VIDEOS):
-                if not entrada.is_file():
-                    continue
+                if entrada.is_file() and entrada.name.lower().endswith(".mp4"):
+                    _aguardar_e_enfileirar(entrada.path, fila)
+        except Exception as e:
+            print(f"Erro ao varrer a pasta: {e}")
+        time.sleep(INTERVALO_VERIFICACAO)
+
+
+def iniciar_observador(fila):
+    """
+    Observa PASTA_VIDEOS por vídeos criados ou renomeados para .mp4
+    (uploads do HTTP_listener chegam por aviso direto; isto cobre os
+    arquivos colocados à mão). Sem watchdog, cai na varredura periódica.
+    """
+    if Observer is None:
+        print(f"watchdog não instalado; varrendo a pasta a cada {INTERVALO_VERIFICACAO}s")
+        threading.Thread(target=_varrer_pasta, args=(fila,), daemon=True).start()
+        return None
+
+    class _NovoVideo(FileSystemEventHandler):
+        def _verificar(self, caminho):
+            if caminho.lower().endswith(".mp4"):
+                threading.Thread(target=_aguardar_e_enfileirar, args=(caminho, fila), daemon=True).start()
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self._verificar(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self._verificar(event.dest_path)
+
+    observador = Observer()
+    observador.schedule(_NovoVideo(), PASTA_VIDEOS, recursive=False)
+    observador.start()
+    return observador
+
+
+def despachar_job(pool, mensagem) -> None:
+    """
+    Move o vídeo para a pasta do job e entrega ao pool.
+    Se o vídeo já foi pego (aviso duplicado do HTTP e do observador),
+    não faz nada. Vídeos fora de PASTA_VIDEOS são recusados.
+    """
+    if not dentro_da_pasta(mensagem["video"], PASTA_VIDEOS):
+        print(f"✗ Job recusado, vídeo fora de {PASTA_VIDEOS}: {mensagem['video']}")
+        return
+
+    try:
+        caminho_job = preparar_job(mensagem["video"])
+    except FileNotFoundError:
+        return
+
+    pronto_em = mensagem.get("pronto_em", time.time())
+    latencia = (time.time() - pronto_em) * 1000
+    print(f"[JOB] Enfileirado: {caminho_job} ({latencia:.1f} ms após o upload)")
+    JOBS_NA_FILA.inc()
+    pool.apply_async(
+        _job_do_pool,
+        (caminho_job, pronto_em),
+        callback=_job_concluido,
+        error_callback=_job_falhou,
+    )
 
-                if not entrada.name.lower().endswith(".mp4"):
-                    continue
 
-                caminho_video = entrada.path
+def monitorar_pasta():
+    print(f"Monitorando pasta: {PASTA_VIDEOS}")
+    print(f"Iniciando {NUM_WORKERS} worker(s) YOLO...")
+
+    os.makedirs(PASTA_VIDEOS, exist_ok=True)
+    os.makedirs(PASTA_JOBS, exist_ok=True)
+    metricas.limpar_pasta()
+    metricas.iniciar_exportacao()
+
+    if BACKEND != "pytorch":
+        # Exporta aqui, uma vez, antes de os workers procurarem o artefato
+        from track_yolo import caminhos_padrao
+        model_path = MODEL_PATH or caminhos_padrao()[0]
+        preparar_backend(model_path, BACKEND, INT8, calibracao=PASTA_CALIBRACAO)
 
-                # Verificar se o arquivo terminou de ser escrito
-                if not arquivo_pronto(caminho_video):
-                    print(f"Arquivo ainda sendo escrito, pulando por enquanto: {entrada.name}")
-                    continue
+    pool, _ = criar_pool()
+    threading.Thread(target=_pos_processar, daemon=True).start()
 
-                # Tenta enviar
-                if enviar_arquivo(caminho_video):
-                    # Se deu certo, remove
-                    remover_arquivo(caminho_video)
+    if MODO_ANALISE != "local":
+        # Cria já o cliente do modelo de linguagem, para o primeiro job não esperar por ele
+        from api_gpt import cliente_llm
+        cliente_llm()
+
+    fila = queue.Queue()
+    iniciar_servidor_jobs(fila, PASTA_VIDEOS)
+    observador = iniciar_observador(fila)
+
+    # Vídeos que já estavam na pasta antes de o monitor subir
+    if observador is not None:
+        for entrada in os.scandir(PASTA_VIDEOS):
+            if entrada.is_file() and entrada.name.lower().endswith(".mp4"):
+                threading.Thread(target=_aguardar_e_enfileirar, args=(entrada.path, fila), daemon=True).start()
+
+    while True:
+        try:
+            # timeout curto para o Ctrl+C ser atendido também no Windows
+            try:
+                mensagem = fila.get(timeout=1)
+            except queue.Empty:
+                continue
 
-            # Espera um pouco antes da próxima varredura
-            time.sleep(INTERVALO_VERIFICACAO)
+            despachar_job(pool, mensagem)
 
         except KeyboardInterrupt:
             print("\nEncerrando monitoramento...")
+            if observador is not None:
+                observador.stop()
+            pool.terminate()
             break
         except Exception as e:
             print(f"Erro no loop de monitoramento: {e}")
-            # Evita travar o script por um erro isolado
-            time.sleep(INTERVALO_VERIFICACAO)
+
+    pool.join()
+
+
+def _memoria_mb():
+    """
+    Memória deste processo (Linux): RSS e a parte privada, que não é
+    compartilhada com o processo principal nem com os outros workers.
+    """
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            campos = dict(linha.split(":", 1) for linha in f if ":" in linha)
+    except OSError:
+        return None
+    kb = {nome: int(campos[nome].split()[0]) for nome in ("Rss", "Private_Clean", "Private_Dirty") if nome in campos}
+    return {"rss": kb.get("Rss", 0) / 1024,
+            "privada": (kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) / 1024}
+
+
+def _estado_worker(_):
+    """
+    Tarefa de medida: a primeira chamada em cada worker faz uma inferência
+    num frame preto (a primeira de um job de verdade) e mede o tempo.
+    """
+    global _primeira_inferencia
+
+    import numpy as np
+
+    if _primeira_inferencia is None:
+        inicio = time.perf_counter()
+        _modelo.predict(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+        _primeira_inferencia = time.perf_counter() - inicio
+    time.sleep(0.2)  # dá tempo de os outros workers pegarem as próximas tarefas
+    return {"pid": os.getpid(), **_tempos_inicio, "inferencia_job": _primeira_inferencia,
+            "memoria_mb": _memoria_mb()}
+
+
+def medir_inicio(quente, workers=NUM_WORKERS):
+    """
+    Sobe o pool, espera todos os workers responderem e devolve os tempos
+    de início: import deste módulo, processo principal, cada worker e o
+    tempo até o pool inteiro ficar pronto.
+    """
+    inicio = time.perf_counter()
+    pool, principal = criar_pool(quente, workers)
+
+    estados = {}
+    while len(estados) < workers:
+        for estado in pool.map(_estado_worker, range(workers), chunksize=1):
+            estados.setdefault(estado["pid"], estado)
+    pronto = time.perf_counter() - inicio
+    pool.terminate()
+    pool.join()
+
+    principal["memoria_mb"] = _memoria_mb()
+    return {"modo": principal.pop("modo"), "import_modulo": TEMPO_IMPORT, "principal": principal,
+            "workers": list(estados.values()), "pool_pronto": pronto}
+
+
+def imprimir_inicio(relatorio):
+    def seg(valor):
+        return f"{valor:6.2f}s" if valor is not None else "     -"
+
+    print(f"\n[INICIO] modo {relatorio['modo']}: pool pronto em {relatorio['pool_pronto']:.2f}s "
+          f"(import do Ativa_Yolo {relatorio['import_modulo']:.2f}s)")
+    linhas = [("principal", relatorio["principal"])] + [(f"worker {w['pid']}", w) for w in relatorio["workers"]]
+    print(f"{'':16} {'imports':>8} {'modelo':>8} {'1ª inf.':>8} {'pronto':>8} {'inf. job':>8} {'RSS MB':>8} {'priv. MB':>8}")
+    for nome, t in linhas:
+        memoria = t.get("memoria_mb") or {}
+        print(f"{nome:16} {seg(t.get('imports')):>8} {seg(t.get('modelo')):>8} "
+              f"{seg(t.get('primeira_inferencia')):>8} {seg(t.get('pronto')):>8} {seg(t.get('inferencia_job')):>8} "
+              f"{memoria.get('rss', 0):8.0f} {memoria.get('privada', 0):8.0f}")
 
 
 if __name__ == "__main__":
-    monitorar_pasta()
+    parser = argparse.ArgumentParser(description="Monitora a pasta de uploads e processa os vídeos no pool de workers.")
+    parser.add_argument("--relatorio-inicio", choices=("frio", "quente", "ambos"),
+                        help="só mede o tempo de início do pool (imports, modelo, primeira inferência) e sai")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="workers do pool no --relatorio-inicio")
+    parser.add_argument("--json", action="store_true", help="com --relatorio-inicio, imprime o resultado em JSON")
+    args = parser.parse_args()
+
+    if args.relatorio_inicio == "ambos":
+        # Cada modo num processo novo, para nenhum herdar imports do outro
+        for modo in ("frio", "quente"):
+            saida = subprocess.run([sys.executable, os.path.abspath(__file__), "--relatorio-inicio", modo,
+                                    "--workers", str(args.workers), "--json"],
+                                   capture_output=True, text=True, check=True).stdout
+            imprimir_inicio(json.loads(saida.strip().splitlines()[-1]))
+    elif args.relatorio_inicio:
+        relatorio = medir_inicio(args.relatorio_inicio == "quente", args.workers)
+        if args.json:
+            print(json.dumps(relatorio))
+        else:
+            imprimir_inicio(relatorio)
+    else:
+        monitorar_pasta()
@@ -1,6 +1,22 @@
 import os
-from flask import Flask, request, jsonify
+import re
+import time
+import uuid
+import argparse
+from flask import Flask, Response, request, jsonify
 from werkzeug.utils import secure_filename
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from fila_jobs import enviar_job
+from inferencia_roi import caminho_regioes
+from sessoes_video import gravar_segmento
+import sessoes_stream
+import uploads_retomaveis
+import metricas
+
+try:
+    from waitress import serve
+except ImportError:  # waitress é opcional: sem ele usa o servidor do Flask com threads
+    serve = None
 
 # Pasta onde os vídeos serão salvos
 UPLOAD_FOLDER = "uploads"
@@ -9,38 +25,207 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Tamanho máximo do upload (ex.: 500 MB)
 MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500 MB
 
+# Bytes lidos do corpo da requisição por vez; é o que fica em memória por upload
+TAMANHO_BLOCO = 1024 * 1024  # 1 MB
+MAX_CAMPO_TEXTO = 64 * 1024  # campos de formulário que não são arquivo
+
+# O waitress recebe o corpo inteiro antes de chamar o app: até
+# inbuf_overflow bytes em memória, o resto num arquivo temporário. Então
+# em produção o upload não é processado enquanto chega (o servidor do
+# Flask, --dev, entrega aos poucos); o que se garante é a memória por
+# upload limitada a um bloco, e corpos acima de MAX_CONTENT_LENGTH
+# recusados pelo próprio waitress, antes de ocupar o disco.
+OPCOES_WAITRESS = {
+    "max_request_body_size": MAX_CONTENT_LENGTH,
+    "inbuf_overflow": TAMANHO_BLOCO,
+}
+
+UPLOAD_BYTES = metricas.contador("upload_bytes_total", "Bytes de vídeo recebidos em /upload.")
+UPLOAD_DURACAO = metricas.histograma("upload_duracao_segundos", "Tempo para receber e gravar um upload.")
+UPLOAD_VAZAO = metricas.histograma("upload_vazao_bytes_por_segundo", "Vazão de cada upload.",
+                                   baldes=metricas.BALDES_BYTES_S)
+
+# Content-Range de um pedaço de upload retomável: "bytes inicio-fim/total"
+FAIXA = re.compile(r"bytes (\d+)-(\d+)/(\d+)$")
+
 app = Flask(__name__)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
 
 
-@app.route("/upload", methods=["POST"])
-def upload_video():
-    # Verifica se o campo "video" está na requisição
-    if "video" not in request.files:
-        return jsonify({"erro": 'Nenhum arquivo enviado. Use o campo "video".'}), 400
+class ErroUpload(Exception):
+    """
+    Upload rejeitado; a mensagem vai para o cliente com status 400.
+    """
 
-    file = request.files["video"]
 
-    # Verifica se o arquivo tem nome
-    if file.filename == "":
-        return jsonify({"erro": "Arquivo sem nome."}), 400
+def _descartar(abertos):
+    for caminho, arquivo in abertos.values():
+        arquivo.close()
+        os.remove(caminho)
 
-    # Verifica se é .mp4
-    if not file.filename.lower().endswith(".mp4"):
-        return jsonify({"erro": "Apenas arquivos .mp4 são aceitos."}), 400
 
-    # Garante que o nome do arquivo é seguro
-    filename = secure_filename(file.filename)
+def receber_multipart(stream, boundary, campo_arquivo, pasta_destino, campos_extras=()):
+    """
+    Lê o corpo multipart em blocos de TAMANHO_BLOCO e grava o campo
+    campo_arquivo direto num arquivo temporário em pasta_destino, sem
+    guardar o upload inteiro em memória. Os arquivos dos campos em
+    campos_extras (ex.: as regiões de movimento) vão para temporários
+    próprios. Multipart malformado ou incompleto levanta ErroUpload.
+    Atrás do waitress (ver OPCOES_WAITRESS) o corpo já chegou inteiro
+    quando esta função roda; a leitura em blocos limita a memória, não o
+    tempo até o app começar.
+    Retorna (campos_texto, nome_original, caminho_temporario, extras),
+    com extras = {campo: caminho_temporario}.
+    """
+    # O limite do decoder vale para o buffer interno dele, que recebe um
+    # bloco inteiro de cada vez; o limite dos campos de texto é conferido abaixo
+    decoder = MultipartDecoder(boundary, max_form_memory_size=TAMANHO_BLOCO + MAX_CAMPO_TEXTO)
+    campos = {}
+    nome_original = None
+    abertos = {}  # campo -> (caminho temporário, arquivo)
+    destino = None
+    parte = None
+    texto = []
+
+    try:
+        while True:
+            bloco = stream.read(TAMANHO_BLOCO)
+            decoder.receive_data(bloco or None)
+
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, Field):
+                    parte = event
+                    texto = []
+                    destino = None
+                elif isinstance(event, File):
+                    parte = event
+                    destino = None
+                    if event.name == campo_arquivo and campo_arquivo not in abertos:
+                        nome_original = event.filename or ""
+                        if nome_original == "":
+                            raise ErroUpload("Arquivo sem nome.")
+                        if not nome_original.lower().endswith(".mp4"):
+                            raise ErroUpload("Apenas arquivos .mp4 são aceitos.")
+                    if event.name not in abertos and (event.name == campo_arquivo or event.name in campos_extras):
+                        caminho = os.path.join(pasta_destino, f"{uuid.uuid4().hex}.part")
+                        abertos[event.name] = (caminho, open(caminho, "wb"))
+                        destino = abertos[event.name][1]
+                elif isinstance(event, Data):
+                    if isinstance(parte, Field):
+                        texto.append(event.data)
+                        if sum(len(t) for t in texto) > MAX_CAMPO_TEXTO:
+                            raise ErroUpload(f'Campo "{parte.name}" grande demais.')
+                        if not event.more_data:
+                            campos[parte.name] = b"".join(texto).decode("utf-8", "replace")
+                    elif destino is not None:
+                        destino.write(event.data)
+
+                event = decoder.next_event()
+
+            if isinstance(event, Epilogue):
+                break
+            if not bloco:
+                raise ErroUpload("Corpo multipart incompleto.")
+    except ValueError as e:
+        # O decoder levanta ValueError para multipart malformado
+        _descartar(abertos)
+        raise ErroUpload(f"Corpo multipart inválido: {e}") from e
+    except Exception:
+        _descartar(abertos)
+        raise
+
+    for _, arquivo in abertos.values():
+        arquivo.close()
+
+    if campo_arquivo not in abertos:
+        for caminho, _ in abertos.values():
+            os.remove(caminho)
+        raise ErroUpload(f'Nenhum arquivo enviado. Use o campo "{campo_arquivo}".')
+
+    temp_path = abertos.pop(campo_arquivo)[0]
+    extras = {campo: caminho for campo, (caminho, _) in abertos.items()}
+    return campos, nome_original, temp_path, extras
+
+
+def validar_segmento(campos):
+    """
+    Trecho de uma sessão gravada em partes (ver sessoes_video): campos
+    "sessao", "seq" e "inicio" (segundos desde o começo da sessão).
+    Retorna (sessao, seq, inicio), ou None se o vídeo é avulso.
+    """
+    if "sessao" not in campos:
+        return None
+    try:
+        segmento = (secure_filename(str(campos["sessao"])), int(campos["seq"]), float(campos["inicio"]))
+        if not segmento[0] or segmento[1] < 0:
+            raise ValueError
+    except (KeyError, ValueError, TypeError):
+        raise ErroUpload('Trecho de sessão precisa de "sessao", "seq" (>= 0) e "inicio".')
+    return segmento
+
+
+def publicar_video(temp_path, nome_original, regioes=None, segmento=None):
+    """
+    Move o vídeo recebido (temp_path) para a pasta de uploads com um nome
+    seguro e único, com as regiões (caminho de um temporário) e os dados
+    do trecho ao lado, e entrega o job ao Ativa_Yolo. Retorna o caminho salvo.
+    """
+    # Garante que o nome do arquivo é seguro e único, para que uploads
+    # simultâneos com o mesmo nome (ex.: saida.mp4) não se sobrescrevam
+    base, ext = os.path.splitext(secure_filename(nome_original))
+    filename = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
 
     # Caminho final do arquivo salvo
     save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
 
-    # Salva o arquivo
-    file.save(save_path)
+    # Regiões de movimento e dados do trecho (opcionais) ficam ao lado do
+    # vídeo, e chegam antes dele na pasta
+    if regioes is not None:
+        os.replace(regioes, caminho_regioes(save_path))
+    if segmento is not None:
+        gravar_segmento(save_path, *segmento)
+
+    # O corpo foi gravado num .part e só agora vira .mp4: o monitor da
+    # pasta nunca vê um vídeo pela metade
+    os.replace(temp_path, save_path)
+
+    # Entrega o job direto para o Ativa_Yolo, sem esperar a varredura da pasta
+    enviar_job(save_path)
+    return save_path
+
+
+@app.route("/upload", methods=["POST"])
+def upload_video():
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        return jsonify({"erro": 'Envie multipart/form-data com o campo "video".'}), 400
+
+    inicio = time.perf_counter()
+    try:
+        campos, nome_original, temp_path, extras = receber_multipart(
+            request.stream, boundary.encode("latin-1"), "video", app.config["UPLOAD_FOLDER"],
+            campos_extras=("regioes",)
+        )
+    except ErroUpload as e:
+        return jsonify({"erro": str(e)}), 400
+
+    try:
+        segmento = validar_segmento(campos)
+    except ErroUpload as e:
+        for caminho in [temp_path, *extras.values()]:
+            os.remove(caminho)
+        return jsonify({"erro": str(e)}), 400
+
+    save_path = publicar_video(temp_path, nome_original, extras.get("regioes"), segmento)
 
-    # Aqui você pode chamar sua lógica de detecção/corte de vídeo, por exemplo:
-    # processar_video(save_path)
+    duracao = time.perf_counter() - inicio
+    tamanho = os.path.getsize(save_path)
+    UPLOAD_BYTES.inc(tamanho)
+    UPLOAD_DURACAO.observar(duracao)
+    if duracao > 0:
+        UPLOAD_VAZAO.observar(tamanho / duracao)
 
     return jsonify({
         "mensagem": "Upload feito com sucesso.",
@@ -48,6 +233,156 @@ def upload_video():
     }), 200
 
 
+@app.route("/uploads", methods=["POST"])
+def criar_upload():
+    """
+    Abre um upload retomável (ver uploads_retomaveis). Corpo JSON:
+    {"nome": "saida.mp4", "tamanho": bytes, "campos": {...}, "regioes": "..."},
+    com campos e regioes opcionais (os mesmos de /upload; regioes é o
+    conteúdo do .roi.json). O vídeo vai depois em PUT /uploads/<id>.
+    """
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, dict):
+        return jsonify({"erro": 'Envie JSON com "nome" e "tamanho".'}), 400
+
+    nome = dados.get("nome")
+    tamanho = dados.get("tamanho")
+    campos = dados.get("campos") or {}
+    regioes = dados.get("regioes")
+    if not isinstance(nome, str) or not nome.lower().endswith(".mp4"):
+        return jsonify({"erro": "Apenas arquivos .mp4 são aceitos."}), 400
+    if not isinstance(tamanho, int) or not 0 < tamanho <= MAX_CONTENT_LENGTH:
+        return jsonify({"erro": f'"tamanho" precisa estar entre 1 e {MAX_CONTENT_LENGTH} bytes.'}), 400
+    if not isinstance(campos, dict) or (regioes is not None and not isinstance(regioes, str)):
+        return jsonify({"erro": '"campos" precisa ser um objeto e "regioes" um texto.'}), 400
+    try:
+        validar_segmento(campos)
+    except ErroUpload as e:
+        return jsonify({"erro": str(e)}), 400
+
+    upload_id = uploads_retomaveis.criar(nome, tamanho, campos, regioes)
+    resposta = jsonify({"id": upload_id, "recebido": 0})
+    resposta.headers["Location"] = f"/uploads/{upload_id}"
+    return resposta, 201
+
+
+@app.route("/uploads/<upload_id>", methods=["HEAD"])
+def estado_upload(upload_id):
+    """
+    Quantos bytes do upload já chegaram, no cabeçalho Upload-Offset.
+    """
+    dados = uploads_retomaveis.carregar(secure_filename(upload_id))
+    if dados is None:
+        return "", 404
+    return "", 200, {"Upload-Offset": str(dados["recebido"]), "Upload-Length": str(dados["tamanho"]),
+                     "Cache-Control": "no-store"}
+
+
+def _publicar_retomavel(parte, dados):
+    regioes = None
+    if dados.get("regioes") is not None:
+        regioes = parte + ".roi"
+        with open(regioes, "w", encoding="utf-8") as f:
+            f.write(dados["regioes"])
+    return publicar_video(parte, dados["nome"], regioes, validar_segmento(dados["campos"]))
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def enviar_pedaco(upload_id):
+    """
+    Recebe um pedaço do upload (cabeçalho Content-Range: bytes inicio-fim/total).
+    O pedaço tem que começar no Upload-Offset atual; se não começar, a
+    resposta é 409 com o offset certo. Com o último pedaço o vídeo é
+    publicado como em /upload (201).
+    """
+    faixa = FAIXA.match(request.headers.get("Content-Range", ""))
+    if faixa is None:
+        return jsonify({"erro": 'Informe o cabeçalho "Content-Range: bytes inicio-fim/total".'}), 400
+
+    inicio = time.perf_counter()
+    try:
+        dados, lidos = uploads_retomaveis.anexar(secure_filename(upload_id), *map(int, faixa.groups()),
+                                                 request.stream, _publicar_retomavel)
+    except KeyError:
+        return jsonify({"erro": "Upload não encontrado."}), 404
+    except uploads_retomaveis.ErroFaixa as e:
+        return jsonify({"erro": str(e), "recebido": e.recebido}), 409, {"Upload-Offset": str(e.recebido)}
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 416
+
+    duracao = time.perf_counter() - inicio
+    UPLOAD_BYTES.inc(lidos)
+    if duracao > 0 and lidos:
+        UPLOAD_VAZAO.observar(lidos / duracao)
+
+    cabecalhos = {"Upload-Offset": str(dados["recebido"])}
+    if "arquivo" not in dados:
+        return jsonify({"recebido": dados["recebido"]}), 200, cabecalhos
+    return jsonify({
+        "mensagem": "Upload feito com sucesso.",
+        "arquivo_salvo_em": dados["arquivo"]
+    }), 201, cabecalhos
+
+
+@app.route("/stream/<sessao_id>/frame", methods=["POST"])
+def stream_frame(sessao_id):
+    """
+    Recebe um frame ao vivo (corpo = JPEG) e devolve objetos e eventos dele.
+    Cabeçalhos: X-Timestamp (segundos desde o início da sessão) e X-Frame (índice).
+    """
+    try:
+        current_time = float(request.headers["X-Timestamp"])
+        indice = int(request.headers["X-Frame"])
+    except (KeyError, ValueError):
+        return jsonify({"erro": "Informe os cabeçalhos X-Timestamp e X-Frame."}), 400
+
+    try:
+        resposta = sessoes_stream.processar_frame(
+            secure_filename(sessao_id), request.get_data(), current_time, indice
+        )
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+
+    return jsonify(resposta), 200
+
+
+@app.route("/stream/<sessao_id>", methods=["DELETE"])
+def stream_encerrar(sessao_id):
+    resumo = sessoes_stream.encerrar_sessao(secure_filename(sessao_id))
+    if resumo is None:
+        return jsonify({"erro": "Sessão não encontrada."}), 404
+    return jsonify(resumo), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Métricas deste processo e das gravadas pelo Ativa_Yolo e seus workers
+    (ver metricas.py), no formato do Prometheus.
+    """
+    return Response(metricas.texto_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de upload de vídeos.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=16,
+                        help="uploads atendidos ao mesmo tempo")
+    parser.add_argument("--dev", action="store_true",
+                        help="servidor de desenvolvimento do Flask com debug")
+    args = parser.parse_args()
+
+    if args.dev:
+        app.run(host=args.host, port=args.porta, debug=True)
+    elif serve is not None:
+        print(f"Servindo com waitress em {args.host}:{args.porta} ({args.threads} threads)")
+        serve(app, host=args.host, port=args.porta, threads=args.threads, **OPCOES_WAITRESS)
+    else:
+        print("waitress não instalado; usando o servidor do Flask com threads")
+        app.run(host=args.host, port=args.porta, threaded=True)
+
+
 if __name__ == "__main__":
     # Servidor ouvindo em todas as interfaces, porta 8000
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    main()
@@ -1,18 +1,39 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from cache_respostas import CacheRespostas, chave_requisicao
+from cliente_llm import ClienteLLM
+from janelas_cena import dividir_em_janelas, juntar_jogadas, ler_jogadas
+import metricas
 
 load_dotenv()
 
 openai_key = os.getenv("OPENAI_API_KEY")
-# Se você não setar variável de ambiente, pode passar direto:
-client = OpenAI(api_key=openai_key)
-#client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-def build_payload():
-    caminho_arquivo = "./scene_description.json"
-    log = ""
-    with open(caminho_arquivo, "r", encoding="utf-8") as f:
-        log = f.read()
+# Se você não setar variável de ambiente, pode passar direto em cliente_llm()
+
+# Cliente assíncrono, criado no primeiro uso (ver cliente_llm.py)
+_cliente = None
+_lock_cliente = threading.Lock()
+
+# Respostas já obtidas, por hash da requisição (ver cache_respostas);
+# também criado no primeiro uso, para que só importar o módulo (workers do
+# pool, benchmarks) não crie a pasta do cache
+_cache = None
+# Grava as respostas no cache fora da thread do cliente (ver _enviar_log)
+_gravador = None
+
+LLM_ANALISE = metricas.histograma("llm_analise_segundos",
+                                  "Tempo até a resposta completa de uma cena (janelas e cache incluídos).")
+LLM_CACHE = metricas.contador("llm_cache_total", "Consultas ao cache de respostas.", rotulos=("resultado",))
+
+def build_payload(caminho_arquivo="./scene_description.json", log=None):
+    # log: texto da cena já em memória (ex.: uma janela); senão lê o arquivo
+    if log is None:
+        with open(caminho_arquivo, "r", encoding="utf-8") as f:
+            log = f.read()
     SYSTEM_PROMPT = """ 
     You are a log analyzer for the game Rock-Paper-Scissors.
 
@@ -161,23 +182,149 @@ def build_payload():
 
 
 
-def callOpenAI():
+def cliente_llm():
+    global _cliente
+    with _lock_cliente:
+        if _cliente is None:
+            _cliente = ClienteLLM(api_key=openai_key)
+        return _cliente
+
+
+def cache_respostas():
+    global _cache
+    with _lock_cliente:
+        if _cache is None:
+            _cache = CacheRespostas()
+        return _cache
+
+
+def _gravar_no_cache(chave, content):
+    global _gravador
+    with _lock_cliente:
+        if _gravador is None:
+            _gravador = ThreadPoolExecutor(1, thread_name_prefix="cache_llm")
+    _gravador.submit(_gravar, chave, content)
+
+
+def _gravar(chave, content):
     try:
-        request_body = build_payload()
-        response = client.chat.completions.create(**request_body)
+        cache_respostas().guardar(chave, content)
+    except Exception as e:
+        print(f"[CACHE] erro ao gravar resposta: {e}")
+
+
+def _resposta_valida(content):
+    try:
+        return isinstance(ler_jogadas(content), list)
+    except (AttributeError, IndexError, ValueError):
+        return False
 
-        # pegar só o texto da resposta principal:
-        content = response.choices[0].message.content
+
+def _enviar_log(log):
+    """
+    Manda um texto de cena ao modelo (ou pega do cache) e devolve um
+    Future com o texto da resposta.
+    """
+    request_body = build_payload(log=log)
+    chave = chave_requisicao(request_body)
+
+    futuro = Future()
+    cache = cache_respostas()
+    content = cache.obter(chave)
+    if content is not None:
+        LLM_CACHE.inc(resultado="acerto")
+        print(f"[CACHE] acerto | {cache}")
+        futuro.set_result(content)
+        return futuro
+
+    LLM_CACHE.inc(resultado="falha")
+    print(f"[CACHE] falha | {cache}")
+
+    def _concluir(requisicao):
+        try:
+            # pegar só o texto da resposta principal:
+            escolha = requisicao.result().choices[0]
+            content = escolha.message.content
+        except Exception as e:
+            futuro.set_exception(e)
+            return
+        # Só guarda respostas completas e que viram uma lista de jogadas:
+        # uma truncada (finish_reason "length") ou fora do formato ficaria
+        # quebrando a junção das janelas dessa cena até expirar. Isto roda
+        # na thread do laço de eventos do cliente, que atende todas as
+        # requisições em andamento; a gravação em disco vai para outra
+        if escolha.finish_reason == "stop" and _resposta_valida(content):
+            _gravar_no_cache(chave, content)
+        futuro.set_result(content)
+
+    cliente_llm().enviar(request_body).add_done_callback(_concluir)
+    return futuro
+
+
+def _juntar_respostas(cena, futuros):
+    """
+    Future que conclui quando todas as janelas responderem, com as jogadas
+    já juntas e sem repetição (ver janelas_cena.juntar_jogadas).
+    """
+    resultado = Future()
+    restantes = [len(futuros)]
+    lock = threading.Lock()
+
+    def _uma_concluida(_):
+        with lock:
+            restantes[0] -= 1
+            if restantes[0]:
+                return
+        try:
+            listas = [ler_jogadas(f.result()) for f in futuros]
+        except Exception as e:
+            resultado.set_exception(e)
+            return
+        resultado.set_result(json.dumps(juntar_jogadas(cena, listas), indent=2, ensure_ascii=False))
+
+    for futuro in futuros:
+        futuro.add_done_callback(_uma_concluida)
+    return resultado
+
+
+def enviar_para_llm(caminho_arquivo="./scene_description.json"):
+    """
+    Não bloqueia: devolve um Future com o texto da resposta do modelo.
+    Cenas longas são divididas em janelas (janelas_cena) enviadas em
+    paralelo; as respostas são juntadas num único array de jogadas.
+    Respostas em cache voltam num Future já concluído.
+    """
+    inicio = time.perf_counter()
+    with open(caminho_arquivo, "r", encoding="utf-8") as f:
+        log = f.read()
+
+    cena = json.loads(log)
+    janelas = dividir_em_janelas(cena)
+    if len(janelas) == 1:
+        futuro = _enviar_log(log)
+    else:
+        print(f"[LLM] Cena dividida em {len(janelas)} janelas")
+        futuros = [_enviar_log(json.dumps(janela, indent=2, ensure_ascii=False)) for janela in janelas]
+        futuro = _juntar_respostas(cena, futuros)
+
+    futuro.add_done_callback(lambda _: LLM_ANALISE.observar(time.perf_counter() - inicio))
+    return futuro
+
+
+def callOpenAI(caminho_arquivo="./scene_description.json"):
+    """
+    Versão que espera a resposta; devolve o texto ou None em caso de erro.
+    """
+    try:
+        content = enviar_para_llm(caminho_arquivo).result()
         print("Resposta do modelo:")
         print(content)
-
-        # se quiser ver tudo:
-        # import json
-        # print(json.dumps(response.to_dict(), indent=2, ensure_ascii=False))
+        return content
 
     except Exception as e:
         print("Erro ao chamar a API:")
         print(e)
+        return None
 
 if __name__ == "__main__":
-    callOpenAI()
\ No newline at end of file
+    callOpenAI()
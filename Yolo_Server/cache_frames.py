@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import metricas
+
+# Cache de frames quase iguais para o recognize(). Cada frame vira uma
+# miniatura em cinza (LADO x LADO, média por área); se ela não mudou mais
+# que o limiar em relação à do último frame inferido, o frame não vai para
+# o detector: as detecções do último frame inferido são repetidas e só o
+# tracker anda (IDs, Kalman e contagem de frames seguem iguais).
+LADO = 32           # lado da miniatura comparada
+LIMIAR = 6.0        # maior diferença (níveis de cinza) numa célula da miniatura
+MAX_REPETIDOS = 30  # repetições seguidas antes de forçar uma inferência
+
+FRAMES_CACHE = metricas.contador("frames_cache_total", "Frames inferidos (falha) ou com detecções repetidas (acerto).",
+                                 rotulos=("resultado",))
+
+
+def assinatura(frame, lado=LADO):
+    """
+    Miniatura em cinza do frame, usada para comparar frames.
+    """
+    cinza = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(cinza, (lado, lado), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+class CacheFrames:
+    """
+    Decide quais frames repetem as detecções do último frame inferido e
+    faz o tracker andar nesses frames.
+
+    - limiar: maior diferença de cinza aceita numa célula da miniatura.
+      Com o máximo (e não a média), um objeto pequeno se mexendo num
+      canto já conta como mudança.
+    - max_repetidos: repetições seguidas antes de inferir de novo mesmo
+      sem mudança, para objetos lentos demais para a miniatura.
+    """
+
+    def __init__(self, limiar=LIMIAR, max_repetidos=MAX_REPETIDOS, lado=LADO):
+        self.limiar = limiar
+        self.max_repetidos = max_repetidos
+        self.lado = lado
+
+        self.referencia = None  # miniatura do último frame inferido
+        self.seguidos = 0
+        self.entradas = None    # (detecções, features) da última chamada do tracker
+        self.acertos = 0
+        self.falhas = 0
+
+    def repetido(self, frame):
+        """
+        True se o frame pode reaproveitar as detecções do último frame
+        inferido. Um frame que volta False passa a ser a nova referência,
+        então deve ir para o detector.
+        """
+        atual = assinatura(frame, self.lado)
+        if (self.referencia is not None and self.seguidos < self.max_repetidos
+                and np.abs(atual - self.referencia).max() <= self.limiar):
+            self.seguidos += 1
+            self.acertos += 1
+            FRAMES_CACHE.inc(resultado="acerto")
+            return True
+
+        self.referencia = atual
+        self.seguidos = 0
+        self.falhas += 1
+        FRAMES_CACHE.inc(resultado="falha")
+        return False
+
+    def acompanhar(self, tracker):
+        """
+        Passa a guardar as entradas de cada tracker.update(), venha a
+        chamada do model.track() ou de fora, para repetir() reusá-las.
+        """
+        if not hasattr(tracker, "_cache_frames"):
+            original = tracker.update
+
+            def update(det, img=None, feats=None, **kwargs):
+                cache = tracker._cache_frames
+                if cache is not None:
+                    cache.entradas = (det, feats)
+                return original(det, img, feats, **kwargs)
+
+            tracker.update = update
+        tracker._cache_frames = self
+
+    def soltar(self, tracker):
+        tracker._cache_frames = None
+
+    def repetir(self, tracker, frame):
+        """
+        Avança o tracker num frame repetido com as detecções do último
+        frame inferido. Retorna [(cls, obj_id, x1, y1, x2, y2), ...].
+        """
+        det, feats = self.entradas
+        tracks = tracker.update(det, frame, feats=feats)
+        return [(int(t[6]), int(t[4]), *(int(v) for v in t[:4])) for t in tracks]
+
+    def taxa_acerto(self):
+        total = self.acertos + self.falhas
+        return self.acertos / total if total else 0.0
+
+    def resumo(self):
+        return {"acertos": self.acertos, "falhas": self.falhas, "taxa_acerto": self.taxa_acerto()}
+
+    def __str__(self):
+        return (f"{self.acertos} frames repetidos, {self.falhas} inferidos "
+                f"({self.taxa_acerto():.0%} de acerto)")
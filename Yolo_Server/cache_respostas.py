@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+
+# Respostas do modelo de linguagem guardadas pelo conteúdo da requisição.
+# Com temperature 0.0 a mesma requisição (modelo, prompt, temperatura e log)
+# pode reaproveitar a resposta anterior.
+PASTA_CACHE = os.getenv("CACHE_LLM_PASTA", "./cache_llm/")
+MAX_ITENS_MEMORIA = 256
+MAX_BYTES_DISCO = 50 * 1024 * 1024  # 50 MB
+TTL = 7 * 24 * 3600                 # segundos; None = não expira
+DESPEJO_A_CADA = 32                 # gravações entre duas varreduras da pasta (a 1ª grava já varre)
+
+
+def chave_requisicao(request_body):
+    """
+    Hash SHA-256 do corpo da requisição em JSON canônico
+    (modelo, mensagens, temperatura e demais parâmetros).
+    """
+    canonico = json.dumps(request_body, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class CacheRespostas:
+    """
+    Cache em dois níveis: LRU em memória (max_itens_memoria entradas) e
+    arquivos em disco (pasta), limitados por max_bytes_disco e por ttl.
+    No disco, ler uma entrada atualiza o mtime dela, então o despejo por
+    tamanho remove primeiro as menos usadas.
+    """
+
+    def __init__(self, pasta=PASTA_CACHE, max_itens_memoria=MAX_ITENS_MEMORIA,
+                 max_bytes_disco=MAX_BYTES_DISCO, ttl=TTL, despejo_a_cada=DESPEJO_A_CADA):
+        self.pasta = pasta
+        self.max_itens_memoria = max_itens_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self.ttl = ttl
+        self.despejo_a_cada = despejo_a_cada
+        self.gravacoes = 0
+
+        self.memoria = OrderedDict()  # chave -> (criado_em, resposta)
+        self.lock = threading.Lock()
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+
+        if self.pasta:
+            os.makedirs(self.pasta, exist_ok=True)
+
+    def _expirado(self, criado_em):
+        return self.ttl is not None and time.time() - criado_em > self.ttl
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.json")
+
+    def _ler_disco(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                entrada = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self._expirado(entrada["criado_em"]):
+            self._remover(caminho)
+            return None
+
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+        return entrada["criado_em"], entrada["resposta"]
+
+    def _guardar_memoria(self, chave, entrada):
+        self.memoria[chave] = entrada
+        self.memoria.move_to_end(chave)
+        while len(self.memoria) > self.max_itens_memoria:
+            self.memoria.popitem(last=False)
+
+    def obter(self, chave):
+        """
+        Devolve a resposta guardada para chave, ou None.
+        """
+        with self.lock:
+            entrada = self.memoria.get(chave)
+            if entrada is not None and self._expirado(entrada[0]):
+                del self.memoria[chave]
+                entrada = None
+
+            if entrada is not None:
+                self.memoria.move_to_end(chave)
+                self.acertos_memoria += 1
+                return entrada[1]
+
+            entrada = self._ler_disco(chave) if self.pasta else None
+            if entrada is not None:
+                self._guardar_memoria(chave, entrada)
+                self.acertos_disco += 1
+                return entrada[1]
+
+            self.falhas += 1
+            return None
+
+    def guardar(self, chave, resposta):
+        """
+        Guarda na memória e no disco. O disco fica fora do lock, para não
+        segurar quem está lendo; a pasta só é varrida (_despejar_disco) a
+        cada despejo_a_cada gravações.
+        """
+        entrada = (time.time(), resposta)
+        with self.lock:
+            self._guardar_memoria(chave, entrada)
+            self.gravacoes += 1
+            despejar = (self.gravacoes - 1) % self.despejo_a_cada == 0
+
+        if not self.pasta:
+            return
+
+        # Grava num temporário e renomeia: outro worker nunca lê pela metade
+        temp_path = os.path.join(self.pasta, f"{uuid.uuid4().hex}.part")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"criado_em": entrada[0], "resposta": resposta}, f, ensure_ascii=False)
+        os.replace(temp_path, self._caminho(chave))
+
+        if despejar:
+            self._despejar_disco()
+
+    def _remover(self, caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    def _entradas_disco(self):
+        entradas = []
+        for entrada in os.scandir(self.pasta):
+            if entrada.is_file() and entrada.name.endswith(".json"):
+                try:
+                    info = entrada.stat()
+                except OSError:
+                    continue
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+        return entradas
+
+    def _despejar_disco(self):
+        """
+        Remove entradas vencidas pelo TTL e, se o disco passar de
+        max_bytes_disco, as usadas há mais tempo.
+        """
+        agora = time.time()
+        entradas = sorted(self._entradas_disco())
+        total = sum(tamanho for _, tamanho, _ in entradas)
+
+        for mtime, tamanho, caminho in entradas:
+            vencida = self.ttl is not None and agora - mtime > self.ttl
+            if not vencida and total <= self.max_bytes_disco:
+                break
+            self._remover(caminho)
+            total -= tamanho
+
+    def limpar(self):
+        with self.lock:
+            self.memoria.clear()
+            if self.pasta:
+                for _, _, caminho in self._entradas_disco():
+                    self._remover(caminho)
+
+    def resumo(self):
+        acertos = self.acertos_memoria + self.acertos_disco
+        total = acertos + self.falhas
+        return {
+            "acertos_memoria": self.acertos_memoria,
+            "acertos_disco": self.acertos_disco,
+            "falhas": self.falhas,
+            "taxa_acerto": acertos / total if total else 0.0,
+        }
+
+    def __str__(self):
+        r = self.resumo()
+        total = r["acertos_memoria"] + r["acertos_disco"] + r["falhas"]
+        return (
+            f"taxa de acerto {r['taxa_acerto']:.0%} ({total - r['falhas']}/{total}: "
+            f"{r['acertos_memoria']} memória, {r['acertos_disco']} disco)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache de respostas do modelo de linguagem.")
+    parser.add_argument("--pasta", default=PASTA_CACHE)
+    parser.add_argument("--limpar", action="store_true", help="apaga todas as entradas")
+    args = parser.parse_args()
+
+    cache = CacheRespostas(args.pasta)
+    if args.limpar:
+        cache.limpar()
+        print(f"Cache em {args.pasta} apagado.")
+    else:
+        entradas = cache._entradas_disco()
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        print(f"{len(entradas)} resposta(s) em {args.pasta} ({total / 1024:.1f} KB "
+              f"de {MAX_BYTES_DISCO / 1024 / 1024:.0f} MB)")
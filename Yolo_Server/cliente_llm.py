@@ -0,0 +1,176 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import metricas
+
+# Limites do cliente do modelo de linguagem (podem vir do ambiente)
+CONCORRENCIA = int(os.getenv("LLM_CONCORRENCIA", "4"))        # requisições ao mesmo tempo
+REQ_POR_SEGUNDO = float(os.getenv("LLM_REQ_POR_SEGUNDO", "2"))  # ritmo do balde de tokens
+RAJADA = int(os.getenv("LLM_RAJADA", "4"))                    # capacidade do balde
+TENTATIVAS = int(os.getenv("LLM_TENTATIVAS", "5"))
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))               # segundos por requisição
+ESPERA_BASE = 0.5                                             # backoff: 0.5s, 1s, 2s, ...
+ESPERA_MAX = 30.0
+
+LLM_LATENCIA = metricas.histograma("llm_latencia_segundos", "Duração de cada chamada à API do modelo de linguagem.")
+LLM_REQUISICOES = metricas.contador("llm_requisicoes_total", "Chamadas à API do modelo de linguagem por resultado.",
+                                    rotulos=("resultado",))
+LLM_TOKENS = metricas.contador("llm_tokens_total", "Tokens usados nas respostas da API.", rotulos=("tipo",))
+
+
+class BaldeTokens:
+    """
+    Limitador de taxa: cada requisição gasta um token; o balde recebe
+    `taxa` tokens por segundo até `capacidade`. Só usado dentro do loop
+    do ClienteLLM.
+    """
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = float(capacidade)
+        self.ultimo = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def adquirir(self):
+        async with self.lock:
+            while True:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.taxa)
+
+
+def _espera_sugerida(erro):
+    """
+    Segundos pedidos pelo servidor no cabeçalho Retry-After, se houver.
+    """
+    resposta = getattr(erro, "response", None)
+    if resposta is None:
+        return None
+    try:
+        return float(resposta.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ClienteLLM:
+    """
+    Cliente assíncrono da API compatível com OpenAI, rodando num event loop
+    próprio numa thread de fundo. Quem chama não bloqueia: enviar() devolve
+    um concurrent.futures.Future com a resposta.
+
+    - Conexões HTTP reaproveitadas (keep-alive) entre requisições.
+    - No máximo `concorrencia` requisições em andamento.
+    - Balde de tokens com `req_por_segundo` e `rajada`.
+    - 429, 5xx, timeout e falha de conexão são repetidos com backoff
+      exponencial com jitter (ou o Retry-After do servidor), até `tentativas`.
+
+    base_url e api_key vêm do ambiente (OPENAI_BASE_URL, OPENAI_API_KEY)
+    se não forem informados; aponte base_url para o stub_llm para testar
+    sem rede.
+    """
+
+    def __init__(self, base_url=None, api_key=None, concorrencia=CONCORRENCIA,
+                 req_por_segundo=REQ_POR_SEGUNDO, rajada=RAJADA, tentativas=TENTATIVAS,
+                 timeout=TIMEOUT):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.concorrencia = concorrencia
+        self.tentativas = tentativas
+        self.timeout = timeout
+        self._req_por_segundo = req_por_segundo
+        self._rajada = rajada
+
+        self.requisicoes = 0
+        self.retentativas = 0
+        self.erros = 0
+        self.tokens_prompt = 0
+        self.tokens_resposta = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._iniciar(), self.loop).result()
+
+    async def _iniciar(self):
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        import httpx
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=self.concorrencia,
+                                max_keepalive_connections=self.concorrencia),
+            timeout=self.timeout,
+        )
+        # As repetições ficam por conta de _completar, não do SDK
+        self.client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key,
+                                  max_retries=0, timeout=self.timeout, http_client=http_client)
+        self.semaforo = asyncio.Semaphore(self.concorrencia)
+        self.balde = BaldeTokens(self._req_por_segundo, self._rajada)
+
+    async def _completar(self, request_body):
+        from openai import RateLimitError, InternalServerError, APIConnectionError
+
+        # APITimeoutError é subclasse de APIConnectionError
+        repetiveis = (RateLimitError, InternalServerError, APIConnectionError)
+
+        async with self.semaforo:
+            for tentativa in range(self.tentativas):
+                await self.balde.adquirir()
+                inicio = time.perf_counter()
+                try:
+                    response = await self.client.chat.completions.create(**request_body)
+                except repetiveis as e:
+                    LLM_LATENCIA.observar(time.perf_counter() - inicio)
+                    if tentativa == self.tentativas - 1:
+                        self.erros += 1
+                        LLM_REQUISICOES.inc(resultado="erro")
+                        raise
+                    espera = _espera_sugerida(e)
+                    if espera is None:
+                        espera = min(ESPERA_MAX, ESPERA_BASE * 2 ** tentativa) * random.uniform(0.5, 1.0)
+                    self.retentativas += 1
+                    LLM_REQUISICOES.inc(resultado="repetida")
+                    print(f"[LLM] {type(e).__name__}; nova tentativa em {espera:.2f}s")
+                    await asyncio.sleep(espera)
+                    continue
+                except Exception:
+                    self.erros += 1
+                    LLM_REQUISICOES.inc(resultado="erro")
+                    raise
+
+                LLM_LATENCIA.observar(time.perf_counter() - inicio)
+                LLM_REQUISICOES.inc(resultado="ok")
+                self.requisicoes += 1
+                if response.usage is not None:
+                    self.tokens_prompt += response.usage.prompt_tokens
+                    self.tokens_resposta += response.usage.completion_tokens
+                    LLM_TOKENS.inc(response.usage.prompt_tokens, tipo="prompt")
+                    LLM_TOKENS.inc(response.usage.completion_tokens, tipo="resposta")
+                return response
+
+    def enviar(self, request_body):
+        """
+        Agenda a requisição e devolve um concurrent.futures.Future com a
+        resposta (ChatCompletion) ou a exceção da última tentativa.
+        """
+        return asyncio.run_coroutine_threadsafe(self._completar(request_body), self.loop)
+
+    def fechar(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def resumo(self):
+        return {
+            "requisicoes": self.requisicoes,
+            "retentativas": self.retentativas,
+            "erros": self.erros,
+            "tokens_prompt": self.tokens_prompt,
+            "tokens_resposta": self.tokens_resposta,
+        }
@@ -0,0 +1,323 @@
+import os
+import io
+import ast
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import yaml
+
+# Backends de inferência para CPU. O modelo é exportado uma vez e o
+# artefato fica ao lado dos pesos (best.onnx, best_int8.onnx,
+# best_openvino_model/, best_int8_openvino_model/); enquanto for mais novo
+# que o .pt, é reaproveitado.
+BACKENDS = ("pytorch", "onnx", "openvino")
+BACKEND = os.getenv("YOLO_BACKEND", "pytorch")   # backend padrão do servidor
+INT8 = os.getenv("YOLO_INT8", "0") == "1"
+LOTE_EXPORTADO = 8        # lote máximo do modelo exportado (TAMANHO_LOTE do Ativa_Yolo)
+FRAMES_CALIBRACAO = 300   # frames dos nossos vídeos usados na quantização INT8
+
+
+def caminho_exportado(model_path, backend, int8=False):
+    """
+    Onde fica o artefato exportado de model_path para o backend.
+    """
+    base = os.path.splitext(model_path)[0] + ("_int8" if int8 else "")
+    if backend == "onnx":
+        return f"{base}.onnx"
+    if backend == "openvino":
+        return f"{base}_openvino_model"
+    raise ValueError(f"Backend desconhecido: {backend} (use {', '.join(BACKENDS)})")
+
+
+def _atualizado(artefato, model_path):
+    return os.path.exists(artefato) and os.path.getmtime(artefato) >= os.path.getmtime(model_path)
+
+
+def imgsz_exportado(caminho):
+    """
+    Tamanho de entrada gravado nos metadados do modelo exportado. Com
+    exportação dinâmica o Ultralytics usaria 640 por padrão, e não o
+    tamanho de treino do .pt.
+    """
+    if os.path.isdir(caminho):
+        with open(os.path.join(caminho, "metadata.yaml"), "r", encoding="utf-8") as f:
+            return yaml.safe_load(f)["imgsz"]
+
+    import onnx
+
+    metadados = {p.key: p.value for p in onnx.load(caminho, load_external_data=False).metadata_props}
+    return ast.literal_eval(metadados["imgsz"])
+
+
+def montar_calibracao(fontes, pasta, nomes, max_frames=FRAMES_CALIBRACAO):
+    """
+    Monta um dataset só de imagens para a calibração INT8 a partir dos
+    nossos vídeos (ou pastas de imagens): até max_frames frames espalhados
+    igualmente entre as fontes. Retorna o caminho do data.yaml.
+    """
+    import cv2
+
+    videos = []
+    imagens = []
+    for fonte in fontes:
+        if os.path.isdir(fonte):
+            for entrada in sorted(os.scandir(fonte), key=lambda e: e.name):
+                nome = entrada.name.lower()
+                if nome.endswith(".mp4"):
+                    videos.append(entrada.path)
+                elif nome.endswith((".jpg", ".jpeg", ".png")):
+                    imagens.append(entrada.path)
+        elif fonte.lower().endswith(".mp4"):
+            videos.append(fonte)
+        else:
+            imagens.append(fonte)
+
+    pasta_imagens = os.path.join(pasta, "images", "val")
+    os.makedirs(pasta_imagens, exist_ok=True)
+
+    total = 0
+    por_fonte = max(1, max_frames // max(1, len(videos) + (1 if imagens else 0)))
+    for caminho in imagens[:por_fonte]:
+        shutil.copy(caminho, os.path.join(pasta_imagens, f"{total}{os.path.splitext(caminho)[1]}"))
+        total += 1
+
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or por_fonte
+        passo = max(1, n_frames // por_fonte)
+        indice = 0
+        salvos = 0
+        while salvos < por_fonte and total < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if indice % passo == 0:
+                cv2.imwrite(os.path.join(pasta_imagens, f"{total}.jpg"), frame)
+                total += 1
+                salvos += 1
+            indice += 1
+        cap.release()
+
+    if total == 0:
+        raise ValueError(f"Nenhum frame de calibração encontrado em {fontes}")
+
+    data_yaml = os.path.join(pasta, "data.yaml")
+    with open(data_yaml, "w", encoding="utf-8") as f:
+        yaml.safe_dump({"path": os.path.abspath(pasta), "train": "images/val", "val": "images/val",
+                        "names": dict(nomes)}, f, allow_unicode=True)
+    print(f"[INFO] {total} frames de calibração em {pasta_imagens}")
+    return data_yaml
+
+
+def preparar_backend(model_path, backend="pytorch", int8=False, calibracao=None, lote=LOTE_EXPORTADO):
+    """
+    Devolve o caminho do modelo a carregar para o backend, exportando-o
+    se ainda não houver um artefato atualizado ao lado dos pesos.
+
+    int8=True quantiza com frames de calibracao: lista de vídeos .mp4,
+    pastas com vídeos/imagens, ou um data.yaml de dataset. Só é exigida
+    quando o artefato INT8 ainda não existe.
+    """
+    if backend == "pytorch":
+        return model_path
+
+    from ultralytics import YOLO
+
+    destino = caminho_exportado(model_path, backend, int8)
+    if _atualizado(destino, model_path):
+        return destino
+
+    if int8 and not calibracao:
+        raise ValueError("Exportar em INT8 precisa de frames de calibração (vídeos ou pasta de imagens).")
+
+    print(f"[INFO] Exportando {model_path} para {backend}{' INT8' if int8 else ''}...")
+    inicio = time.time()
+
+    # Exporta numa pasta temporária: o cache só vê o artefato pronto, e a
+    # exportação INT8 não apaga o .onnx FP32 que já estiver ao lado dos pesos
+    with tempfile.TemporaryDirectory() as temp_dir:
+        copia = os.path.join(temp_dir, os.path.basename(model_path))
+        shutil.copy(model_path, copia)
+
+        # imgsz fica o do treino, como no .pt
+        argumentos = {"format": backend, "dynamic": True, "batch": lote, "device": "cpu"}
+        if int8:
+            if isinstance(calibracao, str) and calibracao.endswith((".yaml", ".yml")):
+                data_yaml = calibracao
+            else:
+                fontes = [calibracao] if isinstance(calibracao, str) else list(calibracao)
+                data_yaml = montar_calibracao(fontes, os.path.join(temp_dir, "calibracao"),
+                                              YOLO(copia).names)
+            argumentos.update(quantize=8, data=data_yaml)
+
+        exportado = YOLO(copia).export(**argumentos)
+
+        if os.path.isdir(destino):
+            shutil.rmtree(destino)
+        shutil.move(str(exportado), destino)
+
+    print(f"[INFO] Modelo exportado em {time.time() - inicio:.1f}s: {destino}")
+    return destino
+
+
+def _rodar(model, video, tamanho_lote, reid=True):
+    from track_yolo import recognize
+
+    estatisticas = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        snapshots = recognize(video, model=model, tamanho_lote=tamanho_lote, estatisticas=estatisticas,
+                              reid=reid)
+    return snapshots, estatisticas
+
+
+def _caixas_por_frame(snapshots):
+    """
+    {timestamp: {(label, ID): (x1, y1, x2, y2)}} a partir dos snapshots.
+    """
+    from li import parse_pos
+
+    frames = {}
+    for snapshot in snapshots:
+        for t, objetos in snapshot.items():
+            frames[t] = {
+                (label, o["ID"]): parse_pos(o["pos"])
+                for label, lista in objetos.items()
+                for o in lista
+            }
+    return frames
+
+
+def _concordancia(referencia, outro, tolerancia=4):
+    """
+    Fração dos frames da referência em que o outro backend dá os mesmos
+    objetos (rótulo e ID) com caixas a até `tolerancia` pixels.
+    """
+    ref = _caixas_por_frame(referencia)
+    out = _caixas_por_frame(outro)
+    iguais = 0
+    for t, caixas in ref.items():
+        caixas_outro = out.get(t, {})
+        if caixas.keys() == caixas_outro.keys() and all(
+            max(abs(a - b) for a, b in zip(caixa, caixas_outro[chave])) <= tolerancia
+            for chave, caixa in caixas.items()
+        ):
+            iguais += 1
+    return iguais / len(ref) if ref else 1.0
+
+
+def comparar_backends(model_path, video, dados=None, variantes=None, calibracao=None, tamanho_lote=LOTE_EXPORTADO):
+    """
+    Roda o tracking em video com cada variante (backend, int8) na CPU e
+    compara com o PyTorch: FPS de inferência e total, concordância de
+    caixas/IDs frame a frame e, com um dataset rotulado (dados), mAP.
+
+    Os modelos exportados rodam o tracker sem ReID (ver
+    track_yolo.config_tracker), então o PyTorch roda também sem ReID
+    ("pytorch sem ReID"): "concordancia" compara com o PyTorch padrão e
+    "concordancia_sem_reid" com ele, que isola a diferença do backend.
+    Sem o PyTorch não há referência, e levanta RuntimeError.
+    """
+    from track_yolo import carregar_modelo
+
+    if variantes is None:
+        variantes = [("pytorch", False), ("onnx", False), ("openvino", False)]
+    variantes = [("pytorch", False)] + [v for v in variantes if v != ("pytorch", False)]
+
+    def _linha(nome, estatisticas):
+        return {
+            "backend": nome,
+            "fps_inferencia": estatisticas["estagios"]["inferência"]["fps"],
+            "fps_total": estatisticas["frames_decodificados"] / estatisticas["tempo_total"],
+        }
+
+    linhas = []
+    referencia = referencia_sem_reid = None
+    for backend, int8 in variantes:
+        nome = f"{backend}{' int8' if int8 else ''}"
+        try:
+            model = carregar_modelo(model_path, backend=backend, int8=int8,
+                                    calibracao=calibracao or [video])
+        except Exception as e:
+            print(f"[PERF] {nome}: indisponível ({e})")
+            if referencia is None:
+                raise RuntimeError(f"Sem a referência PyTorch não há com o que comparar ({model_path}: {e})")
+            continue
+
+        snapshots, estatisticas = _rodar(model, video, tamanho_lote)
+        linha = _linha(nome, estatisticas)
+        if referencia is None:
+            referencia = snapshots
+            referencia_sem_reid, estatisticas_sem_reid = _rodar(model, video, tamanho_lote, reid=False)
+            sem_reid = _linha("pytorch sem ReID", estatisticas_sem_reid)
+            sem_reid["concordancia"] = _concordancia(referencia, referencia_sem_reid)
+            sem_reid["concordancia_sem_reid"] = 1.0
+        linha["concordancia"] = _concordancia(referencia, snapshots)
+        linha["concordancia_sem_reid"] = _concordancia(referencia_sem_reid, snapshots)
+
+        if dados:
+            with contextlib.redirect_stdout(io.StringIO()):
+                metricas_val = model.val(data=dados, batch=1, device="cpu",
+                                         plots=False, verbose=False)
+            linha["map50"] = float(metricas_val.box.map50)
+            linha["map50_95"] = float(metricas_val.box.map)
+        linhas.append(linha)
+        print(f"[PERF] {nome}: {linha['fps_inferencia']:.1f} fps de inferência")
+        if len(linhas) == 1:
+            linhas.append(sem_reid)
+
+    base = linhas[0]
+    for linha in linhas:
+        linha["ganho_fps"] = linha["fps_inferencia"] / base["fps_inferencia"]
+        if "map50_95" in linha:
+            linha["delta_map50_95"] = linha["map50_95"] - base["map50_95"]
+    return linhas
+
+
+def imprimir_relatorio(linhas):
+    com_map = any("map50_95" in linha for linha in linhas)
+    # caixas/IDs: igual ao PyTorch padrão; sem ReID: igual ao PyTorch com o
+    # mesmo tracker dos exportados (só a diferença do backend)
+    cabecalho = (f"{'backend':16s} {'fps inf.':>9s} {'fps total':>9s} {'ganho':>6s} "
+                 f"{'caixas/IDs':>10s} {'sem ReID':>8s}")
+    if com_map:
+        cabecalho += f" {'mAP50':>7s} {'mAP50-95':>8s} {'delta':>7s}"
+    print(cabecalho)
+    for linha in linhas:
+        texto = (f"{linha['backend']:16s} {linha['fps_inferencia']:9.1f} {linha['fps_total']:9.1f} "
+                 f"{linha['ganho_fps']:5.2f}x {linha['concordancia']:10.1%} {linha['concordancia_sem_reid']:8.1%}")
+        if "map50_95" in linha:
+            texto += f" {linha['map50']:7.3f} {linha['map50_95']:8.3f} {linha['delta_map50_95']:+7.3f}"
+        print(texto)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta o modelo para backends de CPU e compara com o PyTorch.")
+    parser.add_argument("modelo", help="pesos .pt")
+    parser.add_argument("--backend", choices=BACKENDS[1:], help="só exporta para este backend")
+    parser.add_argument("--int8", action="store_true", help="quantização INT8 com frames de calibração")
+    parser.add_argument("--calibracao", nargs="+", help="vídeos, pastas de vídeos/imagens ou data.yaml")
+    parser.add_argument("--comparar", metavar="VIDEO", help="compara FPS e caixas/IDs de todos os backends")
+    parser.add_argument("--dados", help="data.yaml rotulado para medir o mAP de cada backend")
+    parser.add_argument("--lote", type=int, default=LOTE_EXPORTADO)
+    parser.add_argument("--relatorio", default="relatorio_backends.json")
+    args = parser.parse_args()
+
+    if args.comparar:
+        variantes = [("pytorch", False), ("onnx", False), ("openvino", False)]
+        if args.int8:
+            variantes += [("onnx", True), ("openvino", True)]
+        linhas = comparar_backends(args.modelo, args.comparar, args.dados, variantes,
+                                   args.calibracao, args.lote)
+        print()
+        imprimir_relatorio(linhas)
+        with open(args.relatorio, "w", encoding="utf-8") as f:
+            json.dump({"modelo": args.modelo, "video": args.comparar, "dados": args.dados,
+                       "backends": linhas}, f, indent=2, ensure_ascii=False)
+        print(f"\nRelatório salvo em {args.relatorio}")
+    elif args.backend:
+        preparar_backend(args.modelo, args.backend, args.int8, args.calibracao, args.lote)
+    else:
+        parser.error("informe --backend ou --comparar")
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import secrets
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+# Canal local entre o HTTP_listener (que sabe quando um upload terminou)
+# e o Ativa_Yolo (que processa os vídeos). Só escuta em localhost.
+# As mensagens são JSON (nada é desserializado com pickle) e as conexões
+# se autenticam com uma chave: FILA_JOBS_CHAVE, ou um segredo gerado na
+# primeira execução e guardado em ARQUIVO_CHAVE (só o dono lê), que os
+# dois processos da mesma instalação compartilham.
+ENDERECO_FILA = ("127.0.0.1", int(os.getenv("FILA_JOBS_PORTA", "6001")))
+ARQUIVO_CHAVE = os.getenv("FILA_JOBS_CHAVE_ARQUIVO",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fila_jobs_chave"))
+
+
+def _chave_da_instalacao(caminho=ARQUIVO_CHAVE) -> bytes:
+    """
+    Lê o segredo de caminho, criando-o se ainda não existe. O arquivo é
+    escrito inteiro num temporário e ligado ao nome final, então um
+    processo nunca lê uma chave pela metade, e se os dois processos
+    criarem ao mesmo tempo os dois ficam com a que chegou primeiro.
+    """
+    if not os.path.exists(caminho):
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", prefix=".chave_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+            os.chmod(temporario, 0o600)
+            os.link(temporario, caminho)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporario)
+    with open(caminho, "r") as f:
+        chave = f.read().strip()
+    if not chave:
+        raise RuntimeError(f"Chave da fila de jobs vazia em {caminho}; apague o arquivo para gerar outra.")
+    return chave.encode()
+
+
+# Resolvida no primeiro uso (ver chave_fila): só importar o módulo não
+# cria o arquivo da chave, e uma instalação só leitura ainda importa
+_chave = None
+_lock_chave = threading.Lock()
+
+
+def chave_fila() -> bytes:
+    global _chave
+    with _lock_chave:
+        if _chave is None:
+            _chave = os.getenv("FILA_JOBS_CHAVE", "").encode() or _chave_da_instalacao()
+        return _chave
+
+
+def dentro_da_pasta(caminho: str, pasta: str) -> bool:
+    """
+    True se caminho é um arquivo direto de pasta (sem escapar por .. ou links).
+    """
+    return os.path.dirname(os.path.realpath(caminho)) == os.path.realpath(pasta)
+
+
+def enviar_job(caminho_video: str, **extras) -> bool:
+    """
+    Avisa o Ativa_Yolo que caminho_video está pronto para processar.
+    Retorna False se o Ativa_Yolo não estiver ouvindo; nesse caso o vídeo
+    ainda é pego pelo monitor da pasta.
+    """
+    mensagem = {"video": os.path.abspath(caminho_video), "pronto_em": time.time()}
+    mensagem.update(extras)
+
+    try:
+        with Client(ENDERECO_FILA, authkey=chave_fila()) as conn:
+            conn.send_bytes(json.dumps(mensagem).encode("utf-8"))
+        return True
+    except OSError as e:
+        print(f"Fila de jobs indisponível ({e}); o vídeo será pego pelo monitor da pasta.")
+        return False
+
+
+def _ler_mensagem(dados: bytes, pasta):
+    """
+    Mensagem de enviar_job validada, ou None se ela não tem um vídeo
+    (de dentro de pasta, se informada) e um pronto_em numérico.
+    """
+    try:
+        mensagem = json.loads(dados.decode("utf-8"))
+    except ValueError:
+        return None
+    if not isinstance(mensagem, dict) or not isinstance(mensagem.get("video"), str):
+        return None
+    if not isinstance(mensagem.get("pronto_em", 0.0), (int, float)):
+        return None
+    if pasta is not None and not dentro_da_pasta(mensagem["video"], pasta):
+        return None
+    return mensagem
+
+
+def _atender(conn, fila, pasta):
+    try:
+        while True:
+            dados = conn.recv_bytes()
+            mensagem = _ler_mensagem(dados, pasta)
+            if mensagem is None:
+                print(f"Aviso inválido na fila de jobs ignorado: {dados[:200]!r}")
+                continue
+            fila.put(mensagem)
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def _ouvir(listener, fila, pasta):
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, AuthenticationError) as e:
+            # Conexão recusada (ex.: chave errada); segue ouvindo
+            print(f"Erro ao aceitar conexão na fila de jobs: {e}")
+            continue
+        threading.Thread(target=_atender, args=(conn, fila, pasta), daemon=True).start()
+
+
+def iniciar_servidor_jobs(fila, pasta=None) -> Listener:
+    """
+    Começa a ouvir avisos de enviar_job() numa thread e coloca cada
+    mensagem ({"video": ..., "pronto_em": ...}) em fila. Com pasta, avisos
+    de vídeos fora dela são descartados.
+    """
+    listener = Listener(ENDERECO_FILA, authkey=chave_fila())
+    threading.Thread(target=_ouvir, args=(listener, fila, pasta), daemon=True).start()
+    print(f"Ouvindo avisos de upload em {ENDERECO_FILA[0]}:{ENDERECO_FILA[1]}")
+    return listener
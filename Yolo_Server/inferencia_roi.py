@@ -0,0 +1,249 @@
+import os
+import json
+import numpy as np
+
+# Inferência só nas regiões com movimento que o cliente manda junto com o
+# vídeo (saida.roi.json, ver Retira_Qualidade.salvar_regioes). Em cada
+# frame, as regiões e as caixas dos objetos já rastreados (que podem estar
+# parados) viram janelas quadradas recortadas do frame; as janelas do lote
+# inteiro vão num único predict() e as caixas voltam para as coordenadas
+# do frame antes do tracker. Cada janela é redimensionada (letterbox) na
+# mesma escala que o frame inteiro teria no imgsz do modelo, então os
+# objetos chegam ao detector do mesmo tamanho nos dois caminhos.
+EXTENSAO_REGIOES = ".roi.json"
+FRACAO_JANELA = 0.5        # lado da janela em relação ao maior lado do frame (0.5 = 1/4 do custo)
+MARGEM = 16                # pixels em volta de cada região/caixa
+MAX_FRACAO_JANELAS = 0.75  # acima desta fração da área do frame, roda no frame inteiro
+FRAMES_ENTRE_INTEIROS = 10  # a cada tantos frames inferidos, um frame inteiro acha objetos parados
+CONF_TRACK = 0.1           # o mesmo conf que o model.track() usa por padrão
+IOU_JUNCAO = 0.5           # NMS entre detecções repetidas de janelas sobrepostas
+
+
+def caminho_regioes(caminho_video):
+    return os.path.splitext(caminho_video)[0] + EXTENSAO_REGIOES
+
+
+def carregar_regioes(caminho_video):
+    """
+    Regiões de movimento do vídeo, se o cliente mandou: (tamanho, frames),
+    com frames[i] = lista de [x1, y1, x2, y2] do frame i do vídeo, ou None
+    quando não se sabe (ex.: o primeiro frame). Sem arquivo, devolve None.
+    """
+    caminho = caminho_regioes(caminho_video)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        return tuple(dados["tamanho"]), dados["frames"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[ROI] Regiões inválidas em {caminho} ({e}); usando o frame inteiro")
+        return None
+
+
+def _juntar_caixas(caixas):
+    """
+    Junta caixas que se sobrepõem até não sobrar sobreposição.
+    """
+    caixas = [list(c) for c in caixas]
+    mudou = True
+    while mudou:
+        mudou = False
+        juntas = []
+        for c in caixas:
+            for j in juntas:
+                if c[0] < j[2] and j[0] < c[2] and c[1] < j[3] and j[1] < c[3]:
+                    j[0], j[1] = min(j[0], c[0]), min(j[1], c[1])
+                    j[2], j[3] = max(j[2], c[2]), max(j[3], c[3])
+                    mudou = True
+                    break
+            else:
+                juntas.append(c)
+        caixas = juntas
+    return caixas
+
+
+def janelas_do_frame(regioes, caixas_rastreadas, largura, altura, tamanho,
+                     margem=MARGEM, max_fracao=MAX_FRACAO_JANELAS):
+    """
+    Cantos (x, y) das janelas tamanho x tamanho (em pixels do frame) que cobrem as regiões de
+    movimento e as caixas rastreadas, ou None para rodar no frame inteiro
+    (regiões desconhecidas, uma região maior que a janela, ou janelas
+    demais). Lista vazia: nada se moveu e não há objetos.
+    """
+    if regioes is None or largura < tamanho or altura < tamanho:
+        return None
+
+    caixas = [
+        (max(0, int(x1) - margem), max(0, int(y1) - margem),
+         min(largura, int(x2) + margem), min(altura, int(y2) + margem))
+        for x1, y1, x2, y2 in list(regioes) + list(caixas_rastreadas)
+    ]
+    caixas = [c for c in caixas if c[2] > c[0] and c[3] > c[1]]
+
+    janelas = []
+    for x1, y1, x2, y2 in _juntar_caixas(caixas):
+        if x2 - x1 > tamanho or y2 - y1 > tamanho:
+            return None
+        x = min(max(0, (x1 + x2 - tamanho) // 2), largura - tamanho)
+        y = min(max(0, (y1 + y2 - tamanho) // 2), altura - tamanho)
+        janelas.append((int(x), int(y)))
+
+    if len(janelas) * tamanho * tamanho > max_fracao * largura * altura:
+        return None
+    return janelas
+
+
+def _nms(deteccoes, iou):
+    """
+    NMS por classe em [[x1, y1, x2, y2, conf, cls], ...].
+    """
+    import torch
+    from torchvision.ops import batched_nms
+
+    d = torch.from_numpy(deteccoes)
+    manter = batched_nms(d[:, :4], d[:, 4], d[:, 5].long(), iou)
+    return deteccoes[manter.numpy()]
+
+
+class DetectorROI:
+    """
+    Detecção nas janelas de movimento + tracking, com a mesma saída de
+    _objetos_do_resultado: [(cls, obj_id, x1, y1, x2, y2), ...] por frame.
+
+    Usa o tracker que o model.track() criaria (mesma config), avançado
+    frame a frame com as detecções já no sistema de coordenadas do frame.
+    Com cache (cache_frames.CacheFrames), os frames marcados como
+    repetidos não passam pelo detector.
+    """
+
+    def __init__(self, model, tracker_config, regioes, fracao=FRACAO_JANELA, cache=None):
+        self.model = model
+        self.cache = cache
+        self.tamanho_regioes, self.regioes = regioes
+        largura, altura = self.tamanho_regioes
+
+        # Janela no frame e o imgsz equivalente, múltiplo de 32
+        imgsz = model.overrides.get("imgsz", 640)
+        imgsz = max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz
+        self.imgsz = max(32, int(round(imgsz * fracao / 32)) * 32)
+        self.tamanho = min(largura, altura, int(round(max(largura, altura) * self.imgsz / imgsz)))
+        self.desde_inteiro = 0
+        self.frames_inteiros = 0
+        self.frames_janelas = 0
+        self.frames_vazios = 0
+        self.janelas = 0
+
+        # Um track() num frame preto cria o tracker do jeito do Ultralytics
+        model.track(np.zeros((altura, largura, 3), dtype=np.uint8), tracker=tracker_config,
+                    persist=True, verbose=False)
+        self.tracker = model.predictor.trackers[0]
+        self.tracker.reset()
+        if cache is not None:
+            cache.acompanhar(self.tracker)
+
+    def _regioes_do_frame(self, indice, frame):
+        altura, largura = frame.shape[:2]
+        if (largura, altura) != tuple(self.tamanho_regioes) or indice >= len(self.regioes):
+            return None
+        return self.regioes[indice]
+
+    def _caixas_conhecidas(self):
+        """
+        Caixas de todas as trilhas do tracker, inclusive as ainda não
+        confirmadas e as perdidas há pouco, para que continuem sendo
+        procuradas mesmo sem movimento.
+        """
+        return [t.xyxy for t in self.tracker.tracked_stracks + self.tracker.lost_stracks]
+
+    def processar(self, frames, indices, repetidos=None):
+        """
+        Detecta e rastreia um lote de frames consecutivos. repetidos[i]
+        True: o frame i repete as detecções do último frame inferido.
+        """
+        from ultralytics.engine.results import Boxes
+
+        # As janelas do lote usam as trilhas de antes dele, para que todo
+        # o lote vá para o detector de uma vez. Objetos que nunca se
+        # moveram não aparecem em nenhuma delas; um frame inteiro de tempos
+        # em tempos os encontra, sempre no fim do lote, para que o próximo
+        # lote já procure as trilhas novas.
+        repetidos = repetidos or [False] * len(frames)
+        caixas = self._caixas_conhecidas()
+        planos = []
+        for n, (frame, indice) in enumerate(zip(frames, indices)):
+            if repetidos[n]:
+                planos.append(())
+                continue
+            altura, largura = frame.shape[:2]
+            plano = None
+            if n < len(frames) - 1 or self.desde_inteiro < FRAMES_ENTRE_INTEIROS:
+                plano = janelas_do_frame(self._regioes_do_frame(indice, frame), caixas,
+                                         largura, altura, self.tamanho)
+            self.desde_inteiro = 0 if plano is None else self.desde_inteiro + 1
+            planos.append(plano)
+
+        deteccoes = [[] for _ in frames]
+
+        inteiros = [i for i, plano in enumerate(planos) if plano is None]
+        if inteiros:
+            results = self.model.predict([frames[i] for i in inteiros], conf=CONF_TRACK, verbose=False)
+            for i, r in zip(inteiros, results):
+                deteccoes[i].append(r.boxes.data.cpu().numpy())
+
+        recortes = [(i, x, y) for i, plano in enumerate(planos) if plano for x, y in plano]
+        if recortes:
+            t = self.tamanho
+            results = self.model.predict([frames[i][y:y + t, x:x + t] for i, x, y in recortes],
+                                         imgsz=self.imgsz, conf=CONF_TRACK, verbose=False)
+            for (i, x, y), r in zip(recortes, results):
+                d = r.boxes.data.cpu().numpy().copy()
+                d[:, [0, 2]] += x
+                d[:, [1, 3]] += y
+                deteccoes[i].append(d)
+
+        objetos_lote = []
+        for frame, plano, partes, repetido in zip(frames, planos, deteccoes, repetidos):
+            if repetido:
+                objetos_lote.append(self.cache.repetir(self.tracker, frame))
+                continue
+
+            if plano is None:
+                self.frames_inteiros += 1
+            elif plano:
+                self.frames_janelas += 1
+                self.janelas += len(plano)
+            else:
+                self.frames_vazios += 1
+
+            d = np.concatenate(partes) if partes else np.zeros((0, 6), dtype=np.float32)
+            if plano and len(plano) > 1 and len(d):
+                d = _nms(d, IOU_JUNCAO)
+
+            tracks = self.tracker.update(Boxes(d, frame.shape[:2]), frame)
+            objetos_lote.append([
+                (int(t[6]), int(t[4]), *(int(v) for v in t[:4]))
+                for t in tracks
+            ])
+
+        return objetos_lote
+
+    def custo_relativo(self):
+        """
+        Área processada pelo detector em relação a rodar todos os frames inteiros.
+        """
+        largura, altura = self.tamanho_regioes
+        frames = self.frames_inteiros + self.frames_janelas + self.frames_vazios
+        if not frames:
+            return 1.0
+        area = self.frames_inteiros * largura * altura + self.janelas * self.tamanho * self.tamanho
+        return area / (frames * largura * altura)
+
+    def resumo(self):
+        return {"frames_janelas": self.frames_janelas, "janelas": self.janelas,
+                "frames_inteiros": self.frames_inteiros, "frames_vazios": self.frames_vazios,
+                "custo_relativo": self.custo_relativo()}
+
+    def __str__(self):
+        return (f"{self.frames_janelas} frames em {self.janelas} janelas, {self.frames_inteiros} inteiros, "
+                f"{self.frames_vazios} sem movimento; custo {self.custo_relativo():.0%} do frame inteiro")
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import random
+import bisect
+import argparse
+from jogadas import classificar_evento, ordenar_timestamps, analisar_jogadas
+
+# Eventos por janela enviada ao modelo de linguagem. Cada jogada gera
+# alguns eventos e ~80 tokens de resposta, então 40 eventos ficam bem
+# abaixo do max_tokens de 1000 do build_payload.
+MAX_EVENTOS_JANELA = int(os.getenv("LLM_MAX_EVENTOS_JANELA", "40"))
+
+
+def _indices_fechamento(lista):
+    """
+    Índices dos eventos "no longer aligned" por par e de "left the scene"
+    por objeto, em ordem, para achar o fim de um alinhamento com bisect.
+    """
+    desalinhou = {}
+    saiu = {}
+    for i, (_, _, evento) in enumerate(lista):
+        if evento is None:
+            continue
+        tipo, a, b = evento
+        if tipo == "desalinhou":
+            desalinhou.setdefault(frozenset((a, b)), []).append(i)
+        elif tipo == "saiu":
+            saiu.setdefault(a, []).append(i)
+    return desalinhou, saiu
+
+
+def _fechamento(lista, i, a, b, desalinhou, saiu):
+    """
+    Evento que encerra o alinhamento lista[i] entre a e b, pelas regras do
+    SYSTEM_PROMPT: o "no longer aligned" do par ou, sem ele, a primeira
+    saída de um dos dois num timestamp posterior. None se não houver.
+    """
+    indices = desalinhou.get(frozenset((a, b)), [])
+    k = bisect.bisect_right(indices, i)
+    if k < len(indices):
+        return lista[indices[k]][:2]
+
+    t0 = lista[i][0]
+    candidatos = []
+    for objeto in (a, b):
+        indices = saiu.get(objeto, [])
+        k = bisect.bisect_right(indices, i)
+        while k < len(indices) and lista[indices[k]][0] == t0:
+            k += 1
+        if k < len(indices):
+            candidatos.append(indices[k])
+    return lista[min(candidatos)][:2] if candidatos else None
+
+
+def dividir_em_janelas(cena, max_eventos=MAX_EVENTOS_JANELA):
+    """
+    Divide a descrição da cena em janelas de até max_eventos eventos,
+    cortando só entre timestamps. Cada janela ainda leva:
+    - o "entered the scene" dos objetos que já estavam ativos no início
+      dela (para o fallback de coexistência);
+    - o evento que encerra cada alinhamento aberto nela, mesmo que esteja
+      depois do corte (as janelas se sobrepõem em volta dos alinhamentos
+      abertos, e o end_time da jogada sai certo).
+    Cenas que cabem numa janela voltam como [cena], e também as sem
+    nenhum alinhamento: a resposta é a única jogada de coexistência, que
+    não pesa no max_tokens, e só a cena inteira tem todas as entradas e
+    saídas que a decidem.
+    """
+    timestamps = ordenar_timestamps(cena)
+
+    grupos = []
+    contagem = max_eventos
+    for t in timestamps:
+        if contagem + len(cena[t]) > max_eventos and contagem > 0:
+            grupos.append([])
+            contagem = 0
+        grupos[-1].append(t)
+        contagem += len(cena[t])
+
+    if len(grupos) <= 1:
+        return [cena]
+
+    lista = [(t, texto, classificar_evento(texto)) for t in timestamps for texto in cena[t]]
+    if not any(evento is not None and evento[0] == "alinhou" for _, _, evento in lista):
+        return [cena]
+
+    desalinhou, saiu = _indices_fechamento(lista)
+    posicao = {t: p for p, t in enumerate(timestamps)}
+
+    janelas = []
+    ativos = {}  # objeto -> (t, texto) da entrada dele
+    i = 0
+    for grupo in grupos:
+        janela = {}
+
+        def incluir(t, texto):
+            eventos = janela.setdefault(t, [])
+            if texto not in eventos:
+                eventos.append(texto)
+
+        for t, texto in ativos.values():
+            incluir(t, texto)
+
+        ultimo = posicao[grupo[-1]]
+        while i < len(lista) and posicao[lista[i][0]] <= ultimo:
+            t, texto, evento = lista[i]
+            incluir(t, texto)
+
+            if evento is not None:
+                tipo, a, b = evento
+                if tipo == "entrou":
+                    ativos[a] = (t, texto)
+                elif tipo == "saiu":
+                    ativos.pop(a, None)
+                elif tipo == "alinhou" and a != b:
+                    fim = _fechamento(lista, i, a, b, desalinhou, saiu)
+                    if fim is not None and posicao[fim[0]] > ultimo:
+                        incluir(*fim)
+            i += 1
+
+        janelas.append({t: janela[t] for t in ordenar_timestamps(janela)})
+
+    return janelas
+
+
+def _tempo(jogada):
+    try:
+        return float(jogada.get("start_time"))
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+def juntar_jogadas(cena, listas):
+    """
+    Junta as jogadas de cada janela: remove as repetidas nas bordas (mesmo
+    par e mesmo start_time) e aplica as regras globais que nenhuma janela
+    sozinha enxerga: havendo alinhamentos na cena, só ficam jogadas que
+    começam num alinhamento; sem eles, só a primeira jogada de coexistência.
+    """
+    alinhamentos = set()
+    for t, eventos in cena.items():
+        for texto in eventos:
+            evento = classificar_evento(texto)
+            if evento is not None and evento[0] == "alinhou":
+                alinhamentos.add((frozenset(evento[1:]), t))
+
+    vistas = set()
+    jogadas = []
+    for lista in listas:
+        for jogada in lista:
+            chave = (frozenset((jogada.get("object_1_id"), jogada.get("object_2_id"))),
+                     str(jogada.get("start_time")))
+            if chave in vistas:
+                continue
+            if alinhamentos and chave not in alinhamentos:
+                continue
+            vistas.add(chave)
+            jogadas.append(jogada)
+
+    jogadas.sort(key=_tempo)
+    return jogadas if alinhamentos else jogadas[:1]
+
+
+def ler_jogadas(content):
+    """
+    Array JSON da resposta do modelo, tolerando cercas ```json.
+    """
+    texto = content.strip()
+    if texto.startswith("```"):
+        texto = texto.split("\n", 1)[1].rsplit("```", 1)[0]
+    return json.loads(texto)
+
+
+def cena_sintetica(jogadas, seed=0):
+    """
+    Cena com `jogadas` alinhamentos entre pares de objetos que entram,
+    se alinham, se sobrepõem e saem, para testar as janelas.
+    """
+    rng = random.Random(seed)
+    tipos = ["Rock", "Paper", "Scissors"]
+    cena = {}
+    t = 1.0
+    proximo_id = {tipo: 1 for tipo in tipos}
+
+    def evento(tempo, texto):
+        cena.setdefault(f"{tempo:.2f}", []).append(texto)
+
+    for _ in range(jogadas):
+        objetos = []
+        for tipo in rng.sample(tipos, 2) if rng.random() < 0.7 else [rng.choice(tipos)] * 2:
+            objetos.append(f"{tipo} {proximo_id[tipo]}")
+            proximo_id[tipo] += 1
+        a, b = objetos
+
+        evento(t, f"{a} entered the scene.")
+        evento(t + 0.33, f"{b} entered the scene.")
+        evento(t + 0.67, f"{a} is horizontally aligned with {b}.")
+        evento(t + 1.0, f"{a} is overlapping {b}.")
+        if rng.random() < 0.7:
+            evento(t + 1.33, f"{a} is no longer horizontally aligned with {b}.")
+        evento(t + 1.67, f"{a} left the scene.")
+        evento(t + 1.67, f"{a} stopped overlapping {b}.")
+        evento(t + 2.0, f"{b} left the scene.")
+        t += 2.33
+    return cena
+
+
+def benchmark(tamanhos=(5, 50, 200), ms_por_token=5.0, concorrencia=64):
+    """
+    Contra o stub_llm (que responde com as regras locais, trunca em
+    max_tokens e demora proporcionalmente aos tokens de resposta):
+    uma requisição com a cena inteira x janelas em paralelo.
+    """
+    import stub_llm
+    from api_gpt import build_payload
+    from cliente_llm import ClienteLLM
+
+    config = stub_llm.ConfigStub(latencia=0.2, jitter=0.0, ms_por_token=ms_por_token)
+    servidor = stub_llm.iniciar_stub(config, porta=0)
+    cliente = ClienteLLM(base_url=f"http://127.0.0.1:{servidor.server_port}/v1", api_key="stub",
+                         concorrencia=concorrencia, req_por_segundo=1000, rajada=concorrencia)
+
+    def recuperar(content):
+        try:
+            return ler_jogadas(content)
+        except ValueError:
+            return None  # resposta truncada
+
+    for n in tamanhos:
+        cena = cena_sintetica(n)
+        esperado = analisar_jogadas(cena)
+
+        inicio = time.perf_counter()
+        body = build_payload(log=json.dumps(cena, indent=2))
+        inteira = recuperar(cliente.enviar(body).result().choices[0].message.content)
+        tempo_inteira = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        janelas = dividir_em_janelas(cena)
+        futuros = [cliente.enviar(build_payload(log=json.dumps(j, indent=2))) for j in janelas]
+        listas = [ler_jogadas(f.result().choices[0].message.content) for f in futuros]
+        juntas = juntar_jogadas(cena, listas)
+        tempo_janelas = time.perf_counter() - inicio
+
+        print(
+            f"{n:4d} jogadas | inteira: {tempo_inteira:6.2f}s, "
+            f"{'truncada' if inteira is None else f'{len(inteira)} jogadas':>12} | "
+            f"{len(janelas):3d} janela(s): {tempo_janelas:6.2f}s, {len(juntas)} jogadas, "
+            f"iguais às regras locais: {juntas == esperado}"
+        )
+
+    cliente.fechar()
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Divide a descrição da cena em janelas para o modelo.")
+    parser.add_argument("cena", nargs="?", default="./scene_description.json")
+    parser.add_argument("--max-eventos", type=int, default=MAX_EVENTOS_JANELA)
+    parser.add_argument("--bench", action="store_true",
+                        help="cena inteira x janelas em paralelo contra o stub_llm")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark()
+    else:
+        with open(args.cena, "r", encoding="utf-8") as f:
+            cena = json.load(f)
+        janelas = dividir_em_janelas(cena, args.max_eventos)
+        for n, janela in enumerate(janelas, 1):
+            eventos = sum(len(e) for e in janela.values())
+            print(f"janela {n}: {min(janela, key=float)} a {max(janela, key=float)} ({eventos} eventos)")
+        listas = [analisar_jogadas(janela) for janela in janelas]
+        iguais = juntar_jogadas(cena, listas) == analisar_jogadas(cena)
+        print(f"jogadas das janelas juntas == jogadas da cena inteira: {iguais}")
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import time
+import argparse
+
+# Como a cena vira o resultado das jogadas:
+#   "local" = regras abaixo (mesma especificação do SYSTEM_PROMPT do api_gpt)
+#   "llm"   = callOpenAI, como antes
+#   "auto"  = regras locais; se falharem, cai no callOpenAI
+MODO_ANALISE = os.getenv("MODO_ANALISE", "local")
+
+TIPOS = {"rock": "Rock", "paper": "Paper", "scissor": "Scissor", "scissors": "Scissor"}
+VENCE = {"Rock": "Scissor", "Scissor": "Paper", "Paper": "Rock"}
+
+_EVENTOS = [
+    ("alinhou", re.compile(r"^(.+ \S+) is horizontally aligned with (.+ \S+)\.$")),
+    ("desalinhou", re.compile(r"^(.+ \S+) is no longer horizontally aligned with (.+ \S+)\.$")),
+    ("entrou", re.compile(r"^(.+ \S+) entered the scene\.$")),
+    ("saiu", re.compile(r"^(.+ \S+) left the scene\.$")),
+]
+
+
+def classificar_evento(texto):
+    """
+    "Rock 1 left the scene." -> ("saiu", "Rock 1", None); None para eventos
+    que não importam para as jogadas (sobreposição).
+    """
+    for tipo, padrao in _EVENTOS:
+        m = padrao.match(texto)
+        if m:
+            return tipo, m.group(1), m.group(2) if m.lastindex == 2 else None
+    return None
+
+
+def ordenar_timestamps(cena):
+    return sorted(cena.keys(), key=lambda t: tuple(float(x) for x in t.split(":")))
+
+
+def _eventos_em_ordem(cena):
+    """
+    Lista [(timestamp, tipo, objeto_a, objeto_b), ...] em ordem de tempo,
+    só com os eventos que importam para as jogadas (sobreposição é ignorada).
+    """
+    eventos = []
+    for t in ordenar_timestamps(cena):
+        for texto in cena[t]:
+            evento = classificar_evento(texto)
+            if evento is not None:
+                eventos.append((t, *evento))
+    return eventos
+
+
+def tipo_do_objeto(nome):
+    """
+    "Scissors 2" -> "Scissor"; None se o tipo não for de pedra-papel-tesoura.
+    """
+    return TIPOS.get(nome.rsplit(" ", 1)[0].strip().lower())
+
+
+def resultado(objeto_1, objeto_2):
+    """
+    Devolve (result, explanation) da jogada entre dois objetos.
+    """
+    tipo_1 = tipo_do_objeto(objeto_1)
+    tipo_2 = tipo_do_objeto(objeto_2)
+
+    if tipo_1 is None or tipo_2 is None:
+        desconhecido = objeto_1 if tipo_1 is None else objeto_2
+        return "undetermined", f"Could not infer the type of {desconhecido}."
+    if tipo_1 == tipo_2:
+        return "draw", f"{objeto_1} and {objeto_2} are both {tipo_1}: draw."
+    if VENCE[tipo_1] == tipo_2:
+        return f"{tipo_1} wins", f"{objeto_1} ({tipo_1}) beats {objeto_2} ({tipo_2}): {tipo_1} beats {tipo_2}."
+    return f"{tipo_2} wins", f"{objeto_2} ({tipo_2}) beats {objeto_1} ({tipo_1}): {tipo_2} beats {tipo_1}."
+
+
+def _jogada(objeto_1, objeto_2, inicio, fim):
+    result, explanation = resultado(objeto_1, objeto_2)
+    return {
+        "result": result,
+        "object_1_id": objeto_1,
+        "object_2_id": objeto_2,
+        "start_time": inicio,
+        "end_time": fim,
+        "explanation": explanation,
+    }
+
+
+def _primeira_saida(eventos, depois_de, objetos):
+    for i in range(depois_de + 1, len(eventos)):
+        t, tipo, a, _ = eventos[i]
+        if tipo == "saiu" and a in objetos and t != eventos[depois_de][0]:
+            return t
+    return None
+
+
+def jogadas_por_alinhamento(eventos):
+    """
+    Uma jogada por evento "is horizontally aligned with": vai até o
+    "no longer horizontally aligned" do mesmo par, ou até a primeira saída
+    de um dos dois depois do início, ou termina no próprio início.
+    """
+    jogadas = []
+    for i, (t, tipo, a, b) in enumerate(eventos):
+        if tipo != "alinhou" or a == b:
+            continue
+
+        fim = None
+        for t2, tipo2, a2, b2 in eventos[i + 1:]:
+            if tipo2 == "desalinhou" and {a2, b2} == {a, b}:
+                fim = t2
+                break
+        if fim is None:
+            fim = _primeira_saida(eventos, i, (a, b))
+
+        jogadas.append(_jogada(a, b, t, fim if fim is not None else t))
+    return jogadas
+
+
+def jogada_por_coexistencia(eventos):
+    """
+    Fallback sem alinhamentos: o primeiro timestamp em que dois objetos
+    diferentes estão ativos ao mesmo tempo gera a única jogada, entre os
+    dois que entraram por último. Entradas e saídas do mesmo timestamp
+    valem juntas (quem saiu naquele frame já não estava lá).
+    """
+    ativos = []  # em ordem de entrada
+    i = 0
+    while i < len(eventos):
+        t = eventos[i][0]
+        inicio = i
+        while i < len(eventos) and eventos[i][0] == t:
+            _, tipo, a, _ = eventos[i]
+            if a in ativos and tipo in ("entrou", "saiu"):
+                ativos.remove(a)
+            if tipo == "entrou":
+                ativos.append(a)
+            i += 1
+
+        if len(ativos) >= 2:
+            objeto_1, objeto_2 = ativos[-2], ativos[-1]
+            fim = _primeira_saida(eventos, inicio, (objeto_1, objeto_2))
+            return [_jogada(objeto_1, objeto_2, t, fim if fim is not None else t)]
+    return []
+
+
+def analisar_jogadas(cena):
+    """
+    Regras locais: recebe a descrição da cena (o dict do li.analyze_log) e
+    devolve a lista de jogadas no formato pedido ao modelo de linguagem.
+    """
+    eventos = _eventos_em_ordem(cena)
+    return jogadas_por_alinhamento(eventos) or jogada_por_coexistencia(eventos)
+
+
+def analisar_local(caminho_arquivo="./scene_description.json"):
+    """
+    Mesma assinatura e retorno do callOpenAI: o texto JSON das jogadas.
+    """
+    with open(caminho_arquivo, "r", encoding="utf-8") as f:
+        cena = json.load(f)
+
+    content = json.dumps(analisar_jogadas(cena), indent=2, ensure_ascii=False)
+    print("Jogadas (regras locais):")
+    print(content)
+    return content
+
+
+def analisar_cena(caminho_arquivo="./scene_description.json", modo=None):
+    """
+    Analisa a cena conforme MODO_ANALISE (ou modo) e devolve o texto JSON
+    das jogadas, ou None em caso de erro.
+    """
+    modo = modo or MODO_ANALISE
+
+    if modo != "llm":
+        try:
+            return analisar_local(caminho_arquivo)
+        except Exception as e:
+            print(f"Erro nas regras locais: {e}")
+            if modo == "local":
+                return None
+
+    from api_gpt import callOpenAI
+    return callOpenAI(caminho_arquivo)
+
+
+def _chave_comparacao(jogada):
+    # A explicação é texto livre; o resto precisa bater
+    return (
+        jogada.get("result"),
+        jogada.get("object_1_id"),
+        jogada.get("object_2_id"),
+        str(jogada.get("start_time")),
+        str(jogada.get("end_time")),
+    )
+
+
+def caminho_resposta(caminho_cena):
+    """
+    Onde fica a resposta gravada do modelo para uma cena:
+    cenas_gravadas/saidas.json -> cenas_gravadas/saidas.resposta.json
+    """
+    return os.path.splitext(caminho_cena)[0] + ".resposta.json"
+
+
+def comparar(caminhos, gravar=False):
+    """
+    Roda as regras locais e o modelo de linguagem nas mesmas cenas gravadas
+    e mostra onde as jogadas divergem (sem olhar a explicação). Com gravar,
+    salva a resposta do modelo ao lado de cada cena (ver caminho_resposta),
+    para o test_jogadas comparar sem chamar o modelo.
+    """
+    from api_gpt import callOpenAI
+
+    iguais = 0
+    for caminho in caminhos:
+        with open(caminho, "r", encoding="utf-8") as f:
+            cena = json.load(f)
+
+        inicio = time.perf_counter()
+        local = analisar_jogadas(cena)
+        tempo_local = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        content = callOpenAI(caminho)
+        tempo_llm = time.perf_counter() - inicio
+
+        try:
+            llm = json.loads(content)
+        except (TypeError, ValueError):
+            print(f"[DIFF] {caminho}: resposta do modelo não é JSON")
+            continue
+        if gravar:
+            with open(caminho_resposta(caminho), "w", encoding="utf-8") as f:
+                json.dump(llm, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+
+        a = [_chave_comparacao(j) for j in local]
+        b = [_chave_comparacao(j) for j in llm]
+        if a == b:
+            iguais += 1
+            print(f"[OK]   {caminho}: {len(a)} jogada(s) | local {tempo_local * 1e6:.0f} us, "
+                  f"modelo {tempo_llm:.2f}s")
+        else:
+            print(f"[DIFF] {caminho}:")
+            for jogada in a:
+                if jogada not in b:
+                    print(f"         só local : {jogada}")
+            for jogada in b:
+                if jogada not in a:
+                    print(f"         só modelo: {jogada}")
+
+    print(f"{iguais} de {len(caminhos)} cena(s) com as mesmas jogadas")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Jogadas de pedra-papel-tesoura a partir da cena.")
+    parser.add_argument("cenas", nargs="*", default=["./scene_description.json"])
+    parser.add_argument("--comparar", action="store_true",
+                        help="compara as regras locais com o modelo de linguagem")
+    parser.add_argument("--gravar", action="store_true",
+                        help="com --comparar, salva a resposta do modelo ao lado de cada cena")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(args.cenas, args.gravar)
+    else:
+        for caminho in args.cenas:
+            analisar_local(caminho)
@@ -1,5 +1,13 @@
 import json
+import time
+import random
 import argparse
+import numpy as np
+import metricas
+
+ANALYZE_TIME = metricas.histograma("analise_log_segundos", "Time to turn a whole tracking log into the scene description.")
+FRAME_ANALYZE_TIME = metricas.histograma("analise_frame_segundos", "Time SceneAnalyzer spends on one frame.",
+                                         baldes=metricas.BALDES_FRAME)
 
 
 def parse_pos(pos_str):
@@ -55,10 +63,10 @@ def horizontally_aligned(a, b, tolerance=0.2):
     return abs(cy_a - cy_b) <= tolerance * ref_h
 
 
-def analyze_log(log_data):
+def analyze_log_python(log_data):
     """
-    Receives the original log (a dict) and returns a new dict:
-    { timestamp: [event descriptions...] }
+    Pure-Python reference implementation of analyze_log (pairwise double
+    loop). Kept for benchmarking and for checking the vectorized engine.
     """
 
     timestamps = sorted(
@@ -140,8 +148,406 @@ def analyze_log(log_data):
 
     return result
 
+# Upper bound on frames x pairs evaluated in one vectorized block
+MAX_PAIR_FRAMES = 2_000_000
+
+# Below this many objects per frame the pairwise double loop is faster
+# than building arrays (the usual scene has two hands); see --bench
+VECTORIZE_MIN_OBJECTS = 8
+
+
+def pairs_overlap(a, b):
+    """
+    Vectorized boxes_overlap: a and b are arrays of boxes (..., 4) compared
+    element-wise. Returns a boolean array of shape a.shape[:-1].
+    """
+    inter_x1 = np.maximum(a[..., 0], b[..., 0])
+    inter_y1 = np.maximum(a[..., 1], b[..., 1])
+    inter_x2 = np.minimum(a[..., 2], b[..., 2])
+    inter_y2 = np.minimum(a[..., 3], b[..., 3])
+
+    return (inter_x2 > inter_x1) & (inter_y2 > inter_y1)
+
+
+def pairs_aligned(a, b, tolerance=0.2):
+    """
+    Vectorized horizontally_aligned: a and b are arrays of boxes (..., 4)
+    compared element-wise. Returns a boolean array of shape a.shape[:-1].
+    """
+    h_a = a[..., 3] - a[..., 1]
+    h_b = b[..., 3] - b[..., 1]
+    ref_h = np.minimum(h_a, h_b)
+
+    cy_a = (a[..., 1] + a[..., 3]) / 2.0
+    cy_b = (b[..., 1] + b[..., 3]) / 2.0
+
+    return (ref_h > 0) & (np.abs(cy_a - cy_b) <= tolerance * ref_h)
+
+
+_upper_cache = {}
+
+
+def _upper_pairs(n):
+    """
+    Cached np.triu_indices(n, 1): every object pair i < j, in sorted order.
+    """
+    if n not in _upper_cache:
+        _upper_cache[n] = np.triu_indices(n, 1)
+    return _upper_cache[n]
+
+
+def _blocks(frames):
+    """
+    Splits the parsed frames into blocks of consecutive frames with the
+    same object keys, capped so a block has at most MAX_PAIR_FRAMES pairs.
+    """
+    start = 0
+    while start < len(frames):
+        keys = frames[start][1]
+        pairs = max(1, len(keys) * (len(keys) - 1) // 2)
+        limit = start + max(1, MAX_PAIR_FRAMES // pairs)
+
+        end = start + 1
+        while end < len(frames) and end < limit and frames[end][1] == keys:
+            end += 1
+
+        yield frames[start:end]
+        start = end
+
+
+def analyze_log(log_data, vectorize=None):
+    """
+    Receives the original log (a dict) and returns a new dict:
+    { timestamp: [event descriptions...] }
+
+    Consecutive frames with the same objects are evaluated together:
+    overlap and alignment of every pair in every frame come out of one
+    vectorized pass, and the overlapping/aligned events are the boolean
+    diffs between each frame and the previous one. Produces the same events
+    as analyze_log_python; when a frame has several pair events of the same
+    kind they are listed in sorted pair order.
+
+    vectorize: None picks the vectorized engine only when some frame has
+    at least VECTORIZE_MIN_OBJECTS objects; True/False force it on/off.
+    """
+
+    timestamps = sorted(
+        log_data.keys(),
+        key=lambda t: tuple(float(x) for x in t.split(":"))
+    )
+
+    frames = []
+    for t in timestamps:
+        objects = {}
+        for category, objs in log_data[t].items():
+            for o in objs:
+                oid = o["ID"]
+                bbox = parse_pos(o["pos"])
+                objects[(category, oid)] = bbox
+
+        keys = sorted(objects.keys())
+        frames.append((t, keys, [objects[k] for k in keys]))
+
+    return _analyze_frames(frames, vectorize)
+
+
+def analyze_columnar(records, names):
+    """
+    analyze_log for a columnar log (see log_colunar): records is the
+    structured array from log_colunar.carregar_log, names maps class id to
+    category. Frames are told apart by frame index rather than by timestamp
+    string, so two frames that round to the same "%.2f" key are both
+    analyzed; their events are listed together under that key.
+    """
+    from log_colunar import limites_frames
+
+    if len(records) == 0:
+        return {}
+
+    # Category rank by name, so one lexsort puts every frame in key order
+    categories = sorted(set(names.values()))
+    rank = np.zeros(max(names) + 1, dtype=np.intp)
+    for cls, name in names.items():
+        rank[cls] = categories.index(name)
+
+    frame_idx = np.asarray(records["frame"])
+    cat_rank = rank[np.asarray(records["cls"])]
+    ids = np.asarray(records["id"])
+    order = np.lexsort((ids, cat_rank, frame_idx))
+
+    bounds = limites_frames(records).tolist()
+    times = np.asarray(records["t"])[bounds[:-1]].tolist()
+    keys_all = list(zip((categories[r] for r in cat_rank[order].tolist()), ids[order].tolist()))
+    boxes_all = np.asarray(records["caixa"])[order].tolist()
+
+    frames = []
+    for t, a, b in zip(times, bounds[:-1], bounds[1:]):
+        frames.append((f"{t:.2f}", keys_all[a:b], boxes_all[a:b]))
+
+    return _analyze_frames(frames)
+
+
+def _pair_relations(keys, boxes):
+    """
+    Overlapping and aligned pairs of one frame, as two sets of
+    (key_i, key_j) with i < j in key order. keys are sorted and boxes are
+    in key order. Small frames use the plain double loop.
+    """
+    overlaps = set()
+    alignments = set()
+    n = len(keys)
+    if n < VECTORIZE_MIN_OBJECTS:
+        for i in range(n):
+            for j in range(i + 1, n):
+                if boxes_overlap(boxes[i], boxes[j]):
+                    overlaps.add((keys[i], keys[j]))
+                if horizontally_aligned(boxes[i], boxes[j]):
+                    alignments.add((keys[i], keys[j]))
+    else:
+        iu, ju = _upper_pairs(n)
+        boxes = np.array(boxes, dtype=np.int64)
+        a = boxes[iu]
+        b = boxes[ju]
+        for p in np.flatnonzero(pairs_overlap(a, b)):
+            overlaps.add((keys[iu[p]], keys[ju[p]]))
+        for p in np.flatnonzero(pairs_aligned(a, b)):
+            alignments.add((keys[iu[p]], keys[ju[p]]))
+    return overlaps, alignments
+
+
+def _frame_events(keys, boxes, prev):
+    """
+    Events of one frame against the previous one. prev and the returned
+    state are (keys set, overlaps, alignments); start with (set(), set(), set()).
+    """
+    prev_keys, prev_overlaps, prev_alignments = prev
+    current_keys = set(keys)
+
+    events = []
+    if current_keys != prev_keys:
+        for cat, oid in sorted(current_keys - prev_keys):
+            events.append(f"{cat} {oid} entered the scene.")
+
+        for cat, oid in sorted(prev_keys - current_keys):
+            events.append(f"{cat} {oid} left the scene.")
+
+    overlaps, alignments = _pair_relations(keys, boxes)
+    if overlaps != prev_overlaps or alignments != prev_alignments:
+        changes = (
+            ("{} {} is overlapping {} {}.", overlaps - prev_overlaps),
+            ("{} {} stopped overlapping {} {}.", prev_overlaps - overlaps),
+            ("{} {} is horizontally aligned with {} {}.", alignments - prev_alignments),
+            ("{} {} is no longer horizontally aligned with {} {}.", prev_alignments - alignments),
+        )
+        for template, pairs in changes:
+            for (cat1, id1), (cat2, id2) in sorted(pairs):
+                events.append(template.format(cat1, id1, cat2, id2))
+
+    return events, (current_keys, overlaps, alignments)
+
+
+def _analyze_frames_small(frames):
+    """
+    Frame-by-frame engine for logs with few objects per frame, where
+    array setup costs more than the pairs themselves.
+    """
+    result = {}
+    state = (set(), set(), set())
+    for t, keys, boxes in frames:
+        events, state = _frame_events(keys, boxes, state)
+        if events:
+            result.setdefault(t, []).extend(events)
+    return result
+
+
+def _analyze_frames(frames, vectorize=None):
+    """
+    Engine behind analyze_log: frames is a list of (timestamp, sorted keys,
+    boxes in key order), in time order. See analyze_log for vectorize.
+    """
+    if vectorize is None:
+        vectorize = any(len(keys) >= VECTORIZE_MIN_OBJECTS for _, keys, _ in frames)
+    if not vectorize:
+        return _analyze_frames_small(frames)
+
+    templates = (
+        "{} {} is overlapping {} {}.",
+        "{} {} stopped overlapping {} {}.",
+        "{} {} is horizontally aligned with {} {}.",
+        "{} {} is no longer horizontally aligned with {} {}.",
+    )
+
+    result = {}
+    prev_keys = []
+    prev_pairs = _upper_pairs(0)
+    prev_active = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+
+    for block in _blocks(frames):
+        keys = block[0][1]
+        iu, ju = _upper_pairs(len(keys))
+
+        boxes = np.array([f[2] for f in block], dtype=np.int64).reshape(len(block), len(keys), 4)
+        a = boxes[:, iu]
+        b = boxes[:, ju]
+        relations = (pairs_overlap(a, b), pairs_aligned(a, b))  # each (frames, pairs)
+
+        events = [[] for _ in block]
+
+        # First frame of the block against the frame before it. Pairs of both
+        # frames are numbered over the sorted union of their keys, so the
+        # set differences come out already in sorted pair order.
+        current_set = set(keys)
+        prev_set = set(prev_keys)
+
+        for cat, oid in sorted(current_set - prev_set):
+            events[0].append(f"{cat} {oid} entered the scene.")
+
+        for cat, oid in sorted(prev_set - current_set):
+            events[0].append(f"{cat} {oid} left the scene.")
+
+        union = sorted(current_set | prev_set)
+        position = {k: i for i, k in enumerate(union)}
+        cur_pos = np.array([position[k] for k in keys], dtype=np.intp)
+        prev_pos = np.array([position[k] for k in prev_keys], dtype=np.intp)
+        n = len(union)
+
+        boundary = []
+        for r, rel in enumerate(relations):
+            active = np.flatnonzero(rel[0])
+            cur_codes = cur_pos[iu[active]] * n + cur_pos[ju[active]]
+            pa = prev_active[r]
+            prev_codes = prev_pos[prev_pairs[0][pa]] * n + prev_pos[prev_pairs[1][pa]]
+            boundary.append(np.setdiff1d(cur_codes, prev_codes, assume_unique=True))
+            boundary.append(np.setdiff1d(prev_codes, cur_codes, assume_unique=True))
+
+        for template, codes in zip(templates, boundary):
+            for code in codes:
+                (cat1, id1), (cat2, id2) = union[code // n], union[code % n]
+                events[0].append(template.format(cat1, id1, cat2, id2))
+
+        # Remaining frames of the block: diff each frame against the previous one
+        if len(block) > 1:
+            changes = []
+            for rel in relations:
+                changes.append(rel[1:] & ~rel[:-1])
+                changes.append(rel[:-1] & ~rel[1:])
+
+            for template, changed in zip(templates, changes):
+                for f, p in zip(*np.nonzero(changed)):
+                    (cat1, id1), (cat2, id2) = keys[iu[p]], keys[ju[p]]
+                    events[f + 1].append(template.format(cat1, id1, cat2, id2))
+
+        for (t, _, _), frame_events in zip(block, events):
+            if frame_events:
+                result.setdefault(t, []).extend(frame_events)
+
+        prev_keys = keys
+        prev_pairs = (iu, ju)
+        prev_active = tuple(np.flatnonzero(rel[-1]) for rel in relations)
+
+    return result
+
+
+class SceneAnalyzer:
+    """
+    Incremental version of analyze_log: receives one frame at a time, in
+    time order, and keeps only the previous frame's objects, overlaps and
+    alignments, so memory does not grow with the length of the video.
+
+    Frames are keyed like the tracking log ("%.2f" timestamps). Without a
+    frame index, a frame is only analyzed once a frame with a different key
+    arrives (or on finish()): when two frames round to the same key the
+    last one wins, as in the batch JSON log. With frame indices (as in
+    analyze_columnar) every frame is analyzed and events of frames sharing
+    a key are listed together. The result is the same dict analyze_log (or
+    analyze_columnar) returns.
+    """
+
+    def __init__(self, on_events=None):
+        self.on_events = on_events
+        self.result = {}
+        self.frames = 0
+        self._pending = None
+        self._prev = (set(), set(), set())  # keys, overlaps and alignments of the last frame
+
+    def feed(self, timestamp, objects, frame=None):
+        """
+        objects: {(category, id): (x1, y1, x2, y2)} for one frame.
+        frame: index of the frame in the video, if known.
+        """
+        if self._pending is not None and (frame is not None or self._pending[0] != timestamp):
+            self._analyze(*self._pending)
+        self._pending = (timestamp, objects)
+
+    def feed_frame(self, timestamp, frame):
+        """
+        Same as feed(), for a frame in the log format:
+        {category: [{"ID": id, "pos": "(x1,y1),(x2,y2)"}, ...]}
+        """
+        self.feed(timestamp, {
+            (category, o["ID"]): parse_pos(o["pos"])
+            for category, objs in frame.items()
+            for o in objs
+        })
+
+    def finish(self):
+        """
+        Analyzes the frame still held back and returns the result.
+        """
+        if self._pending is not None:
+            self._analyze(*self._pending)
+            self._pending = None
+        return self.result
+
+    def save(self, output_log):
+        with open(output_log, "w", encoding="utf-8") as f:
+            json.dump(self.finish(), f, indent=2, ensure_ascii=False)
+
+    def _analyze(self, t, objects):
+        start = time.perf_counter()
+        keys = sorted(objects)
+        events, self._prev = _frame_events(keys, [objects[k] for k in keys], self._prev)
+
+        if events:
+            self.result.setdefault(t, []).extend(events)
+            if self.on_events is not None:
+                self.on_events(t, events)
+
+        self.frames += 1
+        FRAME_ANALYZE_TIME.observar(time.perf_counter() - start)
+
+
+def analyze_log_online(log_data):
+    """
+    Runs a whole log through SceneAnalyzer; same output as analyze_log.
+    """
+    analyzer = SceneAnalyzer()
+    timestamps = sorted(
+        log_data.keys(),
+        key=lambda t: tuple(float(x) for x in t.split(":"))
+    )
+    for t in timestamps:
+        analyzer.feed_frame(t, log_data[t])
+    return analyzer.finish()
+
+
 def log_interpreter(input_log: str, output_log: str):
-    
+
+    if input_log.endswith(".ylog"):
+        from log_colunar import carregar_log
+
+        start = time.perf_counter()
+        records, names = carregar_log(input_log)
+        analyzed = analyze_columnar(records, names)
+        ANALYZE_TIME.observar(time.perf_counter() - start)
+
+        with open(output_log, "w", encoding="utf-8") as f:
+            json.dump(analyzed, f, indent=2, ensure_ascii=False)
+
+        print(f"Analysis complete. Output saved to: {output_log}")
+        return
+
+    start = time.perf_counter()
     with open(input_log, "r", encoding="utf-8") as f:
         log_data = json.load(f)
     if isinstance(log_data, list):
@@ -165,8 +571,95 @@ def log_interpreter(input_log: str, output_log: str):
             raise ValueError("Unrecognized log format.")
 
     analyzed = analyze_log(log_data)
+    ANALYZE_TIME.observar(time.perf_counter() - start)
 
     with open(output_log, "w", encoding="utf-8") as f:
         json.dump(analyzed, f, indent=2, ensure_ascii=False)
 
     print(f"Analysis complete. Output saved to: {output_log}")
+
+
+def _synthetic_log(objects_per_frame, frames, seed=0):
+    """
+    Random log in the analyze_log input format, for benchmarking.
+    Objects drift a few pixels per frame and now and then leave/return.
+    """
+    rng = random.Random(seed)
+    categories = ["Rock", "Paper", "Scissors"]
+    state = {}
+    present = {}
+    for i in range(objects_per_frame):
+        x, y = rng.randint(0, 600), rng.randint(0, 440)
+        state[(categories[i % 3], i + 1)] = [x, y, x + rng.randint(20, 120), y + rng.randint(20, 120)]
+        present[(categories[i % 3], i + 1)] = True
+
+    log_data = {}
+    for f in range(frames):
+        frame = {}
+        for (cat, oid), box in state.items():
+            dx, dy = rng.randint(-4, 4), rng.randint(-4, 4)
+            box[0] += dx
+            box[2] += dx
+            box[1] += dy
+            box[3] += dy
+            if rng.random() < 0.01:
+                present[(cat, oid)] = not present[(cat, oid)]
+            if not present[(cat, oid)]:
+                continue
+            frame.setdefault(cat, []).append({"ID": oid, "pos": f"({box[0]},{box[1]}),({box[2]},{box[3]})"})
+        log_data[f"{f / 30:.2f}"] = frame
+    return log_data
+
+
+def benchmark(sizes=(2, 4, 8, 20, 100, 200), frames=1000, repeats=5):
+    """
+    Times analyze_log_python against both engines of analyze_log (the
+    frame-by-frame loop and the vectorized one), the size-based choice
+    analyze_log makes by default, and the streaming SceneAnalyzer, on
+    synthetic logs; checks that all produce the same events (compared per
+    timestamp, order-free).
+    """
+    engines = (
+        ("python", analyze_log_python),
+        ("loop", lambda log: analyze_log(log, vectorize=False)),
+        ("numpy", lambda log: analyze_log(log, vectorize=True)),
+        ("auto", analyze_log),
+        ("online", analyze_log_online),
+    )
+    for n in sizes:
+        log_data = _synthetic_log(n, frames)
+
+        timings = {}
+        outputs = {}
+        for name, fn in engines:
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                outputs[name] = fn(log_data)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+
+        reference = {t: sorted(e) for t, e in outputs["python"].items()}
+        same = all(
+            {t: sorted(e) for t, e in outputs[name].items()} == reference
+            for name, _ in engines[1:]
+        )
+        print(
+            f"{n:4d} objects/frame, {frames} frames: "
+            + " | ".join(f"{name} {timings[name] * 1000:8.1f} ms" for name, _ in engines)
+            + f" | auto speedup {timings['python'] / timings['auto']:6.2f}x | same output: {same}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turns a tracking log into scene events.")
+    parser.add_argument("input_log", nargs="?", default="./log_output.json")
+    parser.add_argument("output_log", nargs="?", default="./scene_description.json")
+    parser.add_argument("--bench", action="store_true",
+                        help="benchmark the vectorized engine against the pure-Python one")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark()
+    else:
+        log_interpreter(args.input_log, args.output_log)
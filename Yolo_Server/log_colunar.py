@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import struct
+import argparse
+import numpy as np
+
+# Log de tracking binário e colunar (.ylog): uma linha de tamanho fixo por
+# detecção, com índice do frame, timestamp, classe, ID e a caixa em int16.
+# Layout do arquivo:
+#   MAGICO | uint32 tamanho do cabeçalho | cabeçalho JSON (nomes, dtype) | registros
+# O cabeçalho é completado com espaços para os registros começarem num
+# múltiplo de ALINHAMENTO, e os registros podem ser lidos com np.memmap.
+EXTENSAO = ".ylog"
+MAGICO = b"YLOG\x01"
+ALINHAMENTO = 16
+TAMANHO_BUFFER = 4096  # detecções acumuladas em memória antes de ir para o disco
+
+DTYPE = np.dtype([
+    ("frame", "<u4"),
+    ("t", "<f8"),
+    ("cls", "<u2"),
+    ("id", "<i4"),
+    ("caixa", "<i2", (4,)),
+])
+
+
+def _cabecalho(nomes):
+    cabecalho = json.dumps({
+        "nomes": {str(cls): nome for cls, nome in nomes.items()},
+        "dtype": DTYPE.descr,
+    }).encode("utf-8")
+
+    inicio = len(MAGICO) + 4 + len(cabecalho)
+    cabecalho += b" " * (-inicio % ALINHAMENTO)
+    return MAGICO + struct.pack("<I", len(cabecalho)) + cabecalho
+
+
+class EscritorLog:
+    """
+    Grava o log .ylog à medida que o tracking avança, em blocos de
+    TAMANHO_BUFFER detecções. O arquivo é escrito como .part e só ganha o
+    nome final em fechar(), então um log pela metade nunca é lido.
+    """
+
+    def __init__(self, caminho, nomes):
+        self.caminho = caminho
+        self.temp_path = caminho + ".part"
+        self.arquivo = open(self.temp_path, "wb")
+        self.arquivo.write(_cabecalho(nomes))
+        self.buffer = []
+        self.total = 0
+
+    def registrar(self, frame, current_time, objetos):
+        """
+        objetos: [(cls, obj_id, x1, y1, x2, y2), ...] de um frame.
+        """
+        for cls, obj_id, x1, y1, x2, y2 in objetos:
+            self.buffer.append((frame, current_time, cls, obj_id, (x1, y1, x2, y2)))
+
+        if len(self.buffer) >= TAMANHO_BUFFER:
+            self._descarregar()
+
+    def _descarregar(self):
+        if self.buffer:
+            self.arquivo.write(np.array(self.buffer, dtype=DTYPE).tobytes())
+            self.total += len(self.buffer)
+            self.buffer = []
+
+    def fechar(self):
+        if self.arquivo.closed:
+            return
+        self._descarregar()
+        self.arquivo.close()
+        os.replace(self.temp_path, self.caminho)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *_):
+        if tipo is None:
+            self.fechar()
+        else:
+            self.arquivo.close()
+            os.remove(self.temp_path)
+
+
+def carregar_log(caminho, mmap=True):
+    """
+    Lê um .ylog. Retorna (registros, nomes): registros é um array estruturado
+    com DTYPE (np.memmap se mmap=True) e nomes é {cls: nome}.
+    """
+    with open(caminho, "rb") as f:
+        if f.read(len(MAGICO)) != MAGICO:
+            raise ValueError(f"Não é um log {EXTENSAO}: {caminho}")
+        tamanho, = struct.unpack("<I", f.read(4))
+        cabecalho = json.loads(f.read(tamanho))
+
+    nomes = {int(cls): nome for cls, nome in cabecalho["nomes"].items()}
+    inicio = len(MAGICO) + 4 + tamanho
+    total = (os.path.getsize(caminho) - inicio) // DTYPE.itemsize
+
+    if total == 0:
+        return np.zeros(0, dtype=DTYPE), nomes
+    if mmap:
+        return np.memmap(caminho, dtype=DTYPE, mode="r", offset=inicio, shape=(total,)), nomes
+
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        return np.fromfile(f, dtype=DTYPE, count=total), nomes
+
+
+def limites_frames(registros):
+    """
+    Índices onde começa cada frame (mais o fim), para fatiar os registros
+    por frame: registros[limites[i]:limites[i + 1]].
+    """
+    quebras = np.flatnonzero(np.diff(registros["frame"])) + 1
+    return np.concatenate(([0], quebras, [len(registros)]))
+
+
+def para_snapshots(registros, nomes):
+    """
+    Gera os snapshots no formato antigo do log JSON, um por frame:
+    {"%.2f": {label: [{"ID": id, "pos": "(x1,y1),(x2,y2)"}, ...]}}
+    """
+    limites = limites_frames(registros)
+    tempos = registros["t"][limites[:-1]].tolist()
+    classes = registros["cls"].tolist()
+    ids = registros["id"].tolist()
+    caixas = registros["caixa"].tolist()
+
+    for current_time, a, b in zip(tempos, limites[:-1].tolist(), limites[1:].tolist()):
+        frame_objects = {}
+        for i in range(a, b):
+            x1, y1, x2, y2 = caixas[i]
+            frame_objects.setdefault(nomes[classes[i]], []).append({
+                "ID": ids[i],
+                "pos": f"({x1},{y1}),({x2},{y2})"
+            })
+        yield {f"{current_time:.2f}": frame_objects}
+
+
+def exportar_json(caminho_log, caminho_json):
+    """
+    Converte um .ylog no log_output.json de sempre.
+    """
+    registros, nomes = carregar_log(caminho_log)
+    with open(caminho_json, "w", encoding="utf-8") as f:
+        json.dump(list(para_snapshots(registros, nomes)), f, indent=4, ensure_ascii=False)
+
+
+def converter_json(caminho_json, caminho_log):
+    """
+    Converte um log_output.json antigo em .ylog. Cada entrada da lista vira
+    um frame (na ordem da lista) e as classes são numeradas por nome.
+    """
+    with open(caminho_json, "r", encoding="utf-8") as f:
+        snapshots = json.load(f)
+
+    from li import parse_pos
+
+    labels = sorted({label for entry in snapshots for frame in entry.values() for label in frame})
+    classes = {label: cls for cls, label in enumerate(labels)}
+
+    with EscritorLog(caminho_log, dict(enumerate(labels))) as escritor:
+        for indice, entry in enumerate(snapshots):
+            for ts, frame in entry.items():
+                escritor.registrar(indice, float(ts), [
+                    (classes[label], o["ID"], *parse_pos(o["pos"]))
+                    for label, objs in frame.items()
+                    for o in objs
+                ])
+
+
+def benchmark(objetos_por_frame=20, frames=3000, pasta="."):
+    """
+    Compara tamanho em disco e tempo de carga (até ter as caixas em
+    arrays) do log JSON e do .ylog, num log sintético.
+    """
+    from li import _synthetic_log, parse_pos
+
+    caminho_json = os.path.join(pasta, "bench_log.json")
+    caminho_log = os.path.join(pasta, "bench_log" + EXTENSAO)
+
+    # Frames vazios não entram no log do tracking
+    snapshots = [{ts: frame} for ts, frame in _synthetic_log(objetos_por_frame, frames).items() if frame]
+    with open(caminho_json, "w", encoding="utf-8") as f:
+        json.dump(snapshots, f, indent=4, ensure_ascii=False)
+    converter_json(caminho_json, caminho_log)
+
+    inicio = time.perf_counter()
+    with open(caminho_json, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    caixas_json = np.array([
+        parse_pos(o["pos"]) for entry in dados for frame in entry.values()
+        for objs in frame.values() for o in objs
+    ], dtype=np.int16)
+    tempo_json = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    registros, _ = carregar_log(caminho_log)
+    caixas_log = np.array(registros["caixa"])
+    tempo_log = time.perf_counter() - inicio
+
+    tamanho_json = os.path.getsize(caminho_json)
+    tamanho_log = os.path.getsize(caminho_log)
+
+    caminho_volta = os.path.join(pasta, "bench_log_export.json")
+    exportar_json(caminho_log, caminho_volta)
+    with open(caminho_volta, "r", encoding="utf-8") as f:
+        igual = json.load(f) == snapshots
+
+    print(f"{len(caixas_log)} detecções em {frames} frames ({objetos_por_frame} objetos/frame)")
+    print(f"JSON : {tamanho_json / 1024:9.1f} KB | carga {tempo_json * 1000:8.1f} ms")
+    print(f"ylog : {tamanho_log / 1024:9.1f} KB | carga {tempo_log * 1000:8.1f} ms")
+    print(f"disco {tamanho_json / tamanho_log:.1f}x menor | carga {tempo_json / tempo_log:.0f}x mais rápida | "
+          f"caixas iguais: {np.array_equal(caixas_json, caixas_log)} | exportação igual: {igual}")
+
+    del registros, caixas_log
+    for caminho in (caminho_json, caminho_log, caminho_volta):
+        os.remove(caminho)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Logs de tracking {EXTENSAO}.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("exportar", help=f"{EXTENSAO} -> log JSON")
+    p.add_argument("entrada")
+    p.add_argument("saida")
+
+    p = sub.add_parser("converter", help=f"log JSON -> {EXTENSAO}")
+    p.add_argument("entrada")
+    p.add_argument("saida")
+
+    p = sub.add_parser("bench", help="tamanho e tempo de carga contra o JSON")
+    p.add_argument("--objetos", type=int, default=20)
+    p.add_argument("--frames", type=int, default=3000)
+
+    args = parser.parse_args()
+    if args.comando == "exportar":
+        exportar_json(args.entrada, args.saida)
+    elif args.comando == "converter":
+        converter_json(args.entrada, args.saida)
+    else:
+        benchmark(args.objetos, args.frames)
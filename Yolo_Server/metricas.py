@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import bisect
+import argparse
+import threading
+
+# Métricas do pipeline no formato texto do Prometheus.
+#
+# Cada processo (HTTP_listener, Ativa_Yolo e cada worker do pool) tem o seu
+# registro em memória; atualizar uma métrica é só somar sob um lock. Os
+# processos que não servem HTTP gravam um instantâneo do registro em
+# PASTA_METRICAS/<pid>.json a cada INTERVALO_EXPORTACAO segundos, e o
+# /metrics do HTTP_listener junta o próprio registro com esses arquivos.
+PASTA_METRICAS = os.getenv("METRICAS_PASTA", "./metricas/")
+INTERVALO_EXPORTACAO = 2.0  # segundos entre gravações do instantâneo
+IDADE_MAX_MEDIDOR = 30.0    # medidores de arquivos mais velhos que isto (processo morto) são ignorados
+PREFIXO = "yolo_"
+
+# Limites dos baldes dos histogramas
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BALDES_FRAME = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+BALDES_BYTES_S = tuple(2 ** n for n in range(16, 31, 2))  # 64 KB/s a 1 GB/s
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = PREFIXO + nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.lock = threading.Lock()
+        self.valores = {}  # tupla com os valores dos rótulos -> valor
+
+    def zerar(self):
+        self.lock = threading.Lock()
+        self.valores = {}
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos[r]) for r in self.rotulos)
+
+    def instantaneo(self):
+        with self.lock:
+            valores = [[list(chave), valor] for chave, valor in self.valores.items()]
+        return {"tipo": self.tipo, "ajuda": self.ajuda, "rotulos": list(self.rotulos), "valores": valores}
+
+
+class Contador(_Metrica):
+    """
+    Valor que só cresce (requisições, bytes, tokens).
+    """
+    tipo = "counter"
+
+    def inc(self, valor=1.0, **rotulos):
+        chave = self._chave(rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0.0) + valor
+
+
+class Medidor(_Metrica):
+    """
+    Valor que sobe e desce (profundidade da fila, tracks ativos). Entre
+    processos os valores são somados, então cada processo só mexe na sua
+    parcela com inc()/dec().
+    """
+    tipo = "gauge"
+
+    def inc(self, valor=1.0, **rotulos):
+        chave = self._chave(rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0.0) + valor
+
+    def dec(self, valor=1.0, **rotulos):
+        self.inc(-valor, **rotulos)
+
+
+class Histograma(_Metrica):
+    """
+    Distribuição em baldes cumulativos (le), com soma e contagem.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, baldes=BALDES_SEGUNDOS, rotulos=()):
+        super().__init__(nome, ajuda, rotulos)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        i = bisect.bisect_left(self.baldes, valor)
+        with self.lock:
+            estado = self.valores.get(chave)
+            if estado is None:
+                # contagens por balde (a última é o +Inf), soma, total
+                estado = self.valores[chave] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+            estado[0][i] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    def instantaneo(self):
+        with self.lock:
+            valores = [[list(chave), [list(e[0]), e[1], e[2]]] for chave, e in self.valores.items()]
+        return {"tipo": self.tipo, "ajuda": self.ajuda, "rotulos": list(self.rotulos),
+                "baldes": list(self.baldes), "valores": valores}
+
+
+class Registro:
+    """
+    Métricas de um processo, por nome. Pedir duas vezes a mesma métrica
+    devolve o mesmo objeto, então cada módulo declara as suas no import.
+    """
+
+    def __init__(self):
+        self.metricas = {}
+        self.lock = threading.Lock()
+
+    def _obter(self, classe, nome, *args, **kwargs):
+        with self.lock:
+            metrica = self.metricas.get(PREFIXO + nome)
+            if metrica is None:
+                metrica = self.metricas[PREFIXO + nome] = classe(nome, *args, **kwargs)
+            return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._obter(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._obter(Medidor, nome, ajuda, rotulos)
+
+    def histograma(self, nome, ajuda, baldes=BALDES_SEGUNDOS, rotulos=()):
+        return self._obter(Histograma, nome, ajuda, baldes, rotulos)
+
+    def zerar(self):
+        """
+        Para processos criados com fork: descarta os valores herdados do
+        pai (que já aparecem no arquivo dele) e troca os locks, que podiam
+        estar presos por uma thread do pai na hora do fork.
+        """
+        self.lock = threading.Lock()
+        for metrica in self.metricas.values():
+            metrica.zerar()
+
+    def instantaneo(self):
+        with self.lock:
+            metricas = list(self.metricas.items())
+        return {"pid": os.getpid(), "gravado_em": time.time(),
+                "metricas": {nome: m.instantaneo() for nome, m in metricas}}
+
+
+registro = Registro()
+contador = registro.contador
+medidor = registro.medidor
+histograma = registro.histograma
+
+
+def exportar(pasta=PASTA_METRICAS):
+    """
+    Grava o instantâneo deste processo em pasta/<pid>.json.
+    """
+    caminho = os.path.join(pasta, f"{os.getpid()}.json")
+    temp_path = f"{caminho}.part"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(registro.instantaneo(), f)
+        os.replace(temp_path, caminho)
+    except OSError as e:
+        # Ex.: no Windows, o HTTP_listener lendo o arquivo na hora; fica para a próxima
+        print(f"[METRICAS] Não foi possível gravar {caminho}: {e}")
+
+
+def iniciar_exportacao(pasta=PASTA_METRICAS, intervalo=INTERVALO_EXPORTACAO):
+    """
+    Grava o instantâneo deste processo a cada intervalo segundos, numa
+    thread de fundo, para o /metrics do HTTP_listener enxergar.
+    """
+    os.makedirs(pasta, exist_ok=True)
+
+    def _loop():
+        while True:
+            exportar(pasta)
+            time.sleep(intervalo)
+
+    threading.Thread(target=_loop, daemon=True).start()
+
+
+def limpar_pasta(pasta=PASTA_METRICAS):
+    """
+    Apaga instantâneos de execuções anteriores.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    for entrada in os.scandir(pasta):
+        if entrada.is_file() and entrada.name.endswith((".json", ".part")):
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass
+
+
+def _instantaneos(pasta):
+    """
+    Instantâneo deste processo mais os gravados pelos outros em pasta.
+    """
+    instantaneos = [registro.instantaneo()]
+    if not pasta or not os.path.isdir(pasta):
+        return instantaneos
+
+    for entrada in os.scandir(pasta):
+        if not entrada.name.endswith(".json") or entrada.name == f"{os.getpid()}.json":
+            continue
+        try:
+            with open(entrada.path, "r", encoding="utf-8") as f:
+                instantaneos.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return instantaneos
+
+
+def _juntar(instantaneos):
+    """
+    Soma as métricas de mesmo nome e rótulos entre os processos.
+    """
+    agora = time.time()
+    juntas = {}
+    for inst in instantaneos:
+        recente = agora - inst["gravado_em"] <= IDADE_MAX_MEDIDOR
+        for nome, m in inst["metricas"].items():
+            if m["tipo"] == "gauge" and not recente:
+                continue
+
+            destino = juntas.setdefault(nome, {**m, "valores": {}})
+            for chave, valor in m["valores"]:
+                chave = tuple(chave)
+                atual = destino["valores"].get(chave)
+                if m["tipo"] != "histogram":
+                    destino["valores"][chave] = (atual or 0.0) + valor
+                elif atual is None:
+                    destino["valores"][chave] = [list(valor[0]), valor[1], valor[2]]
+                elif m["baldes"] == destino["baldes"]:
+                    atual[0] = [a + b for a, b in zip(atual[0], valor[0])]
+                    atual[1] += valor[1]
+                    atual[2] += valor[2]
+    return juntas
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{n}="{v}"' for n, v in zip(nomes, valores)]
+    if extra is not None:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+def texto_prometheus(pasta=PASTA_METRICAS):
+    """
+    Métricas de todos os processos no formato de exposição do Prometheus.
+    """
+    linhas = []
+    for nome, m in sorted(_juntar(_instantaneos(pasta)).items()):
+        linhas.append(f"# HELP {nome} {m['ajuda']}")
+        linhas.append(f"# TYPE {nome} {m['tipo']}")
+        for chave, valor in sorted(m["valores"].items()):
+            if m["tipo"] != "histogram":
+                linhas.append(f"{nome}{_rotulos(m['rotulos'], chave)} {_numero(valor)}")
+                continue
+
+            contagens, soma, total = valor
+            acumulado = 0
+            for limite, n in zip(m["baldes"] + ["+Inf"], contagens):
+                acumulado += n
+                le = 'le="{}"'.format(limite if limite == "+Inf" else _numero(limite))
+                linhas.append(f"{nome}_bucket{_rotulos(m['rotulos'], chave, le)} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(m['rotulos'], chave)} {_numero(soma)}")
+            linhas.append(f"{nome}_count{_rotulos(m['rotulos'], chave)} {total}")
+    return "\n".join(linhas) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra as métricas gravadas pelos processos do servidor.")
+    parser.add_argument("--pasta", default=PASTA_METRICAS)
+    args = parser.parse_args()
+    print(texto_prometheus(args.pasta), end="")
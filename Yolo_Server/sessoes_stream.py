@@ -0,0 +1,128 @@
+import time
+import threading
+import numpy as np
+
+# Sessões sem frames por mais que isso são descartadas
+TEMPO_MAX_INATIVA = 60  # segundos
+MODEL_PATH = None       # None = caminho padrão de track_yolo
+
+_modelo = None
+_lock_modelo = threading.Lock()   # o modelo atende uma inferência por vez
+_lock_sessoes = threading.Lock()
+_sessoes = {}
+
+
+def _obter_modelo():
+    """
+    Carrega (uma vez, na primeira sessão) o modelo compartilhado por todas
+    as sessões deste processo.
+    """
+    global _modelo
+    with _lock_modelo:
+        if _modelo is None:
+            from track_yolo import carregar_modelo
+            from exportar_modelo import BACKEND, INT8
+            _modelo = carregar_modelo(MODEL_PATH, backend=BACKEND, int8=INT8)
+        return _modelo
+
+
+class SessaoStream:
+    """
+    Estado de tracking de uma transmissão ao vivo: um tracker próprio
+    e o registro de entradas/saídas. Os IDs de cada tracker começam em 1,
+    então cada sessão numera seus objetos como num vídeo enviado.
+    """
+
+    def __init__(self, sessao_id, model):
+        from track_yolo import RegistroTracking
+
+        self.sessao_id = sessao_id
+        self.tracker = None  # criado pelo model.track() no primeiro frame
+        self.registro = RegistroTracking(model.names, guardar_snapshots=False)
+        self.ids = set()
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.ultimo_frame = -1
+        self.ultima_atividade = time.time()
+
+    def processar(self, model, frame, current_time, indice):
+        from track_yolo import config_tracker, _objetos_do_resultado, _observar_lote
+
+        with _lock_modelo:
+            # O modelo é compartilhado: antes de rodar, o predictor recebe o
+            # tracker desta sessão (lista vazia = criar um novo)
+            if model.predictor is not None:
+                model.predictor.trackers = [] if self.tracker is None else [self.tracker]
+            inicio = time.perf_counter()
+            result = model.track(frame, tracker=config_tracker(model), persist=True, verbose=False)[0]
+            self.tracker = model.predictor.trackers[0]
+            _observar_lote([result], time.perf_counter() - inicio)
+
+        objetos = _objetos_do_resultado(result)
+        self.ids.update(obj_id for _, obj_id, *_ in objetos)
+        eventos = self.registro.registrar(current_time, objetos)
+
+        self.frames += 1
+        self.ultimo_frame = indice
+        self.ultima_atividade = time.time()
+
+        return {
+            "frame": indice,
+            "objetos": [
+                {"objeto": model.names[cls], "ID": obj_id, "pos": [x1, y1, x2, y2]}
+                for cls, obj_id, x1, y1, x2, y2 in objetos
+            ],
+            "eventos": eventos,
+        }
+
+
+def _descartar_inativas():
+    limite = time.time() - TEMPO_MAX_INATIVA
+    for sessao_id, sessao in list(_sessoes.items()):
+        if sessao.ultima_atividade < limite:
+            print(f"[STREAM] Sessão {sessao_id} expirou após {sessao.frames} frames")
+            sessao.registro.encerrar()
+            del _sessoes[sessao_id]
+
+
+def processar_frame(sessao_id, jpeg, current_time, indice):
+    """
+    Decodifica um frame JPEG da sessão e roda detecção + tracking nele.
+    Frames da mesma sessão são processados um de cada vez, em ordem de chegada.
+    Retorna os objetos e os eventos de entrada/saída daquele frame.
+    """
+    import cv2
+
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Frame JPEG inválido.")
+
+    model = _obter_modelo()
+
+    with _lock_sessoes:
+        _descartar_inativas()
+        sessao = _sessoes.get(sessao_id)
+        if sessao is None:
+            sessao = SessaoStream(sessao_id, model)
+            _sessoes[sessao_id] = sessao
+            print(f"[STREAM] Nova sessão: {sessao_id}")
+
+    with sessao.lock:
+        if indice <= sessao.ultimo_frame:
+            raise ValueError(f"Frame {indice} fora de ordem (último: {sessao.ultimo_frame}).")
+        return sessao.processar(model, frame, current_time, indice)
+
+
+def encerrar_sessao(sessao_id):
+    """
+    Remove a sessão e devolve um resumo, ou None se ela não existir.
+    """
+    with _lock_sessoes:
+        sessao = _sessoes.pop(sessao_id, None)
+
+    if sessao is None:
+        return None
+
+    sessao.registro.encerrar()
+    print(f"[STREAM] Sessão {sessao_id} encerrada após {sessao.frames} frames")
+    return {"sessao": sessao_id, "frames": sessao.frames, "objetos": len(sessao.ids)}
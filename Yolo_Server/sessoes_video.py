@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import threading
+from li import SceneAnalyzer
+
+# Gravações longas chegam em trechos (ver Deteccao.gravar_da_camera), cada
+# um com o id da sessão, o número de sequência e o instante em que começa
+# na sessão (saida.seg.json ao lado do vídeo). Cada trecho é rastreado
+# como um job comum; no fim, os objetos de cada frame voltam para o
+# processo principal, que junta os trechos em ordem numa linha do tempo
+# única da sessão: os tempos ganham o início do trecho e os IDs, que
+# recomeçam em 1 em cada trecho, viram IDs da sessão. Um objeto no último
+# frame de um trecho e no primeiro do seguinte (mesma classe, caixas
+# sobrepostas) continua com o mesmo ID.
+PASTA_SESSOES = r"./sessoes/"
+EXTENSAO_SEGMENTO = ".seg.json"
+IOU_CONTINUACAO = 0.3     # sobreposição mínima para ligar um objeto entre trechos
+MAX_INTERVALO = 1.0       # segundos entre o fim de um trecho e o começo do outro para ligar objetos
+TEMPO_MAX_INATIVA = 600   # sessões sem trecho novo por mais que isso saem da memória
+# Um trecho que não chega (upload abandonado, cliente que caiu, job que
+# falhou) não segura a sessão: depois de ESPERA_MAX_LACUNA segundos, ou
+# com MAX_TRECHOS_ESPERANDO trechos seguintes já esperando, a lacuna é
+# pulada e os trechos seguintes entram na linha do tempo
+ESPERA_MAX_LACUNA = 60
+MAX_TRECHOS_ESPERANDO = 3
+
+_lock_sessoes = threading.Lock()
+_sessoes = {}
+
+
+def caminho_segmento(caminho_video):
+    return os.path.splitext(caminho_video)[0] + EXTENSAO_SEGMENTO
+
+
+def gravar_segmento(caminho_video, sessao, seq, inicio):
+    with open(caminho_segmento(caminho_video), "w", encoding="utf-8") as f:
+        json.dump({"sessao": sessao, "seq": seq, "inicio": inicio}, f)
+
+
+def ler_segmento(caminho_video):
+    """
+    {"sessao": ..., "seq": ..., "inicio": ...} se o vídeo é um trecho de
+    uma sessão, senão None.
+    """
+    caminho = caminho_segmento(caminho_video)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        return {"sessao": str(dados["sessao"]), "seq": int(dados["seq"]), "inicio": float(dados["inicio"])}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[SESSAO] Trecho inválido em {caminho} ({e}); processando como vídeo avulso")
+        return None
+
+
+class AnalisadorTrecho(SceneAnalyzer):
+    """
+    SceneAnalyzer que também guarda os objetos de cada frame do trecho,
+    para o processo principal juntar o trecho à sessão.
+    """
+
+    def __init__(self, on_events=None):
+        super().__init__(on_events)
+        self.quadros = []  # (timestamp, {(classe, id): caixa})
+
+    def feed(self, timestamp, objects, frame=None):
+        self.quadros.append((timestamp, objects))
+        super().feed(timestamp, objects, frame)
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    uniao = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / uniao if uniao > 0 else 0.0
+
+
+class SessaoVideo:
+    """
+    Linha do tempo de uma sessão, montada trecho a trecho em ordem de
+    sequência. Trechos que chegam antes do anterior esperam em pendentes,
+    até o anterior chegar ou a lacuna ser pulada (ver pular_lacuna).
+    """
+
+    def __init__(self, sessao_id):
+        self.sessao_id = sessao_id
+        self.analisador = SceneAnalyzer()
+        self.proximo_seq = 0
+        self.pendentes = {}      # seq -> (início, quadros)
+        self.esperando_desde = None  # quando o trecho proximo_seq passou a segurar outros
+        self.pulados = []
+        self.proximo_id = 1
+        self.ultimos = {}        # (classe, id da sessão) -> caixa no último frame juntado
+        self.fim_anterior = None
+        self.frames = 0
+        self.ultima_atividade = time.time()
+
+    def adicionar(self, seq, inicio, quadros):
+        """
+        Recebe um trecho e junta todos os que já podem entrar em ordem.
+        Trechos repetidos (já juntados, pulados ou esperando) são
+        ignorados. Retorna os números de sequência juntados agora.
+        """
+        self.ultima_atividade = time.time()
+        if seq < self.proximo_seq or seq in self.pendentes:
+            motivo = "chegou depois de pulado" if seq in self.pulados else "repetido"
+            print(f"[SESSAO] {self.sessao_id}: trecho {seq} {motivo}, ignorado")
+            return []
+        self.pendentes[seq] = (inicio, quadros)
+        return self._juntar_em_ordem() + self.pular_lacuna()
+
+    def _juntar_em_ordem(self):
+        juntados = []
+        while self.proximo_seq in self.pendentes:
+            self._juntar(*self.pendentes.pop(self.proximo_seq))
+            juntados.append(self.proximo_seq)
+            self.proximo_seq += 1
+        if not self.pendentes:
+            self.esperando_desde = None
+        elif juntados or self.esperando_desde is None:
+            self.esperando_desde = time.time()
+        return juntados
+
+    def pular_lacuna(self, agora=None):
+        """
+        Se o trecho esperado segura outros há mais de ESPERA_MAX_LACUNA
+        segundos, ou com MAX_TRECHOS_ESPERANDO trechos atrás dele, desiste
+        dele (e de qualquer outro faltando antes do próximo que chegou) e
+        junta os seguintes. Retorna os números de sequência juntados.
+        """
+        juntados = []
+        agora = time.time() if agora is None else agora
+        while self.pendentes and (len(self.pendentes) >= MAX_TRECHOS_ESPERANDO
+                                  or agora - self.esperando_desde > ESPERA_MAX_LACUNA):
+            proximo = min(self.pendentes)
+            faltando = list(range(self.proximo_seq, proximo))
+            print(f"[SESSAO] {self.sessao_id}: trecho(s) {', '.join(map(str, faltando))} não chegaram; "
+                  f"seguindo do trecho {proximo}")
+            self.pulados.extend(faltando)
+            self.proximo_seq = proximo
+            juntados += self._juntar_em_ordem()
+        return juntados
+
+    def _ligar(self, inicio, quadros):
+        """
+        IDs da sessão dos objetos do primeiro frame do trecho que continuam
+        objetos do último frame juntado.
+        """
+        if not quadros or self.fim_anterior is None:
+            return {}
+        t_primeiro, objetos = quadros[0]
+        if inicio + float(t_primeiro) - self.fim_anterior > MAX_INTERVALO:
+            return {}
+
+        pares = []
+        for chave, caixa in objetos.items():
+            for anterior, caixa_anterior in self.ultimos.items():
+                if chave[0] == anterior[0]:
+                    iou = _iou(caixa, caixa_anterior)
+                    if iou >= IOU_CONTINUACAO:
+                        pares.append((iou, chave, anterior))
+
+        mapa = {}
+        usados = set()
+        for _, chave, anterior in sorted(pares, reverse=True):
+            if chave not in mapa and anterior not in usados:
+                mapa[chave] = anterior[1]
+                usados.add(anterior)
+        return mapa
+
+    def _juntar(self, inicio, quadros):
+        mapa = self._ligar(inicio, quadros)
+        for t, objetos in quadros:
+            t_sessao = inicio + float(t)
+            objetos_sessao = {}
+            for chave, caixa in objetos.items():
+                if chave not in mapa:
+                    mapa[chave] = self.proximo_id
+                    self.proximo_id += 1
+                objetos_sessao[(chave[0], mapa[chave])] = caixa
+            self.analisador.feed(f"{t_sessao:.2f}", objetos_sessao, self.frames)
+            self.frames += 1
+            self.ultimos = objetos_sessao
+            self.fim_anterior = t_sessao
+
+    def salvar(self, pasta=PASTA_SESSOES):
+        caminho = os.path.join(pasta, self.sessao_id, "scene_description.json")
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.analisador.save(caminho)
+        return caminho
+
+
+def _descartar_inativas():
+    limite = time.time() - TEMPO_MAX_INATIVA
+    for sessao_id in [s for s, sessao in _sessoes.items() if sessao.ultima_atividade < limite]:
+        sessao = _sessoes.pop(sessao_id)
+        if sessao.pendentes:
+            print(f"[SESSAO] {sessao_id} descartada com trechos {sorted(sessao.pendentes)} "
+                  f"esperando o trecho {sessao.proximo_seq}")
+
+
+def juntar_trecho(segmento, quadros):
+    """
+    Junta à linha do tempo da sessão um trecho já rastreado e grava
+    PASTA_SESSOES/<sessão>/scene_description.json. Retorna o caminho
+    gravado, ou None se o trecho ficou esperando um anterior.
+    """
+    with _lock_sessoes:
+        _descartar_inativas()
+        sessao = _sessoes.get(segmento["sessao"])
+        if sessao is None:
+            sessao = _sessoes[segmento["sessao"]] = SessaoVideo(segmento["sessao"])
+
+        juntados = sessao.adicionar(segmento["seq"], segmento["inicio"], quadros)
+        if not juntados:
+            if segmento["seq"] in sessao.pendentes:
+                print(f"[SESSAO] {sessao.sessao_id}: trecho {segmento['seq']} esperando o trecho {sessao.proximo_seq}")
+            return None
+        return _salvar(sessao, juntados)
+
+
+def juntar_atrasados():
+    """
+    Pula as lacunas vencidas (ESPERA_MAX_LACUNA) de todas as sessões, para
+    trechos esperando um que não vai chegar entrarem mesmo sem trecho novo
+    na sessão. Chamar de tempos em tempos. Retorna os caminhos gravados.
+    """
+    caminhos = []
+    with _lock_sessoes:
+        _descartar_inativas()
+        for sessao in _sessoes.values():
+            juntados = sessao.pular_lacuna()
+            if juntados:
+                caminhos.append(_salvar(sessao, juntados))
+    return caminhos
+
+
+def _salvar(sessao, juntados):
+    caminho = sessao.salvar()
+    print(f"[SESSAO] {sessao.sessao_id}: trecho(s) {', '.join(map(str, juntados))} na linha do tempo "
+          f"(até {sessao.fim_anterior or 0.0:.2f}s, {sessao.proximo_id - 1} objeto(s)) -> {caminho}")
+    return caminho
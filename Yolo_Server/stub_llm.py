@@ -0,0 +1,212 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Servidor local que imita o endpoint /v1/chat/completions da OpenAI, para
+# testar o cliente e o pipeline sem rede. A resposta é calculada pelas
+# regras locais (jogadas.py) a partir do log na mensagem do usuário e,
+# como na API, é cortada em max_tokens. Latência e erros podem ser injetados.
+PORTA_PADRAO = 8011
+
+
+class ConfigStub:
+    def __init__(self, latencia=0.5, jitter=0.1, taxa_429=0.0, taxa_500=0.0, ms_por_token=0.0):
+        self.latencia = latencia  # segundos por resposta
+        self.jitter = jitter      # variação aleatória (+/-) da latência
+        self.ms_por_token = ms_por_token  # soma à latência por token de resposta gerado
+        self.taxa_429 = taxa_429  # fração das requisições respondidas com 429
+        self.taxa_500 = taxa_500  # fração respondida com 500
+
+        self.lock = threading.Lock()
+        self.requisicoes = 0
+        self.em_andamento = 0
+        self.pico = 0
+
+
+def _resposta_jogadas(request_body):
+    from jogadas import analisar_jogadas
+
+    mensagem = request_body["messages"][-1]["content"]
+    try:
+        cena = json.loads(mensagem.split("Log:", 1)[1])
+        return json.dumps(analisar_jogadas(cena), indent=2, ensure_ascii=False)
+    except (IndexError, ValueError):
+        return "[]"
+
+
+def criar_handler(config):
+
+    class HandlerStub(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como a API de verdade
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, status, corpo, cabecalhos=()):
+            dados = json.dumps(corpo).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            for nome, valor in cabecalhos:
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_POST(self):
+            tamanho = int(self.headers.get("Content-Length", 0))
+            request_body = json.loads(self.rfile.read(tamanho) or b"{}")
+
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._responder(404, {"error": {"message": "not found"}})
+                return
+
+            with config.lock:
+                config.requisicoes += 1
+                config.em_andamento += 1
+                config.pico = max(config.pico, config.em_andamento)
+            try:
+                # ~4 caracteres por token
+                content = _resposta_jogadas(request_body)
+                max_tokens = request_body.get("max_tokens")
+                finish_reason = "stop"
+                if max_tokens and len(content) // 4 > max_tokens:
+                    content = content[:max_tokens * 4]
+                    finish_reason = "length"
+
+                latencia = config.latencia + config.ms_por_token * (len(content) // 4) / 1000
+                time.sleep(max(0.0, latencia + random.uniform(-config.jitter, config.jitter)))
+
+                sorteio = random.random()
+                if sorteio < config.taxa_429:
+                    self._responder(429, {"error": {"message": "rate limited (stub)", "type": "rate_limit"}},
+                                    [("Retry-After", "0.2")])
+                    return
+                if sorteio < config.taxa_429 + config.taxa_500:
+                    self._responder(500, {"error": {"message": "server error (stub)", "type": "server_error"}})
+                    return
+
+                prompt = sum(len(m.get("content", "")) for m in request_body.get("messages", []))
+                self._responder(200, {
+                    "id": f"chatcmpl-stub-{config.requisicoes}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request_body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": finish_reason,
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt // 4,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": prompt // 4 + len(content) // 4,
+                    },
+                })
+            finally:
+                with config.lock:
+                    config.em_andamento -= 1
+
+    return HandlerStub
+
+
+def iniciar_stub(config=None, host="127.0.0.1", porta=PORTA_PADRAO):
+    """
+    Sobe o stub numa thread e devolve o servidor (porta=0 escolhe uma livre).
+    base_url para o cliente: f"http://{host}:{servidor.server_port}/v1"
+    """
+    config = config or ConfigStub()
+    servidor = ThreadingHTTPServer((host, porta), criar_handler(config))
+    servidor.daemon_threads = True
+    servidor.config = config
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def teste_carga(n, config, cena="./scene_description.json", **limites):
+    """
+    Dispara n requisições de uma vez pelo ClienteLLM contra o stub e mostra
+    vazão, latência, repetições e o pico de concorrência visto pelo servidor.
+    """
+    from api_gpt import build_payload
+    from cliente_llm import ClienteLLM
+
+    servidor = iniciar_stub(config, porta=0)
+    cliente = ClienteLLM(base_url=f"http://127.0.0.1:{servidor.server_port}/v1", api_key="stub", **limites)
+    request_body = build_payload(cena)
+
+    latencias = []
+    falhas = []
+
+    def _terminou(inicio):
+        def _callback(futuro):
+            if futuro.exception() is not None:
+                falhas.append(futuro.exception())
+            else:
+                latencias.append(time.perf_counter() - inicio)
+        return _callback
+
+    inicio_total = time.perf_counter()
+    futuros = []
+    for _ in range(n):
+        futuro = cliente.enviar(request_body)
+        futuro.add_done_callback(_terminou(time.perf_counter()))
+        futuros.append(futuro)
+    for futuro in futuros:
+        try:
+            futuro.result()
+        except Exception:
+            pass
+    tempo_total = time.perf_counter() - inicio_total
+
+    latencias.sort()
+
+    def pct(p):
+        return latencias[min(len(latencias) - 1, int(p / 100 * len(latencias)))] if latencias else 0.0
+
+    print(f"{n} requisições em {tempo_total:.2f}s ({n / tempo_total:.1f} req/s)")
+    print(f"ok: {len(latencias)} | falharam: {len(falhas)} | {cliente.resumo()}")
+    print(f"latência p50 {pct(50):.2f}s | p95 {pct(95):.2f}s | p99 {pct(99):.2f}s")
+    print(f"servidor: {config.requisicoes} requisições recebidas, pico de {config.pico} simultâneas")
+
+    cliente.fechar()
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local da API de chat da OpenAI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-500", type=float, default=0.0)
+    parser.add_argument("--ms-por-token", type=float, default=0.0,
+                        help="latência extra por token de resposta")
+    parser.add_argument("--teste", type=int, metavar="N",
+                        help="em vez de servir, roda N requisições do ClienteLLM contra o stub")
+    parser.add_argument("--concorrencia", type=int, default=None)
+    parser.add_argument("--req-por-segundo", type=float, default=None)
+    args = parser.parse_args()
+
+    config = ConfigStub(args.latencia, args.jitter, args.taxa_429, args.taxa_500, args.ms_por_token)
+
+    if args.teste:
+        limites = {}
+        if args.concorrencia is not None:
+            limites["concorrencia"] = args.concorrencia
+        if args.req_por_segundo is not None:
+            limites["req_por_segundo"] = args.req_por_segundo
+            limites["rajada"] = max(1, int(args.req_por_segundo))
+        teste_carga(args.teste, config, **limites)
+    else:
+        servidor = iniciar_stub(config, args.host, args.porta)
+        print(f"Stub da OpenAI em http://{args.host}:{args.porta}/v1 "
+              f"(latência {args.latencia}s, 429 {args.taxa_429:.0%}, 500 {args.taxa_500:.0%})")
+        print(f"Use OPENAI_BASE_URL=http://{args.host}:{args.porta}/v1 OPENAI_API_KEY=stub")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            servidor.shutdown()
@@ -0,0 +1,47 @@
+import random
+
+import li
+from janelas_cena import cena_sintetica, dividir_em_janelas, juntar_jogadas
+from jogadas import analisar_jogadas
+
+
+def _juntar_por_janela(cena, max_eventos):
+    janelas = dividir_em_janelas(cena, max_eventos=max_eventos)
+    return janelas, juntar_jogadas(cena, [analisar_jogadas(janela) for janela in janelas])
+
+
+def test_janelas_igual_a_cena_inteira_em_cenas_aleatorias():
+    """
+    Aplicando as regras locais em cada janela e juntando, o resultado é o
+    mesmo das regras na cena inteira (com e sem alinhamentos).
+    """
+    varias_janelas = 0
+    for seed in range(300):
+        rng = random.Random(seed)
+        log = li._synthetic_log(rng.randint(2, 6), rng.randint(20, 300), seed=seed)
+        cena = li.analyze_log(log)
+        janelas, juntas = _juntar_por_janela(cena, rng.randint(3, 20))
+        varias_janelas += len(janelas) > 1
+        assert juntas == analisar_jogadas(cena), f"seed {seed}"
+    assert varias_janelas > 100
+
+
+def test_janelas_cena_sintetica():
+    cena = cena_sintetica(50)
+    janelas, juntas = _juntar_por_janela(cena, 40)
+    assert len(janelas) > 1
+    assert juntas == analisar_jogadas(cena)
+
+
+def test_coexistencia_sem_alinhamentos_fica_numa_janela():
+    cena = {
+        "0.00": ["Rock 1 entered the scene."],
+        "0.10": ["Paper 2 entered the scene."],
+        "0.20": ["Rock 1 is overlapping Paper 2."],
+        "0.30": ["Rock 1 stopped overlapping Paper 2."],
+        "1.30": ["Paper 2 left the scene."],
+    }
+    janelas, juntas = _juntar_por_janela(cena, 1)
+    assert janelas == [cena]
+    assert juntas[0]["start_time"] == "0.10"
+    assert juntas[0]["end_time"] == "1.30"
@@ -0,0 +1,119 @@
+import os
+import glob
+import json
+
+import pytest
+
+from jogadas import (
+    _chave_comparacao,
+    _eventos_em_ordem,
+    analisar_jogadas,
+    caminho_resposta,
+    jogada_por_coexistencia,
+    jogadas_por_alinhamento,
+    resultado,
+)
+
+PASTA_CENAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cenas_gravadas")
+CENAS = sorted(c for c in glob.glob(os.path.join(PASTA_CENAS, "*.json")) if not c.endswith(".resposta.json"))
+
+
+def _ler(caminho):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("caminho", CENAS, ids=os.path.basename)
+def test_regras_locais_igual_a_resposta_gravada(caminho):
+    """
+    Cenas em cenas_gravadas com a resposta do modelo ao lado
+    (jogadas.py --comparar --gravar): as regras locais dão as mesmas
+    jogadas, sem olhar a explicação.
+    """
+    local = [_chave_comparacao(j) for j in analisar_jogadas(_ler(caminho))]
+    gravada = [_chave_comparacao(j) for j in _ler(caminho_resposta(caminho))]
+    assert local == gravada
+
+
+def test_ha_cenas_gravadas():
+    assert CENAS
+
+
+@pytest.mark.parametrize("objeto_1, objeto_2, esperado", [
+    ("Rock 1", "Scissors 2", "Rock wins"),
+    ("Scissors 2", "Rock 1", "Rock wins"),
+    ("Scissor 1", "Paper 2", "Scissor wins"),
+    ("Paper 2", "Scissors 1", "Scissor wins"),
+    ("Paper 1", "Rock 2", "Paper wins"),
+    ("Rock 2", "Paper 1", "Paper wins"),
+    ("Paper 1", "Paper 2", "draw"),
+    ("Scissors 1", "Scissor 2", "draw"),
+    ("Lizard 1", "Rock 2", "undetermined"),
+])
+def test_tabela_de_vencedores(objeto_1, objeto_2, esperado):
+    result, explanation = resultado(objeto_1, objeto_2)
+    assert result == esperado
+    assert objeto_1 in explanation
+
+
+def test_alinhamento_termina_no_no_longer_aligned():
+    cena = {
+        "1.00": ["Rock 1 entered the scene.", "Paper 2 entered the scene."],
+        "1.33": ["Rock 1 is horizontally aligned with Paper 2."],
+        "1.67": ["Rock 1 left the scene."],
+        "2.00": ["Paper 2 is no longer horizontally aligned with Rock 1."],
+    }
+    jogadas = jogadas_por_alinhamento(_eventos_em_ordem(cena))
+    assert [(j["start_time"], j["end_time"]) for j in jogadas] == [("1.33", "2.00")]
+
+
+def test_alinhamento_termina_na_primeira_saida_depois_do_inicio():
+    cena = {
+        "1.00": ["Rock 1 entered the scene.", "Paper 2 entered the scene."],
+        "1.33": ["Rock 1 is horizontally aligned with Paper 2.", "Paper 2 left the scene."],
+        "1.67": ["Rock 1 left the scene."],
+        "2.00": ["Paper 2 left the scene."],
+    }
+    jogadas = jogadas_por_alinhamento(_eventos_em_ordem(cena))
+    assert [(j["start_time"], j["end_time"]) for j in jogadas] == [("1.33", "1.67")]
+
+
+def test_alinhamento_sem_fim_termina_no_inicio():
+    cena = {
+        "1.00": ["Rock 1 entered the scene.", "Paper 2 entered the scene."],
+        "1.33": ["Rock 1 is horizontally aligned with Paper 2."],
+    }
+    jogadas = analisar_jogadas(cena)
+    assert [(j["start_time"], j["end_time"]) for j in jogadas] == [("1.33", "1.33")]
+    assert jogadas[0]["result"] == "Paper wins"
+
+
+def test_coexistencia_sem_alinhamentos():
+    cena = {
+        "0.33": ["Rock 1 entered the scene."],
+        "0.67": ["Rock 1 left the scene.", "Paper 2 entered the scene."],
+        "1.00": ["Scissors 3 entered the scene."],
+        "1.33": ["Paper 4 entered the scene."],
+        "2.00": ["Scissors 3 left the scene."],
+    }
+    jogadas = jogada_por_coexistencia(_eventos_em_ordem(cena))
+    assert [_chave_comparacao(j) for j in jogadas] == [
+        ("Scissor wins", "Paper 2", "Scissors 3", "1.00", "2.00"),
+    ]
+    assert analisar_jogadas(cena) == jogadas
+
+
+def test_coexistencia_ignorada_com_alinhamentos():
+    cena = {
+        "0.33": ["Rock 1 entered the scene.", "Paper 2 entered the scene."],
+        "0.67": ["Scissors 3 entered the scene."],
+        "1.00": ["Rock 1 is horizontally aligned with Scissors 3."],
+    }
+    assert [_chave_comparacao(j) for j in analisar_jogadas(cena)] == [
+        ("Rock wins", "Rock 1", "Scissors 3", "1.00", "1.00"),
+    ]
+
+
+def test_cena_vazia():
+    assert analisar_jogadas({}) == []
+    assert analisar_jogadas({"0.33": ["Rock 1 entered the scene."], "1.00": ["Rock 1 left the scene."]}) == []
@@ -0,0 +1,47 @@
+import time
+
+import sessoes_video
+from sessoes_video import SessaoVideo
+
+
+def _quadros(n=3):
+    return [(f"{i / 3:.2f}", {("Rock", 1): [0, 0, 10, 10]}) for i in range(n)]
+
+
+def test_trechos_fora_de_ordem_entram_em_ordem():
+    sessao = SessaoVideo("s")
+    assert sessao.adicionar(1, 10.0, _quadros()) == []
+    assert sessao.adicionar(0, 0.0, _quadros()) == [0, 1]
+    assert sessao.pendentes == {}
+
+
+def test_trechos_repetidos_sao_ignorados():
+    sessao = SessaoVideo("s")
+    assert sessao.adicionar(0, 0.0, _quadros()) == [0]
+    assert sessao.adicionar(0, 0.0, _quadros()) == []
+    assert sessao.adicionar(2, 20.0, _quadros()) == []
+    assert sessao.adicionar(2, 20.0, _quadros()) == []
+    assert sessao.pendentes.keys() == {2}
+    assert sessao.frames == 3
+
+
+def test_lacuna_pulada_com_trechos_demais_esperando():
+    sessao = SessaoVideo("s")
+    sessao.adicionar(0, 0.0, _quadros())
+    for seq in range(2, 1 + sessoes_video.MAX_TRECHOS_ESPERANDO):
+        assert sessao.adicionar(seq, seq * 10.0, _quadros()) == []
+    seq = 1 + sessoes_video.MAX_TRECHOS_ESPERANDO
+    assert sessao.adicionar(seq, seq * 10.0, _quadros()) == list(range(2, seq + 1))
+    assert sessao.pulados == [1]
+    # O trecho pulado que chega tarde não volta para a linha do tempo
+    assert sessao.adicionar(1, 10.0, _quadros()) == []
+
+
+def test_lacuna_pulada_depois_da_espera():
+    sessao = SessaoVideo("s")
+    sessao.adicionar(0, 0.0, _quadros())
+    sessao.adicionar(2, 20.0, _quadros())
+    assert sessao.pular_lacuna(time.time()) == []
+    assert sessao.pular_lacuna(time.time() + sessoes_video.ESPERA_MAX_LACUNA + 1) == [2]
+    assert sessao.proximo_seq == 3
+    assert sessao.esperando_desde is None
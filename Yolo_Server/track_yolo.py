@@ -4,10 +4,38 @@ import platform
 import cv2
 import json
 import time
-from ultralytics import YOLO
+import hashlib
+import queue
+import tempfile
+import threading
+import numpy as np
+import yaml
+from log_colunar import EscritorLog, EXTENSAO as EXTENSAO_LOG
+from exportar_modelo import preparar_backend, imgsz_exportado
+from inferencia_roi import DetectorROI
+from cache_frames import CacheFrames
+import metricas
 
-def recognize(show=False):
+# Config do tracker ao lado deste arquivo, para não depender do diretório atual
+TRACKER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "botsort_custom.yaml")
 
+# Frames em espera entre estágios do pipeline de recognize()
+TAMANHO_FILA = 32
+
+FRAME_DECODE = metricas.histograma("frame_decode_segundos", "Decodificação de um frame.",
+                                   baldes=metricas.BALDES_FRAME)
+FRAME_INFERENCIA = metricas.histograma("frame_inferencia_segundos",
+                                       "Pré-processamento, inferência e pós-processamento do YOLO por frame.",
+                                       baldes=metricas.BALDES_FRAME)
+FRAME_TRACKING = metricas.histograma("frame_tracking_segundos",
+                                     "Resto do model.track() por frame: associação do tracker e montagem dos resultados.",
+                                     baldes=metricas.BALDES_FRAME)
+TRACKS_ATIVOS = metricas.medidor("tracks_ativos", "Objetos rastreados presentes no último frame de cada vídeo ou sessão.")
+
+def caminhos_padrao():
+    """
+    Retorna (model_path, video_path) padrão para o sistema operacional atual.
+    """
     SO = platform.system()
 
     if SO == "Windows":
@@ -18,89 +46,723 @@ def recognize(show=False):
         model_path = "/home/ubuntu/DataSetYolo/runs/detect/train/weights/best.pt"
         video_path = "/home/ubuntu/Yolo_Server/uploads/saida.mp4"
 
-    model_path = os.path.normpath(model_path)
-    video_path = os.path.normpath(video_path)
+    return os.path.normpath(model_path), os.path.normpath(video_path)
 
-    print(f"[INFO] Sistema detectado: {SO}")
-    print(f"[INFO] Usando modelo: {model_path}")
-    print(f"[INFO] Usando vídeo: {video_path}")
 
-    custom_model = YOLO(model_path)
-    cap = cv2.VideoCapture(video_path)
+def carregar_modelo(model_path=None, warmup=True, tamanho_warmup=(640, 640), backend="pytorch",
+                    int8=False, calibracao=None, tempos=None):
+    """
+    Carrega o modelo YOLO uma única vez.
+    Se warmup=True, roda uma inferência num frame preto para que a primeira
+    inferência de verdade não pague a inicialização do modelo.
+    backend "onnx" ou "openvino" carrega o modelo exportado para CPU
+    (exportando na primeira vez, ver exportar_modelo), em INT8 se int8=True.
+    Se tempos for um dict, recebe os segundos gastos em "imports"
+    (ultralytics/torch), "modelo" e "primeira_inferencia".
+    """
+    # ultralytics (e com ele o torch) só é importado aqui: quem importa
+    # este módulo sem carregar modelo não paga os segundos do import
+    inicio = time.perf_counter()
+    from ultralytics import YOLO
+    marcas = {"imports": time.perf_counter() - inicio}
 
-    if not cap.isOpened():
-        raise RuntimeError(f"Erro ao abrir vídeo: {video_path}")
+    if model_path is None:
+        model_path, _ = caminhos_padrao()
+
+    model_path = os.path.normpath(preparar_backend(os.path.normpath(model_path), backend, int8, calibracao))
+    print(f"[INFO] Carregando modelo: {model_path}")
+
+    inicio = time.perf_counter()
+    model = YOLO(model_path, task="detect")
+    if backend != "pytorch":
+        model.overrides["imgsz"] = imgsz_exportado(model_path)
+    marcas["modelo"] = time.perf_counter() - inicio
+
+    if warmup:
+        w, h = tamanho_warmup
+        inicio = time.perf_counter()
+        model.predict(np.zeros((h, w, 3), dtype=np.uint8), verbose=False)
+        marcas["primeira_inferencia"] = time.perf_counter() - inicio
+        print(f"[INFO] Warm-up do modelo em {marcas['primeira_inferencia']:.2f}s")
+
+    if tempos is not None:
+        tempos.update(marcas)
+    return model
+
+
+_config_sem_reid = None
+_lock_config = threading.Lock()
+
+
+def config_tracker(model, reid=True):
+    """
+    Config do tracker para o modelo. Modelos exportados (ONNX/OpenVINO)
+    não expõem as features internas que o BoT-SORT usa como ReID com
+    "model: auto"; para eles o ReID é desligado, em vez de baixar e rodar
+    um classificador extra em cada caixa. reid=False desliga para qualquer
+    modelo (inferência por regiões, ver inferencia_roi).
+    """
+    global _config_sem_reid
+
+    if reid and not isinstance(getattr(model, "model", None), str):
+        return TRACKER_CONFIG
+
+    with _lock_config:
+        if _config_sem_reid is None:
+            with open(TRACKER_CONFIG, "r", encoding="utf-8") as f:
+                config = yaml.safe_load(f)
+            config["with_reid"] = False
+            texto = yaml.safe_dump(config)
+            # Um arquivo por conteúdo de config, reaproveitado por todos os
+            # workers e execuções em vez de um temporário novo a cada um
+            nome = f"botsort_sem_reid_{hashlib.sha256(texto.encode('utf-8')).hexdigest()[:12]}.yaml"
+            caminho = os.path.join(tempfile.gettempdir(), nome)
+            if not os.path.exists(caminho):
+                fd, temp_path = tempfile.mkstemp(prefix="botsort_sem_reid_", suffix=".part")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(texto)
+                os.replace(temp_path, caminho)
+            _config_sem_reid = caminho
+        return _config_sem_reid
+
+
+def resetar_tracker(model):
+    """
+    Zera o estado do tracker de um modelo reaproveitado entre vídeos,
+    para que IDs e trilhas de um job não vazem para o próximo.
+    """
+    predictor = getattr(model, "predictor", None)
+    for tracker in getattr(predictor, "trackers", []):
+        tracker.reset()
+
+
+def _usar_config_tracker(model, tracker_config):
+    """
+    O model.track(persist=True) mantém o tracker criado na primeira
+    chamada; se o mesmo modelo trocar de config (com e sem ReID), o
+    tracker antigo é descartado para o próximo track() criar outro.
+    """
+    predictor = getattr(model, "predictor", None)
+    anterior = getattr(model, "_tracker_config", None)
+    if anterior is not None and anterior != tracker_config and hasattr(predictor, "trackers"):
+        del predictor.trackers
+    model._tracker_config = tracker_config
+
+
+def _objetos_do_resultado(r):
+    """
+    Extrai [(cls, obj_id, x1, y1, x2, y2), ...] de um resultado do model.track().
+    """
+    objetos = []
+    if r.boxes.id is None:
+        return objetos
+
+    for box in r.boxes:
+        if len(box.cls) == 0 or len(box.conf) == 0 or len(box.xyxy) == 0 or len(box.id) == 0:
+            continue
+
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        objetos.append((int(box.cls[0]), int(box.id[0]), x1, y1, x2, y2))
+
+    return objetos
+
+
+def _criar_tracker(model, tracker_config, largura, altura):
+    """
+    Tracker do model.track() (persist=True) já criado e zerado, para ser
+    avançado também fora do model.track().
+    """
+    predictor = getattr(model, "predictor", None)
+    if not getattr(predictor, "trackers", None):
+        model.track(np.zeros((altura, largura, 3), dtype=np.uint8), tracker=tracker_config,
+                    persist=True, verbose=False)
+    tracker = model.predictor.trackers[0]
+    tracker.reset()
+    return tracker
+
+
+def _track_com_cache(model, frames, repetidos, tracker_config, cache, tracker):
+    """
+    model.track() nos frames não repetidos, em trechos contíguos para
+    manter a ordem do tracker; os repetidos só avançam o tracker com as
+    detecções do último frame inferido.
+    Retorna (objetos por frame, results dos frames inferidos).
+    """
+    objetos_lote = []
+    results_lote = []
+    i = 0
+    while i < len(frames):
+        if repetidos[i]:
+            objetos_lote.append(cache.repetir(tracker, frames[i]))
+            i += 1
+            continue
+
+        j = i
+        while j < len(frames) and not repetidos[j]:
+            j += 1
+        results = model.track(frames[i:j], tracker=tracker_config, persist=True, verbose=False)
+        objetos_lote.extend(_objetos_do_resultado(r) for r in results)
+        results_lote.extend(results)
+        i = j
+    return objetos_lote, results_lote
 
-    enter_time = {}
-    object_classes = {}
-    full_log_snapshots = []
-    
+
+def _observar_lote(results, tempo):
+    """
+    Divide o tempo de um model.track() entre os frames do lote: o que o
+    YOLO mede em r.speed (ms) é inferência, o resto é tracking.
+    """
+    por_frame = tempo / len(results)
+    for r in results:
+        speed = getattr(r, "speed", None)
+        if not speed:
+            FRAME_INFERENCIA.observar(por_frame)
+            continue
+        inferencia = sum(speed.values()) / 1000.0
+        FRAME_INFERENCIA.observar(inferencia)
+        FRAME_TRACKING.observar(max(0.0, por_frame - inferencia))
+
+
+class EstatisticaEstagio:
+    """
+    Conta frames e tempo ocupado de um estágio do pipeline.
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.frames = 0
+        self.tempo = 0.0
+
+    def contar(self, frames, tempo):
+        self.frames += frames
+        self.tempo += tempo
+
+    def fps(self):
+        return self.frames / self.tempo if self.tempo > 0 else 0.0
+
+    def resumo(self):
+        return {"frames": self.frames, "tempo": self.tempo, "fps": self.fps()}
+
+    def __str__(self):
+        return f"{self.nome}: {self.frames} frames em {self.tempo:.2f}s ({self.fps():.1f} fps)"
+
+
+def _colocar(fila, item, parar):
+    """
+    put() numa fila limitada que desiste se o pipeline mandar parar,
+    para nenhum estágio ficar preso esperando espaço.
+    """
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _estagio_decodificacao(cap, saida, parar, estat, erros):
+    """
+    Thread produtora: decodifica frames e põe (current_time, frame, indice)
+    na fila. Termina com None.
+    """
+    indice = 0
+    try:
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            tempo = time.perf_counter() - inicio
+            estat.contar(1, tempo)
+            FRAME_DECODE.observar(tempo)
+
+            _colocar(saida, (current_time, frame, indice), parar)
+            indice += 1
+    except Exception as e:
+        erros.append(e)
+        parar.set()
+    finally:
+        _colocar(saida, None, parar)
+
+
+def _estagio_registro(entrada, registro, parar, estat, erros):
+    """
+    Thread consumidora: monta snapshots e imprime entradas/saídas.
+    """
+    try:
+        while True:
+            item = entrada.get()
+            if item is None:
+                break
+            inicio = time.perf_counter()
+            current_time, objetos = item
+            registro.registrar(current_time, objetos)
+            estat.contar(1, time.perf_counter() - inicio)
+    except Exception as e:
+        erros.append(e)
+        parar.set()
+
+
+def _retirar(fila, parar):
+    """
+    get() que desiste (devolvendo None) se o pipeline mandar parar.
+    """
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+        try:
+            return fila.get(timeout=0.1)
+        except queue.Empty:
+            if parar.is_set():
+                return None
+
+
+def _proximo_lote(fila, tamanho_lote, parar, passo=1):
+    """
+    Junta até tamanho_lote frames para inferência, pegando um a cada passo.
+    Retorna (lote, fim): lote é [(current_time, frame, indice, pulados), ...], onde
+    pulados são os frames decodificados desde o frame inferido anterior,
+    que não passam pelo modelo; fim indica que o decodificador terminou.
+    """
+    lote = []
+    pulados = []
+    while len(lote) < tamanho_lote:
+        item = _retirar(fila, parar)
+        if item is None:
+            if pulados:
+                # O último frame vira âncora, para a interpolação ter os dois lados
+                current_time, frame, indice = pulados.pop()
+                lote.append((current_time, frame, indice, pulados))
+            return lote, True
+
+        if len(pulados) + 1 < passo:
+            pulados.append(item)
+        else:
+            lote.append((*item, pulados))
+            pulados = []
+    return lote, False
+
+
+class AmostradorAdaptativo:
+    """
+    Decide de quantos em quantos frames rodar o modelo.
+
+    Enquanto as detecções ficam estáveis (mesmos objetos, caixas paradas),
+    o passo entre inferências dobra até chegar na taxa mínima. Qualquer
+    mudança (objeto entrou/saiu ou caixa se moveu além do limiar) volta
+    para a taxa máxima.
+
+    - taxa_min / taxa_max: fração dos frames decodificados que vai para o modelo.
+    - limiar_movimento: deslocamento do centro (ou mudança de tamanho) da caixa,
+      relativo ao maior lado dela, que conta como mudança.
+    - frames_estaveis: inferências estáveis seguidas antes de aumentar o passo.
+    """
+
+    def __init__(self, taxa_min=0.25, taxa_max=1.0, limiar_movimento=0.1, frames_estaveis=3):
+        self.passo_min = max(1, int(round(1.0 / taxa_max)))
+        self.passo_max = max(self.passo_min, int(round(1.0 / taxa_min)))
+        self.limiar_movimento = limiar_movimento
+        self.frames_estaveis = frames_estaveis
+
+        self.passo = self.passo_min
+        self.anterior = None
+        self.estaveis = 0
+
+    def _mudou(self, objetos):
+        if self.anterior is None:
+            return True
+
+        caixas_ant = {(cls, obj_id): caixa for cls, obj_id, *caixa in self.anterior}
+        caixas = {(cls, obj_id): caixa for cls, obj_id, *caixa in objetos}
+        if caixas.keys() != caixas_ant.keys():
+            return True
+
+        for chave, (x1, y1, x2, y2) in caixas.items():
+            ax1, ay1, ax2, ay2 = caixas_ant[chave]
+            ref = max(ax2 - ax1, ay2 - ay1, 1)
+            deslocamento = max(abs((x1 + x2) - (ax1 + ax2)), abs((y1 + y2) - (ay1 + ay2))) / 2.0
+            tamanho = max(abs((x2 - x1) - (ax2 - ax1)), abs((y2 - y1) - (ay2 - ay1)))
+            if max(deslocamento, tamanho) > self.limiar_movimento * ref:
+                return True
 
-        current_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return False
 
-        results_stream = custom_model.track(
-            frame,
-            tracker="botsort_custom.yaml",
-            stream=True,
-            persist=True,
-            verbose=False
-        )
+    def atualizar(self, objetos):
+        """
+        Recebe os objetos do último frame inferido e devolve o novo passo.
+        """
+        if self._mudou(objetos):
+            self.passo = self.passo_min
+            self.estaveis = 0
+        else:
+            self.estaveis += 1
+            if self.estaveis >= self.frames_estaveis:
+                self.passo = min(self.passo * 2, self.passo_max)
+                self.estaveis = 0
 
+        self.anterior = objetos
+        return self.passo
+
+
+def interpolar(objetos_a, objetos_b, alfa):
+    """
+    Caixas de um frame pulado entre dois frames inferidos (alfa de 0 a 1).
+    Objetos presentes nos dois têm a caixa interpolada linearmente; os que
+    só existem no primeiro mantêm a última caixa conhecida.
+    """
+    caixas_b = {obj_id: caixa for _, obj_id, *caixa in objetos_b}
+
+    resultado = []
+    for cls, obj_id, *caixa_a in objetos_a:
+        caixa_b = caixas_b.get(obj_id)
+        if caixa_b is None:
+            caixa = caixa_a
+        else:
+            caixa = [int(round(a + (b - a) * alfa)) for a, b in zip(caixa_a, caixa_b)]
+        resultado.append((cls, obj_id, *caixa))
+
+    return resultado
+
+
+class RegistroTracking:
+    """
+    Acumula os snapshots do tracking e imprime entradas/saídas de objetos.
+    Recebe os objetos de cada frame já com ID, em ordem de frame.
+    Com guardar_snapshots=False (sessões ao vivo) só acompanha entradas/saídas.
+    Se analisador (li.SceneAnalyzer) for informado, cada frame com objetos
+    é entregue a ele na hora, sem esperar o log completo; se escritor
+    (log_colunar.EscritorLog) for informado, as detecções vão para o log
+    binário com o índice do frame.
+    """
+
+    def __init__(self, names, guardar_snapshots=True, analisador=None, escritor=None):
+        self.names = names
+        self.guardar_snapshots = guardar_snapshots
+        self.analisador = analisador
+        self.escritor = escritor
+        self.frame = -1
+        self.ativos = 0  # parcela deste registro no medidor TRACKS_ATIVOS
+        self.enter_time = {}
+        self.object_classes = {}
+        self.full_log_snapshots = []
+
+    def registrar(self, current_time, objetos):
+        """
+        Registra um frame. Retorna os eventos de entrada/saída do frame:
+        [{"evento": "entrou" | "saiu", "objeto": label, "ID": obj_id, "t": current_time}, ...]
+        """
+        self.frame += 1
         current_ids = set()
         frame_objects = {}
+        caixas = {}
+        eventos = []
 
-        for r in results_stream:
-            if r.boxes.id is None:
-                continue
+        for cls, obj_id, x1, y1, x2, y2 in objetos:
+            label = self.names[cls]
 
-            for box in r.boxes:
-                if len(box.cls) == 0 or len(box.conf) == 0 or len(box.xyxy) == 0 or len(box.id) == 0:
-                    continue
+            current_ids.add(obj_id)
+            self.object_classes[obj_id] = label
 
-                cls = int(box.cls[0])
-                obj_id = int(box.id[0])
-                label = custom_model.names[cls]
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
+            pos_str = f"({x1},{y1}),({x2},{y2})"
+            caixas[(label, obj_id)] = (x1, y1, x2, y2)
 
-                current_ids.add(obj_id)
-                object_classes[obj_id] = label
+            frame_objects.setdefault(label, []).append({
+                "ID": obj_id,
+                "pos": pos_str
+            })
 
-                pos_str = f"({x1},{y1}),({x2},{y2})"
+            if obj_id not in self.enter_time:
+                self.enter_time[obj_id] = current_time
+                eventos.append({"evento": "entrou", "objeto": label, "ID": obj_id, "t": current_time})
+                print(f"[+] {current_time:.2f}s: {label} {obj_id} entrou.")
 
-                frame_objects.setdefault(label, []).append({
-                    "ID": obj_id,
-                    "pos": pos_str
-                })
+        if frame_objects and self.guardar_snapshots:
+            self.full_log_snapshots.append({f"{current_time:.2f}": frame_objects})
 
-                if obj_id not in enter_time:
-                    enter_time[obj_id] = current_time
-                    print(f"[+] {current_time:.2f}s: {label} {obj_id} entrou.")
+        if frame_objects and self.analisador is not None:
+            self.analisador.feed(f"{current_time:.2f}", caixas, self.frame)
 
-        if frame_objects:
-            full_log_snapshots.append({f"{current_time:.2f}": frame_objects})
+        if frame_objects and self.escritor is not None:
+            self.escritor.registrar(self.frame, current_time, objetos)
 
         # Detect exits
-        for obj_id in list(enter_time.keys()):
+        for obj_id in list(self.enter_time.keys()):
             if obj_id not in current_ids:
-                entrada = enter_time[obj_id]
+                entrada = self.enter_time[obj_id]
                 duracao = current_time - entrada
-                lbl = object_classes.get(obj_id, "Unknown")
+                lbl = self.object_classes.get(obj_id, "Unknown")
 
+                eventos.append({"evento": "saiu", "objeto": lbl, "ID": obj_id, "t": current_time})
                 print(f"[-] {current_time:.2f}s: {lbl} {obj_id} saiu | duração {duracao:.2f}s")
-                del enter_time[obj_id]
+                del self.enter_time[obj_id]
+                del self.object_classes[obj_id]
 
-        # SHOW only if requested (for headless safety)
-        if show:
-            cv2.imshow("YOLO Tracking", frame)
-            if cv2.waitKey(1) == 27:
+        if len(self.enter_time) != self.ativos:
+            TRACKS_ATIVOS.inc(len(self.enter_time) - self.ativos)
+            self.ativos = len(self.enter_time)
+
+        return eventos
+
+    def encerrar(self):
+        """
+        Tira do medidor de tracks ativos os objetos que ainda estavam em
+        cena quando o vídeo ou a sessão acabou.
+        """
+        TRACKS_ATIVOS.dec(self.ativos)
+        self.ativos = 0
+
+
+def recognize(video_path=None, model=None, model_path=None, show=False, tamanho_lote=1,
+              amostragem=None, estatisticas=None, analisador=None, guardar_snapshots=True,
+              escritor=None, backend="pytorch", regioes=None, cache=None, reid=True):
+    """
+    Roda detecção + tracking no vídeo e devolve a lista de snapshots.
+
+    tamanho_lote=1 chama o model.track() frame a frame. Com tamanho_lote > 1
+    o model.track() recebe uma lista de frames: o detector roda uma vez no
+    lote inteiro e o tracker associa as detecções uma a uma, em ordem de
+    frame, o que gera os mesmos IDs e snapshots.
+
+    Decodificação, inferência e registro rodam como pipeline: uma thread
+    decodifica, a thread atual faz a inferência e outra thread monta os
+    snapshots, ligadas por filas limitadas (TAMANHO_FILA). Se estatisticas
+    for um dict, recebe a vazão de cada estágio.
+
+    amostragem é um dict com os parâmetros de AmostradorAdaptativo; se
+    informado, o modelo só roda nos frames escolhidos pelo amostrador e os
+    demais recebem caixas interpoladas, então o log continua com todos os
+    timestamps.
+
+    analisador (li.SceneAnalyzer) recebe os frames no estágio de registro,
+    então a análise da cena termina junto com o tracking. Com
+    guardar_snapshots=False a lista de snapshots não é montada (volta vazia)
+    e a memória não cresce com a duração do vídeo. escritor
+    (log_colunar.EscritorLog) grava as detecções no log binário no mesmo
+    estágio.
+
+    backend ("pytorch", "onnx" ou "openvino") só vale quando o modelo é
+    carregado aqui (model=None); ver carregar_modelo.
+
+    regioes são as regiões de movimento que o cliente mandou com o vídeo
+    (inferencia_roi.carregar_regioes). Com elas o detector roda só em
+    janelas em volta do movimento e dos objetos já rastreados, e o
+    tracker (sem ReID) recebe as caixas de volta nas coordenadas do frame.
+
+    cache é um dict com os parâmetros de cache_frames.CacheFrames; se
+    informado, frames quase iguais ao último frame inferido repetem as
+    detecções dele sem passar pelo detector, e só o tracker avança.
+
+    reid=False desliga o ReID do tracker também no PyTorch (ver
+    config_tracker), como já acontece nos modelos exportados.
+    """
+
+    SO = platform.system()
+
+    if video_path is None:
+        _, video_path = caminhos_padrao()
+    video_path = os.path.normpath(video_path)
+
+    print(f"[INFO] Sistema detectado: {SO}")
+    print(f"[INFO] Usando vídeo: {video_path}")
+
+    if model is None:
+        # Sem modelo persistente: carrega um só para esta chamada
+        custom_model = carregar_modelo(model_path, warmup=False, backend=backend)
+    else:
+        custom_model = model
+        resetar_tracker(custom_model)
+
+    if tamanho_lote > 1:
+        print(f"[INFO] Detecção em lotes de {tamanho_lote} frames")
+
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        raise RuntimeError(f"Erro ao abrir vídeo: {video_path}")
+
+    registro = RegistroTracking(custom_model.names, guardar_snapshots, analisador, escritor)
+    tracker_config = config_tracker(custom_model, reid=reid and regioes is None)
+    _usar_config_tracker(custom_model, tracker_config)
+    cache_frames = CacheFrames(**cache) if cache is not None else None
+    detector_roi = DetectorROI(custom_model, tracker_config, regioes, cache=cache_frames) if regioes else None
+    tracker = None
+    if detector_roi is not None:
+        tracker = detector_roi.tracker
+    elif cache_frames is not None:
+        tracker = _criar_tracker(custom_model, tracker_config,
+                                 int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cache_frames.acompanhar(tracker)
+    amostrador = AmostradorAdaptativo(**amostragem) if amostragem else None
+
+    fila_frames = queue.Queue(maxsize=TAMANHO_FILA)
+    fila_objetos = queue.Queue(maxsize=TAMANHO_FILA)
+    parar = threading.Event()
+    erros = []
+    estat_decode = EstatisticaEstagio("decode")
+    estat_inferencia = EstatisticaEstagio("inferência")
+    estat_registro = EstatisticaEstagio("registro")
+
+    decodificador = threading.Thread(
+        target=_estagio_decodificacao,
+        args=(cap, fila_frames, parar, estat_decode, erros),
+        daemon=True,
+    )
+    registrador = threading.Thread(
+        target=_estagio_registro,
+        args=(fila_objetos, registro, parar, estat_registro, erros),
+        daemon=True,
+    )
+
+    inicio_total = time.perf_counter()
+    decodificador.start()
+    registrador.start()
+
+    fim = False
+    anterior = None  # (current_time, objetos) do último frame inferido
+    try:
+        while not fim and not parar.is_set():
+            passo = amostrador.passo if amostrador and anterior is not None else 1
+            lote, fim = _proximo_lote(fila_frames, tamanho_lote, parar, passo)
+            if not lote:
                 break
 
-    cap.release()
-    if show:
-        cv2.destroyAllWindows()
+            inicio = time.perf_counter()
+            frames = [frame for _, frame, _, _ in lote]
+            repetidos = [cache_frames.repetido(frame) for frame in frames] if cache_frames else None
+            if detector_roi is not None:
+                objetos_lote = detector_roi.processar(frames, [indice for _, _, indice, _ in lote], repetidos)
+                tempo = time.perf_counter() - inicio
+                for _ in lote:
+                    FRAME_INFERENCIA.observar(tempo / len(lote))
+            elif cache_frames is not None:
+                objetos_lote, results = _track_com_cache(custom_model, frames, repetidos, tracker_config,
+                                                         cache_frames, tracker)
+                tempo = time.perf_counter() - inicio
+                if results:
+                    _observar_lote(results, tempo * len(results) / len(lote))
+            else:
+                results = custom_model.track(
+                    frames,
+                    tracker=tracker_config,
+                    persist=True,
+                    verbose=False
+                )
+                objetos_lote = [_objetos_do_resultado(r) for r in results]
+                tempo = time.perf_counter() - inicio
+                _observar_lote(results, tempo)
+            estat_inferencia.contar(len(lote), tempo)
+
+            saida = []
+            for (current_time, frame, _, pulados), objetos in zip(lote, objetos_lote):
+                for t_pulado, frame_pulado, _ in pulados:
+                    t_ant, objetos_ant = anterior
+                    alfa = (t_pulado - t_ant) / (current_time - t_ant) if current_time > t_ant else 0.0
+                    saida.append((t_pulado, frame_pulado, interpolar(objetos_ant, objetos, alfa)))
+                saida.append((current_time, frame, objetos))
+
+                anterior = (current_time, objetos)
+                if amostrador:
+                    amostrador.atualizar(objetos)
+
+            for current_time, frame, objetos in saida:
+                if not _colocar(fila_objetos, (current_time, objetos), parar):
+                    break
+
+                # SHOW only if requested (for headless safety)
+                if show:
+                    cv2.imshow("YOLO Tracking", frame)
+                    if cv2.waitKey(1) == 27:
+                        parar.set()
+                        break
+    finally:
+        # Saída antecipada (ESC ou erro): libera o decodificador
+        if not fim:
+            parar.set()
+        decodificador.join()
+
+        # O registro consome tudo o que já foi inferido antes de terminar
+        while registrador.is_alive():
+            try:
+                fila_objetos.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        registrador.join()
+        registro.encerrar()
+        if cache_frames is not None:
+            cache_frames.soltar(tracker)
+
+        cap.release()
+        if show:
+            cv2.destroyAllWindows()
+
+    if erros:
+        raise erros[0]
+
+    if analisador is not None:
+        analisador.finish()
+
+    tempo_total = time.perf_counter() - inicio_total
+    print(f"[PERF] {estat_decode}")
+    print(f"[PERF] {estat_inferencia}")
+    print(f"[PERF] {estat_registro}")
+    print(f"[PERF] total: {estat_registro.frames} frames em {tempo_total:.2f}s "
+          f"({estat_registro.frames / tempo_total if tempo_total > 0 else 0.0:.1f} fps)")
+    print(f"[PERF] frames inferidos: {estat_inferencia.frames} de {estat_decode.frames} decodificados")
+    if detector_roi is not None:
+        print(f"[PERF] regiões: {detector_roi}")
+    if cache_frames is not None:
+        print(f"[PERF] cache de frames: {cache_frames}")
+
+    if estatisticas is not None:
+        estatisticas["tempo_total"] = tempo_total
+        estatisticas["frames_decodificados"] = estat_decode.frames
+        estatisticas["frames_inferidos"] = estat_inferencia.frames
+        estatisticas["estagios"] = {
+            e.nome: e.resumo() for e in (estat_decode, estat_inferencia, estat_registro)
+        }
+        if detector_roi is not None:
+            estatisticas["roi"] = detector_roi.resumo()
+        if cache_frames is not None:
+            estatisticas["cache_frames"] = cache_frames.resumo()
+
+    return registro.full_log_snapshots
+
+
+def run_recognize(video_path=None, log_path="./log_output.json", model=None, model_path=None,
+                  tamanho_lote=1, amostragem=None, estatisticas=None, analisador=None,
+                  backend="pytorch", regioes=None, cache=None):
+    """
+    Roda o tracking num vídeo e grava o log em log_path.
+    Com extensão .ylog o log é o binário colunar de log_colunar, gravado
+    durante o tracking; senão é o JSON de snapshots.
+    Retorna a lista de snapshots (vazia para .ylog).
+    Com log_path=None o log não é gravado nem guardado em memória; útil
+    junto com analisador.
+    """
+    if log_path is not None and log_path.endswith(EXTENSAO_LOG):
+        if model is None:
+            model = carregar_modelo(model_path, warmup=False, backend=backend)
+
+        with EscritorLog(log_path, model.names) as escritor:
+            recognize(video_path, model=model, tamanho_lote=tamanho_lote, amostragem=amostragem,
+                      estatisticas=estatisticas, analisador=analisador, guardar_snapshots=False,
+                      escritor=escritor, regioes=regioes, cache=cache)
+
+        print(f"[INFO] Log de tracking salvo em: {log_path} ({escritor.total} detecções)")
+        return []
+
+    full_log_snapshots = recognize(video_path, model=model, model_path=model_path,
+                                   tamanho_lote=tamanho_lote, amostragem=amostragem,
+                                   estatisticas=estatisticas, analisador=analisador,
+                                   guardar_snapshots=log_path is not None, backend=backend,
+                                   regioes=regioes, cache=cache)
+
+    if log_path is None:
+        return full_log_snapshots
+
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(full_log_snapshots, f, indent=4, ensure_ascii=False)
 
+    print(f"[INFO] Log de tracking salvo em: {log_path}")
     return full_log_snapshots
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+# Uploads retomáveis: o cliente cria um upload (POST /uploads), manda o
+# arquivo em pedaços (PUT /uploads/<id> com Content-Range) e, depois de
+# uma queda, pergunta quantos bytes já chegaram (HEAD /uploads/<id>,
+# cabeçalho Upload-Offset) para continuar dali, em vez de recomeçar.
+# Os bytes vão direto para PASTA/<id>.part e os dados do upload ficam em
+# PASTA/<id>.json, então um upload também sobrevive a um reinício do
+# servidor. Um pedaço tem que começar exatamente onde o anterior parou.
+PASTA_RETOMAVEIS = os.path.join("uploads", ".retomaveis")
+TEMPO_MAX_INATIVO = 24 * 3600  # uploads parados há mais que isso são apagados
+TAMANHO_BLOCO = 1024 * 1024    # bytes lidos do corpo do PUT por vez
+
+_lock_uploads = threading.Lock()
+_locks = {}  # id -> lock do upload (um PUT por vez em cada upload); sai quando o upload acaba ou é apagado
+
+
+class ErroFaixa(Exception):
+    """
+    Pedaço fora de ordem: recebido é o offset que o servidor espera.
+    """
+
+    def __init__(self, recebido):
+        super().__init__(f"O upload está em {recebido} bytes.")
+        self.recebido = recebido
+
+
+def _caminhos(upload_id, pasta=PASTA_RETOMAVEIS):
+    base = os.path.join(pasta, upload_id)
+    return base + ".part", base + ".json"
+
+
+def _lock(upload_id):
+    with _lock_uploads:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _esquecer_lock(upload_id):
+    with _lock_uploads:
+        _locks.pop(upload_id, None)
+
+
+def _limpar_antigos(pasta=PASTA_RETOMAVEIS):
+    limite = time.time() - TEMPO_MAX_INATIVO
+    for entrada in os.scandir(pasta):
+        try:
+            if entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                _esquecer_lock(entrada.name.split(".", 1)[0])
+        except OSError:
+            pass
+
+
+def criar(nome, tamanho, campos=None, regioes=None, pasta=PASTA_RETOMAVEIS):
+    """
+    Abre um upload de tamanho bytes do arquivo nome. campos são os campos
+    de texto do upload (ex.: os do trecho de sessão) e regioes o conteúdo
+    das regiões de movimento, se houver. Retorna o id do upload.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    _limpar_antigos(pasta)
+
+    upload_id = uuid.uuid4().hex
+    parte, dados = _caminhos(upload_id, pasta)
+    open(parte, "wb").close()
+    with open(dados, "w", encoding="utf-8") as f:
+        json.dump({"nome": nome, "tamanho": tamanho, "campos": campos or {}, "regioes": regioes}, f)
+    return upload_id
+
+
+def carregar(upload_id, pasta=PASTA_RETOMAVEIS):
+    """
+    Dados do upload, com "recebido" (bytes já gravados), ou None se ele
+    não existe. Um upload concluído tem "arquivo" (onde o vídeo foi salvo).
+    Sem o .part (ex.: _limpar_antigos apagou um e não o outro ainda), o
+    upload também não existe.
+    """
+    parte, caminho_dados = _caminhos(upload_id, pasta)
+    try:
+        with open(caminho_dados, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        dados["recebido"] = dados["tamanho"] if "arquivo" in dados else os.path.getsize(parte)
+    except (OSError, ValueError):
+        return None
+    return dados
+
+
+def anexar(upload_id, inicio, fim, total, stream, publicar, pasta=PASTA_RETOMAVEIS):
+    """
+    Grava os bytes inicio..fim (inclusive) do arquivo, lidos de stream.
+    Se a conexão cair no meio, o que já chegou fica gravado e o próximo
+    pedaço começa dali. Quando o último byte chega, chama
+    publicar(caminho_part, dados), que move o .part para o lugar final e
+    devolve esse caminho.
+    Retorna (dados do upload, bytes lidos agora). Levanta ErroFaixa se
+    inicio não for o offset atual, ValueError se a faixa não bate com o
+    upload e KeyError se ele não existe.
+    """
+    parte, caminho_dados = _caminhos(upload_id, pasta)
+    with _lock(upload_id):
+        dados = carregar(upload_id, pasta)
+        if dados is None:
+            raise KeyError(upload_id)
+        if total != dados["tamanho"] or fim < inicio or fim >= total:
+            raise ValueError(f"Faixa {inicio}-{fim}/{total} inválida para um upload de {dados['tamanho']} bytes.")
+        if inicio != dados["recebido"]:
+            raise ErroFaixa(dados["recebido"])
+
+        restante = fim - inicio + 1
+        lidos = 0
+        with open(parte, "ab") as f:
+            while restante > 0:
+                bloco = stream.read(min(TAMANHO_BLOCO, restante))
+                if not bloco:
+                    break
+                f.write(bloco)
+                restante -= len(bloco)
+                lidos += len(bloco)
+
+        dados["recebido"] += lidos
+        if dados["recebido"] == dados["tamanho"]:
+            # Os dados ficam (sem as regiões), para um cliente que perdeu
+            # a resposta do último pedaço ver pelo HEAD que o upload acabou
+            dados["arquivo"] = publicar(parte, dados)
+            with open(caminho_dados, "w", encoding="utf-8") as f:
+                json.dump({chave: valor for chave, valor in dados.items()
+                           if chave not in ("regioes", "recebido")}, f)
+            # Concluído, o upload não aceita mais pedaços: o lock não
+            # protege mais nada
+            _esquecer_lock(upload_id)
+        return dados, lidos
@@ -1,12 +1,29 @@
+import os
 import cv2
 import numpy as np
 import time
+import uuid
+import queue
+import argparse
+import threading
+import requests
+from collections import deque
+import movimento
+import Envia_Arquivo
+from Retira_Qualidade import PASTA_PARCIAL, caminho_segmento, salvar_segmento
+
+URL_STREAM = "http://192.168.1.7:8000/stream"  # <- ALTERE AQUI
+QUALIDADE_JPEG = 80
+MAX_FRAMES_PENDENTES = 2  # frames esperando envio; acima disso descarta o mais antigo
+FRAMES_NA_FILA = 32       # frames esperando o gravador de trechos; acima disso a captura espera
 
 
 def capturar_da_camera(fps_destino=3):
     """
     Captura vídeo da webcam, mostrando na tela,
     mas só guarda frames na memória na taxa fps_destino (ex: 3 fps).
+    Guarda a sessão inteira; para gravar os trechos com movimento durante
+    a captura, use gravar_da_camera.
     Aperte 'q' para parar.
     """
     cap = cv2.VideoCapture(0)
@@ -52,7 +69,9 @@ def detectar_frames_com_movimento(frames,
                                   limiar_pix_diff=25,
                                   limiar_qtd_pixels=5000,
                                   min_seq_movimento=3,
-                                  padding=3):
+                                  padding=3,
+                                  lado_proxy=movimento.LADO_PROXY,
+                                  workers=movimento.WORKERS):
     """
     Recebe uma lista de frames e devolve uma máscara booleana
     indicando quais frames devem ser mantidos (com movimento).
@@ -61,60 +80,11 @@ def detectar_frames_com_movimento(frames,
     - limiar_qtd_pixels: número mínimo de pixels diferentes para considerar movimento.
     - min_seq_movimento: número mínimo de frames com movimento para considerar um trecho válido.
     - padding: quantos frames antes e depois do movimento manter.
+    - lado_proxy: maior lado da cópia reduzida usada na comparação (None = resolução cheia).
+    - workers: threads para comparar pedaços da lista em paralelo.
     """
-    if not frames:
-        return []
-
-    motion_flags = []
-    prev_gray = None
-
-    for frame in frames:
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-
-        if prev_gray is None:
-            prev_gray = gray
-            motion_flags.append(False)
-            continue
-
-        frame_delta = cv2.absdiff(prev_gray, gray)
-        _, thresh = cv2.threshold(frame_delta, limiar_pix_diff, 255, cv2.THRESH_BINARY)
-        thresh = cv2.dilate(thresh, None, iterations=2)
-
-        motion_pixels = cv2.countNonZero(thresh)
-
-        # Considera que há movimento se pixels suficientes mudaram
-        motion = motion_pixels > limiar_qtd_pixels
-        motion_flags.append(motion)
-
-        # Atualiza "background" para próxima comparação
-        prev_gray = gray
-
-    # Suaviza a máscara para formar trechos contínuos com padding
-    n = len(motion_flags)
-    keep = [False] * n
-    i = 0
-    while i < n:
-        if motion_flags[i]:
-            inicio = i
-            while i < n and motion_flags[i]:
-                i += 1
-            fim = i - 1
-
-            # Só considera um trecho se tiver pelo menos min_seq_movimento frames
-            if fim - inicio + 1 >= min_seq_movimento:
-                ks = max(0, inicio - padding)
-                ke = min(n - 1, fim + padding)
-                for j in range(ks, ke + 1):
-                    keep[j] = True
-        else:
-            i += 1
-
-    # Se nada foi marcado como movimento, por segurança mantém tudo
-    if not any(keep):
-        keep = [True] * n
-
-    return keep
+    return movimento.detectar_movimento(frames, limiar_pix_diff, limiar_qtd_pixels, min_seq_movimento,
+                                        padding, lado_proxy=lado_proxy, workers=workers)
 
 
 def salvar_video_mp4(frames, mask_keep, fps=3, nome_arquivo="saida.mp4"):
@@ -144,20 +114,322 @@ def salvar_video_mp4(frames, mask_keep, fps=3, nome_arquivo="saida.mp4"):
     print(f"Vídeo salvo como {nome_arquivo}. Frames mantidos: {kept_count}")
 
 
-def main():
-    #  Capturar vídeo da câmera em aproximadamente 3 FPS
-    fps_destino = 3
-    frames = capturar_da_camera(fps_destino=fps_destino)
+def _fechar_trecho(out, parcial, pasta, frames, estado, envio):
+    """
+    Fecha o trecho e o coloca na pasta, com os dados do trecho ao lado
+    (que chegam antes do vídeo). Com envio, o trecho vai para a fila de
+    upload na hora.
+    """
+    out.release()
+    destino = os.path.join(pasta, os.path.basename(parcial))
+    os.replace(caminho_segmento(parcial), caminho_segmento(destino))
+    os.replace(parcial, destino)
+    estado["trechos"].append(destino)
+    print(f"Trecho salvo como {destino}. Frames mantidos: {frames}")
+    if envio is not None:
+        envio.put(destino)
 
-    if not frames:
+
+def _frames_da_fila(fila, tempos):
+    """
+    Frames da fila até o None; o instante de captura de cada um vai para
+    tempos, na mesma ordem.
+    """
+    while True:
+        item = fila.get()
+        if item is None:
+            return
+        tempos.append(item[0])
+        yield item[1]
+
+
+def _gravar_trechos(fila, fps, pasta, sessao, estado, envio=None, duracao_trecho=None,
+                    min_seq_movimento=3, padding=3, **parametros):
+    """
+    Thread de gravação: detecta movimento nos frames que chegam pela fila
+    e grava cada trecho com movimento (com padding frames antes e depois)
+    num MP4 próprio, fechado assim que o trecho acaba ou, com
+    duracao_trecho, a cada duracao_trecho segundos de vídeo. Cada trecho
+    leva o id da sessão, um número de sequência e o instante (desde o
+    começo da captura) do seu primeiro frame, ver
+    Retira_Qualidade.salvar_segmento. O arquivo é escrito em PASTA_PARCIAL
+    e só vai para a pasta quando fecha, para o Envia_Arquivo não pegar um
+    vídeo pela metade.
+    """
+    pasta_parcial = os.path.join(pasta, PASTA_PARCIAL)
+    os.makedirs(pasta_parcial, exist_ok=True)
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # codec MP4
+    max_frames = max(1, int(round(duracao_trecho * fps))) if duracao_trecho else None
+    out = None
+    parcial = None
+    frames = 0
+    tempos = deque()  # instantes de captura dos frames que ainda não saíram do filtro
+
+    marcados = movimento.marcar(_frames_da_fila(fila, tempos), **parametros)
+    try:
+        for frame, _, manter in movimento.filtrar(marcados, min_seq_movimento, padding):
+            t = tempos.popleft()
+            if out is not None and (not manter or frames == max_frames):
+                _fechar_trecho(out, parcial, pasta, frames, estado, envio)
+                out = None
+            if not manter:
+                continue
+
+            if out is None:
+                seq = len(estado["trechos"])
+                parcial = os.path.join(pasta_parcial, f"saida_{sessao}_{seq:03d}.mp4")
+                salvar_segmento(sessao, seq, t, parcial)
+                h, w = frame.shape[:2]
+                out = cv2.VideoWriter(parcial, fourcc, fps, (w, h))
+                frames = 0
+            out.write(frame)
+            frames += 1
+
+        if out is not None:
+            _fechar_trecho(out, parcial, pasta, frames, estado, envio)
+            out = None
+    finally:
+        # Num erro, o trecho aberto fica em PASTA_PARCIAL, mas o arquivo é fechado
+        if out is not None:
+            out.release()
+
+
+def _enviar_trechos(envio, url):
+    """
+    Thread de upload: manda cada trecho assim que ele fecha, em pedaços
+    retomáveis (url é o /uploads do servidor). Trechos que falham ficam na
+    pasta para o monitor do Envia_Arquivo continuar de onde pararam; um
+    trecho que o monitor já pegou fica com ele (ver Envia_Arquivo.reservar).
+    """
+    while True:
+        caminho = envio.get()
+        if caminho is None:
+            break
+        Envia_Arquivo.enviar_reservado(caminho, url)
+
+
+def _entregar(fila, item, gravador, espera=0.5):
+    """
+    Coloca item na fila do gravador, esperando enquanto ela estiver cheia.
+    Retorna False se o gravador parou (a fila nunca mais esvaziaria).
+    """
+    while gravador.is_alive():
+        try:
+            fila.put(item, timeout=espera)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def gravar_da_camera(fps_destino=3, pasta=".", duracao_trecho=None, url_envio=None, **parametros):
+    """
+    Captura vídeo da webcam, mostrando na tela, e grava cada trecho com
+    movimento num MP4 próprio (saida_<sessão>_000.mp4, ...) assim que ele
+    termina, em vez de guardar a sessão inteira para filtrar no fim.
+    Com duracao_trecho (segundos), trechos longos também são cortados
+    nesse tamanho, para o servidor começar antes de o movimento acabar.
+    Com url_envio (/uploads), cada trecho é enviado assim que fecha; o servidor junta
+    os trechos da sessão numa linha do tempo só.
+    A detecção, a gravação e o envio rodam em threads separadas; em
+    memória ficam só a fila até elas e a janela de movimento.filtrar,
+    então sessões longas não crescem. Sem movimento nenhum, nada é gravado.
+    parametros vão para detecção (limiar_pix_diff, limiar_qtd_pixels,
+    min_seq_movimento, padding, lado_proxy).
+    Aperte 'q' para parar. Retorna os arquivos gravados.
+    """
+    cap = cv2.VideoCapture(0)
+
+    if not cap.isOpened():
+        print("Erro ao acessar a câmera.")
+        return []
+
+    fila = queue.Queue(maxsize=FRAMES_NA_FILA)
+    estado = {"trechos": []}
+    sessao = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+    envio = None
+    if url_envio:
+        envio = queue.Queue()
+        enviador = threading.Thread(target=_enviar_trechos, args=(envio, url_envio), daemon=True)
+        enviador.start()
+
+    gravador = threading.Thread(target=_gravar_trechos, args=(fila, fps_destino, pasta, sessao, estado, envio),
+                                kwargs={"duracao_trecho": duracao_trecho, **parametros}, daemon=True)
+    gravador.start()
+
+    intervalo = 1.0 / fps_destino
+    ultimo_salvo = 0.0
+    capturados = 0
+    inicio = time.time()
+
+    print(f"Gravando sessão {sessao}... Aperte 'q' na janela de vídeo para parar.")
+
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        agora = time.time()
+
+        # Mostra na tela
+        cv2.imshow("Gravando (aperte 'q' para parar)", frame)
+
+        # Manda para o gravador apenas na taxa desejada (3 fps)
+        if agora - ultimo_salvo >= intervalo:
+            if not _entregar(fila, (agora - inicio, frame.copy()), gravador):
+                print("Erro: o gravador de trechos parou.")
+                break
+            capturados += 1
+            ultimo_salvo = agora
+
+        # Tecla 'q' para parar
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+    _entregar(fila, None, gravador)
+    gravador.join()
+    if envio is not None:
+        envio.put(None)
+        enviador.join()
+
+    print(f"Captura finalizada. Total de frames capturados: {capturados}, trechos gravados: {len(estado['trechos'])}")
+    return estado["trechos"]
+
+
+def _enviar_frames(url_base, pendentes, estado):
+    """
+    Thread de envio: manda cada frame para o servidor numa conexão keep-alive
+    e mede o atraso em frames entre a captura e a resposta.
+    """
+    sessao_http = requests.Session()
+
+    while True:
+        item = pendentes.get()
+        if item is None:
+            break
+
+        indice, current_time, jpeg = item
+        try:
+            resposta = sessao_http.post(
+                f"{url_base}/frame",
+                data=jpeg,
+                headers={
+                    "Content-Type": "image/jpeg",
+                    "X-Timestamp": f"{current_time:.3f}",
+                    "X-Frame": str(indice),
+                },
+                timeout=10,
+            )
+        except requests.RequestException as e:
+            print(f"✗ Erro ao enviar frame {indice}: {e}")
+            continue
+
+        if resposta.status_code != 200:
+            print(f"✗ Frame {indice} recusado: status {resposta.status_code}, corpo: {resposta.text}")
+            continue
+
+        atraso = estado["capturados"] - 1 - indice
+        estado["atrasos"].append(atraso)
+        for ev in resposta.json()["eventos"]:
+            print(f"[{ev['evento']}] {ev['objeto']} {ev['ID']} em {ev['t']:.2f}s "
+                  f"(atraso de {atraso} frame(s))")
+
+    try:
+        sessao_http.delete(url_base, timeout=10)
+    except requests.RequestException:
+        pass
+
+
+def transmitir_da_camera(url_stream=URL_STREAM, fps_destino=3):
+    """
+    Captura da webcam e envia os frames ao vivo para o servidor, como JPEG,
+    na taxa fps_destino. O servidor rastreia cada frame assim que chega.
+    O envio roda numa thread separada; se a rede atrasar, os frames mais
+    antigos ainda não enviados são descartados.
+    Aperte 'q' para parar.
+    """
+    cap = cv2.VideoCapture(0)
+
+    if not cap.isOpened():
+        print("Erro ao acessar a câmera.")
         return
 
-    #  Detectar quais frames têm movimento
-    print("Detectando movimento e filtrando trechos sem nada...")
-    mask_keep = detectar_frames_com_movimento(frames)
+    sessao_id = uuid.uuid4().hex
+    url_base = f"{url_stream}/{sessao_id}"
+    pendentes = queue.Queue(maxsize=MAX_FRAMES_PENDENTES)
+    estado = {"capturados": 0, "atrasos": []}
+    envio = threading.Thread(target=_enviar_frames, args=(url_base, pendentes, estado), daemon=True)
+    envio.start()
+
+    intervalo = 1.0 / fps_destino
+    ultimo_salvo = 0.0
+    inicio = time.time()
+
+    print(f"Transmitindo sessão {sessao_id}... Aperte 'q' na janela de vídeo para parar.")
+
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        agora = time.time()
+
+        cv2.imshow("Transmitindo (aperte 'q' para parar)", frame)
+
+        if agora - ultimo_salvo >= intervalo:
+            ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, QUALIDADE_JPEG])
+            if ok:
+                item = (estado["capturados"], agora - inicio, jpeg.tobytes())
+                try:
+                    pendentes.put_nowait(item)
+                except queue.Full:
+                    # Rede mais lenta que a câmera: descarta o frame mais antigo
+                    try:
+                        pendentes.get_nowait()
+                    except queue.Empty:
+                        pass
+                    pendentes.put_nowait(item)
+                estado["capturados"] += 1
+            ultimo_salvo = agora
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+
+    cap.release()
+    cv2.destroyAllWindows()
+
+    pendentes.put(None)
+    envio.join()
+
+    atrasos = estado["atrasos"]
+    if atrasos:
+        print(f"Transmissão finalizada. Frames enviados: {estado['capturados']}, "
+              f"atraso médio: {sum(atrasos) / len(atrasos):.1f} frame(s), máximo: {max(atrasos)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Captura da webcam.")
+    parser.add_argument("--stream", nargs="?", const=URL_STREAM, default=None,
+                        help="transmite ao vivo para o servidor em vez de gravar os trechos com movimento")
+    parser.add_argument("--trecho", type=float, default=None, metavar="SEGUNDOS",
+                        help="corta também os trechos com movimento longos nesse tamanho")
+    parser.add_argument("--enviar", nargs="?", const=Envia_Arquivo.URL_UPLOADS, default=None, metavar="URL",
+                        help="envia cada trecho assim que ele fecha")
+    args = parser.parse_args()
+
+    if args.stream:
+        transmitir_da_camera(args.stream)
+        return
 
-    #  Salvar apenas as partes com movimento em formato MP4
-    salvar_video_mp4(frames, mask_keep, fps=fps_destino, nome_arquivo="saida.mp4")
+    #  Capturar vídeo da câmera em aproximadamente 3 FPS, gravando cada
+    #  trecho com movimento em MP4 enquanto a captura continua
+    gravar_da_camera(fps_destino=3, duracao_trecho=args.trecho, url_envio=args.enviar)
 
 
 if __name__ == "__main__":
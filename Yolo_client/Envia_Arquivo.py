@@ -1,16 +1,87 @@
 import os
+import json
 import time
+import random
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
 import requests
+from requests.adapters import HTTPAdapter
+from Retira_Qualidade import caminho_regioes, caminho_segmento
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # ====== CONFIGURAÇÕES ======
 PASTA_VIDEOS = r"./"  # <- ALTERE AQUI
 URL_DESTINO = "http://192.168.1.7:8000/upload"  # <- ALTERE AQUI
+URL_UPLOADS = "http://192.168.1.7:8000/uploads"  # uploads retomáveis, em pedaços
 
 INTERVALO_VERIFICACAO = 5  # em segundos, tempo entre varreduras
 TEMPO_ESPERA_ARQUIVO = 2   # segundos para verificar se o arquivo terminou de ser escrito
 NUM_CHECAGENS_TAMANHO = 3  # quantas vezes conferir se o tamanho estabilizou
+
+NUM_ENVIOS = 4                     # uploads ao mesmo tempo (e conexões mantidas abertas)
+TAMANHO_PEDACO = 8 * 1024 * 1024   # bytes por PUT no upload retomável
+MAX_TENTATIVAS = 6                 # falhas seguidas antes de desistir (o monitor tenta de novo depois)
+ESPERA_BASE = 0.5                  # segundos; a espera entre tentativas dobra até ESPERA_MAX
+ESPERA_MAX = 30
+EXTENSAO_ENVIO = ".envio.json"     # upload em andamento de um vídeo, para continuar depois de reiniciar
+EXTENSAO_RESERVA = ".reserva"      # trava de quem está enviando o vídeo (ver reservar)
 # ===========================
 
+_lock_sessao = threading.Lock()
+_sessao = None
+_conexoes = 0  # tamanho do pool de conexões da _sessao
+
+
+class ErroEnvio(Exception):
+    """
+    Resposta do servidor que não adianta repetir (ex.: 400).
+    """
+
+
+class UploadPerdido(Exception):
+    """
+    O servidor não conhece mais o upload (404): recomeça com um novo, e
+    conta como falha para não recomeçar para sempre.
+    """
+
+
+def sessao_http(conexoes: int = None):
+    """
+    requests.Session compartilhada: as conexões ficam abertas (keep-alive)
+    e são reaproveitadas entre uploads, até conexoes (padrão: NUM_ENVIOS)
+    ao mesmo tempo. Pedir mais conexões que o pool atual troca o pool por
+    um maior; com menos, o urllib3 descartaria as que sobram a cada envio.
+    """
+    global _sessao, _conexoes
+    conexoes = max(1, conexoes or NUM_ENVIOS)
+    with _lock_sessao:
+        if _sessao is None:
+            _sessao = requests.Session()
+            _conexoes = 0
+        if conexoes > _conexoes:
+            adaptador = HTTPAdapter(pool_maxsize=conexoes)
+            _sessao.mount("http://", adaptador)
+            _sessao.mount("https://", adaptador)
+            _conexoes = conexoes
+        return _sessao
+
+
+def espera_tentativa(tentativa: int) -> float:
+    """
+    Segundos de espera antes da tentativa seguinte: um valor aleatório
+    até ESPERA_BASE * 2^tentativa (limitado a ESPERA_MAX), para que
+    clientes que falharam juntos não voltem todos ao mesmo tempo.
+    """
+    return random.uniform(0, min(ESPERA_MAX, ESPERA_BASE * 2 ** tentativa))
+
 
 def arquivo_pronto(caminho_arquivo: str) -> bool:
     """
@@ -37,20 +108,39 @@ def arquivo_pronto(caminho_arquivo: str) -> bool:
     return False
 
 
-def enviar_arquivo(caminho_arquivo: str) -> bool:
+def _campos_segmento(caminho_arquivo: str) -> dict:
+    """
+    Campos "sessao", "seq" e "inicio" se o vídeo for um trecho de sessão.
+    """
+    if not os.path.exists(caminho_segmento(caminho_arquivo)):
+        return {}
+    with open(caminho_segmento(caminho_arquivo), "r", encoding="utf-8") as f:
+        return {chave: str(valor) for chave, valor in json.load(f).items()}
+
+
+def enviar_arquivo(caminho_arquivo: str, url: str = None) -> bool:
     """
-    Envia o arquivo .mp4 para a URL_DESTINO via HTTP POST.
+    Envia o arquivo .mp4 para url (padrão: URL_DESTINO) via HTTP POST.
+    Se houver o arquivo de regiões de movimento ao lado (saida.roi.json,
+    ver Retira_Qualidade.salvar_regioes), ele vai junto no campo "regioes";
+    se o vídeo for um trecho de sessão (saida.seg.json), sessão, sequência
+    e início vão nos campos "sessao", "seq" e "inicio".
     Retorna True se deu certo (status 2xx), False caso contrário.
     """
     nome_arquivo = os.path.basename(caminho_arquivo)
+    regioes = caminho_regioes(caminho_arquivo)
     print(f"Enviando arquivo: {nome_arquivo}")
 
     try:
-        with open(caminho_arquivo, "rb") as f:
+        campos = _campos_segmento(caminho_arquivo)
+
+        with contextlib.ExitStack() as arquivos:
+            f = arquivos.enter_context(open(caminho_arquivo, "rb"))
             files = {"video": (nome_arquivo, f, "video/mp4")}
-            # Se a sua API espera outro nome de campo (por ex: "video"),
-            # troque "file" acima por "video".
-            resposta = requests.post(URL_DESTINO, files=files, timeout=200)
+            if os.path.exists(regioes):
+                f_regioes = arquivos.enter_context(open(regioes, "rb"))
+                files["regioes"] = (os.path.basename(regioes), f_regioes, "application/json")
+            resposta = sessao_http().post(url or URL_DESTINO, data=campos, files=files, timeout=200)
 
         if 200 <= resposta.status_code < 300:
             print(f"✓ Enviado com sucesso: {nome_arquivo} (status {resposta.status_code})")
@@ -67,6 +157,223 @@ def enviar_arquivo(caminho_arquivo: str) -> bool:
         return False
 
 
+def caminho_envio(caminho_video: str) -> str:
+    return os.path.splitext(caminho_video)[0] + EXTENSAO_ENVIO
+
+
+def _ler_envio(caminho_video: str):
+    """
+    URL do upload retomável já aberto para este vídeo, se o vídeo não mudou desde então.
+    """
+    try:
+        with open(caminho_envio(caminho_video), "r", encoding="utf-8") as f:
+            envio = json.load(f)
+        estado = os.stat(caminho_video)
+        if envio["tamanho"] == estado.st_size and envio["mtime"] == estado.st_mtime:
+            return envio["url"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _esquecer_envio(caminho_video: str) -> None:
+    with contextlib.suppress(OSError):
+        os.remove(caminho_envio(caminho_video))
+
+
+def _conferir(resposta) -> None:
+    """
+    Erros 5xx (e 408/429) levantam requests.HTTPError, que é tentado de
+    novo; outros 4xx levantam ErroEnvio.
+    """
+    if resposta.status_code >= 500 or resposta.status_code in (408, 429):
+        resposta.raise_for_status()
+    if resposta.status_code >= 400:
+        raise ErroEnvio(f"status {resposta.status_code}, corpo: {resposta.text}")
+
+
+def _abrir_upload(sessao, url: str, caminho_arquivo: str, tamanho: int) -> str:
+    """
+    Cria o upload no servidor (POST /uploads) e guarda a URL dele em
+    saida.envio.json. Retorna a URL.
+    """
+    dados = {"nome": os.path.basename(caminho_arquivo), "tamanho": tamanho,
+             "campos": _campos_segmento(caminho_arquivo)}
+    if os.path.exists(caminho_regioes(caminho_arquivo)):
+        with open(caminho_regioes(caminho_arquivo), "r", encoding="utf-8") as f:
+            dados["regioes"] = f.read()
+
+    resposta = sessao.post(url, json=dados, timeout=30)
+    _conferir(resposta)
+    url_upload = urljoin(url, resposta.headers["Location"])
+
+    estado = os.stat(caminho_arquivo)
+    with open(caminho_envio(caminho_arquivo), "w", encoding="utf-8") as f:
+        json.dump({"url": url_upload, "tamanho": estado.st_size, "mtime": estado.st_mtime}, f)
+    return url_upload
+
+
+def enviar_retomavel(caminho_arquivo: str, url: str = None, tamanho_pedaco: int = None) -> bool:
+    """
+    Envia o .mp4 em pedaços de tamanho_pedaco (padrão: TAMANHO_PEDACO)
+    para url (padrão: URL_UPLOADS), com as regiões e os dados do trecho como enviar_arquivo.
+    Se a conexão cair, pergunta ao servidor quantos bytes chegaram (HEAD)
+    e continua dali, depois de uma espera com jitter; desiste depois de
+    MAX_TENTATIVAS falhas seguidas. O upload fica em saida.envio.json,
+    então uma nova chamada (ex.: na próxima varredura, ou depois de
+    reiniciar o cliente) também continua de onde parou.
+    Retorna True se o vídeo chegou inteiro, False caso contrário.
+    """
+    nome_arquivo = os.path.basename(caminho_arquivo)
+    url = url or URL_UPLOADS
+    tamanho_pedaco = tamanho_pedaco or TAMANHO_PEDACO
+    sessao = sessao_http()
+    print(f"Enviando arquivo: {nome_arquivo}")
+
+    try:
+        tamanho = os.path.getsize(caminho_arquivo)
+        url_upload = _ler_envio(caminho_arquivo)
+    except OSError as e:
+        print(f"✗ Exceção ao enviar {nome_arquivo}: {e}")
+        return False
+
+    offset = None  # None: perguntar ao servidor
+    falhas = 0
+    while True:
+        try:
+            if url_upload is None:
+                url_upload = _abrir_upload(sessao, url, caminho_arquivo, tamanho)
+                offset = 0
+            elif offset is None:
+                resposta = sessao.head(url_upload, timeout=30)
+                if resposta.status_code == 404:
+                    # O servidor não conhece mais o upload (ex.: expirou): recomeça
+                    url_upload = None
+                    raise UploadPerdido(f"upload não encontrado no servidor (HEAD {resposta.status_code})")
+                _conferir(resposta)
+                offset = int(resposta.headers["Upload-Offset"])
+                if offset:
+                    print(f"↻ Continuando {nome_arquivo} em {offset}/{tamanho} bytes")
+
+            if offset >= tamanho:
+                break
+
+            fim = min(offset + tamanho_pedaco, tamanho) - 1
+            with open(caminho_arquivo, "rb") as f:
+                f.seek(offset)
+                pedaco = f.read(fim - offset + 1)
+            resposta = sessao.put(url_upload, data=pedaco, timeout=200,
+                                  headers={"Content-Range": f"bytes {offset}-{fim}/{tamanho}",
+                                           "Content-Type": "application/octet-stream"})
+
+            if resposta.status_code == 409:
+                # Fora de ordem (ex.: a resposta do pedaço anterior se perdeu)
+                offset = int(resposta.headers["Upload-Offset"])
+                continue
+            if resposta.status_code == 404:
+                url_upload = None
+                raise UploadPerdido(f"upload não encontrado no servidor (PUT {resposta.status_code})")
+            _conferir(resposta)
+            offset = fim + 1
+            falhas = 0
+
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError, UploadPerdido) as e:
+            falhas += 1
+            if falhas >= MAX_TENTATIVAS:
+                print(f"✗ Desistindo de {nome_arquivo} depois de {falhas} falhas: {e}")
+                return False
+            espera = espera_tentativa(falhas)
+            print(f"✗ Falha ao enviar {nome_arquivo} ({e}); tentando de novo em {espera:.1f}s")
+            time.sleep(espera)
+            offset = None
+        except (ErroEnvio, OSError, ValueError, KeyError) as e:
+            print(f"✗ Erro ao enviar {nome_arquivo}: {e}")
+            _esquecer_envio(caminho_arquivo)
+            return False
+
+    _esquecer_envio(caminho_arquivo)
+    print(f"✓ Enviado com sucesso: {nome_arquivo} ({tamanho} bytes)")
+    return True
+
+
+def caminho_reserva(caminho_video: str) -> str:
+    return os.path.splitext(caminho_video)[0] + EXTENSAO_RESERVA
+
+
+def reservar(caminho_video: str):
+    """
+    Trava o vídeo para este processo enviar: o monitor e o envio do
+    Deteccao veem os mesmos trechos, e só quem tem a trava envia. A trava é
+    do sistema operacional sobre <vídeo>.reserva, então some sozinha se o
+    processo morrer no meio do envio. Retorna o arquivo da trava (para
+    liberar) ou None se outro já está enviando ou o vídeo já foi enviado.
+    """
+    try:
+        reserva = open(caminho_reserva(caminho_video), "a+b")
+    except OSError:
+        return None
+    try:
+        if fcntl is not None:
+            fcntl.flock(reserva.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(reserva.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        reserva.close()
+        return None
+
+    # Quem tinha a trava antes pode ter enviado e apagado o vídeo
+    if not os.path.exists(caminho_video):
+        liberar(reserva)
+        return None
+    return reserva
+
+
+def liberar(reserva) -> None:
+    if fcntl is None:
+        with contextlib.suppress(OSError):
+            reserva.seek(0)
+            msvcrt.locking(reserva.fileno(), msvcrt.LK_UNLCK, 1)
+    reserva.close()
+
+
+def enviar_reservado(caminho_video: str, url: str = None, enviar=None, remover: bool = True):
+    """
+    Envia o vídeo (enviar_retomavel ou enviar) se conseguir a reserva e,
+    com remover=True, apaga o que chegou (ver remover_enviado). Retorna
+    True/False, ou None se o vídeo já está com outro envio.
+    """
+    reserva = reservar(caminho_video)
+    if reserva is None:
+        return None
+    try:
+        ok = (enviar or enviar_retomavel)(caminho_video, url)
+        if ok and remover:
+            remover_enviado(caminho_video)
+    finally:
+        liberar(reserva)
+    if ok and remover:
+        # Só depois de liberar: no Windows um arquivo aberto não pode ser apagado
+        with contextlib.suppress(OSError):
+            os.remove(caminho_reserva(caminho_video))
+    return ok
+
+
+def enviar_varios(caminhos, url: str = None, envios: int = NUM_ENVIOS, remover: bool = True) -> dict:
+    """
+    Envia os vídeos com enviar_retomavel, até envios ao mesmo tempo.
+    Com remover=True, apaga os que chegaram (ver remover_enviado).
+    Retorna {caminho: True/False}; vídeos que outro processo já está
+    enviando contam como False.
+    """
+    def enviar(caminho):
+        return bool(enviar_reservado(caminho, url, remover=remover))
+
+    caminhos = list(caminhos)
+    sessao_http(envios)
+    with ThreadPoolExecutor(envios) as executor:
+        return dict(zip(caminhos, executor.map(enviar, caminhos)))
+
+
 def remover_arquivo(caminho_arquivo: str) -> None:
     """
     Remove o arquivo do disco.
@@ -78,14 +385,47 @@ def remover_arquivo(caminho_arquivo: str) -> None:
         print(f"✗ Não foi possível remover {caminho_arquivo}: {e}")
 
 
-def monitorar_pasta():
+def remover_enviado(caminho_video: str) -> None:
+    """
+    Remove o vídeo enviado e os arquivos que foram junto com ele.
+    """
+    remover_arquivo(caminho_video)
+    for caminho in (caminho_regioes(caminho_video), caminho_segmento(caminho_video), caminho_envio(caminho_video)):
+        if os.path.exists(caminho):
+            remover_arquivo(caminho)
+
+
+def monitorar_pasta(url: str = None, envios: int = NUM_ENVIOS, retomavel: bool = True):
+    """
+    Envia os .mp4 que aparecem em PASTA_VIDEOS, até envios ao mesmo tempo,
+    e apaga os que chegaram. Com retomavel=False usa o POST único de
+    enviar_arquivo (servidores sem /uploads).
+    """
+    enviar = enviar_retomavel if retomavel else enviar_arquivo
+    url = url or (URL_UPLOADS if retomavel else URL_DESTINO)
     print(f"Monitorando pasta: {PASTA_VIDEOS}")
-    print(f"Enviando vídeos para: {URL_DESTINO}")
+    print(f"Enviando vídeos para: {url} ({envios} por vez)")
+
+    sessao_http(envios)
+    em_envio = set()
+    lock = threading.Lock()
 
+    def enviar_e_remover(caminho_video):
+        try:
+            # Se deu certo, remove (junto com as regiões de movimento e os
+            # dados do trecho, se houver); trechos que o Deteccao já está
+            # enviando ficam com ele
+            enviar_reservado(caminho_video, url, enviar)
+        finally:
+            with lock:
+                em_envio.discard(caminho_video)
+
+    executor = ThreadPoolExecutor(envios)
     while True:
         try:
-            # Varre todos os arquivos na pasta
-            for entrada in os.scandir(PASTA_VIDEOS):
+            # Varre todos os arquivos na pasta, em ordem de nome (trechos de
+            # uma sessão saem na ordem de sequência)
+            for entrada in sorted(os.scandir(PASTA_VIDEOS), key=lambda e: e.name):
                 if not entrada.is_file():
                     continue
 
@@ -93,22 +433,28 @@ def monitorar_pasta():
                     continue
 
                 caminho_video = entrada.path
+                with lock:
+                    if caminho_video in em_envio:
+                        continue
 
-                # Verificar se o arquivo terminou de ser escrito
-                if not arquivo_pronto(caminho_video):
+                # Verificar se o arquivo terminou de ser escrito. Trechos de
+                # sessão só aparecem na pasta já completos (gravados em outro
+                # nome e renomeados), então não precisam esperar
+                if not os.path.exists(caminho_segmento(caminho_video)) and not arquivo_pronto(caminho_video):
                     print(f"Arquivo ainda sendo escrito, pulando por enquanto: {entrada.name}")
                     continue
 
-                # Tenta enviar
-                if enviar_arquivo(caminho_video):
-                    # Se deu certo, remove
-                    remover_arquivo(caminho_video)
+                # Envia em segundo plano; a varredura segue para os próximos
+                with lock:
+                    em_envio.add(caminho_video)
+                executor.submit(enviar_e_remover, caminho_video)
 
             # Espera um pouco antes da próxima varredura
             time.sleep(INTERVALO_VERIFICACAO)
 
         except KeyboardInterrupt:
             print("\nEncerrando monitoramento...")
+            executor.shutdown(wait=False, cancel_futures=True)
             break
         except Exception as e:
             print(f"Erro no loop de monitoramento: {e}")
@@ -117,4 +463,11 @@ def monitorar_pasta():
 
 
 if __name__ == "__main__":
-    monitorar_pasta()
+    parser = argparse.ArgumentParser(description="Envia os vídeos da pasta para o servidor.")
+    parser.add_argument("--url", default=None, help=f"padrão: {URL_UPLOADS} (ou {URL_DESTINO} com --simples)")
+    parser.add_argument("--envios", type=int, default=NUM_ENVIOS, help="uploads ao mesmo tempo")
+    parser.add_argument("--simples", action="store_true",
+                        help="um POST por vídeo em /upload, sem pedaços nem retomada")
+    args = parser.parse_args()
+
+    monitorar_pasta(args.url, args.envios, retomavel=not args.simples)
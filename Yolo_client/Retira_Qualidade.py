@@ -1,18 +1,33 @@
+import os
 import cv2
-import numpy as np
+import json
 import time
+import movimento
 
+# Arquivo ao lado do vídeo com as regiões de movimento de cada frame
+# (saida.mp4 -> saida.roi.json); o servidor roda o detector só nelas
+EXTENSAO_REGIOES = ".roi.json"
 
-def carregar_de_video(caminho_video="Entrada.mp4", fps_destino=3, tamanho_saida=(640, 640)):
+# Arquivo ao lado de um trecho de uma gravação em partes (ver
+# Deteccao.gravar_da_camera): sessão, número de sequência e início do
+# trecho na sessão, para o servidor montar uma linha do tempo única
+EXTENSAO_SEGMENTO = ".seg.json"
+
+# processar_video escreve aqui e só move para a pasta de saída no fim, para
+# o Envia_Arquivo (que pega qualquer .mp4 da pasta) não ver um vídeo pela metade
+PASTA_PARCIAL = ".parcial"
+
+
+def abrir_video(caminho_video="Entrada.mp4", fps_destino=3):
     """
-    Lê um vídeo do disco, reduz o FPS e redimensiona para tamanho_saida.
-    Retorna a lista de frames e o fps de saída.
+    Abre o vídeo e calcula a redução de FPS.
+    Retorna (cap, fps_saida, frame_step), com cap=None se não abriu.
     """
     cap = cv2.VideoCapture(caminho_video)
 
     if not cap.isOpened():
         print(f"Erro ao abrir o vídeo: {caminho_video}")
-        return [], fps_destino
+        return None, fps_destino, 1
 
     fps_original = cap.get(cv2.CAP_PROP_FPS)
     if fps_original <= 0:
@@ -25,87 +40,73 @@ def carregar_de_video(caminho_video="Entrada.mp4", fps_destino=3, tamanho_saida=
     # de quantos em quantos frames vamos pegar 1 (para baixar o FPS)
     frame_step = max(1, int(round(fps_original / fps_saida)))
 
-    frames = []
-    frame_idx = 0
-
     print(f"Lendo '{caminho_video}' (fps original ≈ {fps_original:.2f}) ...")
+    return cap, fps_saida, frame_step
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
 
-        # pega somente alguns frames para reduzir o fps
-        if frame_idx % frame_step == 0:
-            # redimensiona para 640x640
-            frame_resized = cv2.resize(frame, tamanho_saida)
-            frames.append(frame_resized)
+def ler_frames(cap, frame_step, tamanho_saida=(640, 640)):
+    """
+    Gerador com um frame a cada frame_step, já redimensionado. Os frames
+    pulados só avançam o demuxer (grab), sem decodificar a imagem em BGR.
+    Libera o cap no fim.
+    """
+    frame_idx = 0
+    usados = 0
+    try:
+        while cap.grab():
+            # pega somente alguns frames para reduzir o fps
+            if frame_idx % frame_step == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                usados += 1
+                yield cv2.resize(frame, tamanho_saida)
+            frame_idx += 1
+    finally:
+        cap.release()
+        print(f"Total de frames lidos: {frame_idx}, frames usados: {usados}")
 
-        frame_idx += 1
 
-    cap.release()
-    print(f"Total de frames lidos: {frame_idx}, frames usados: {len(frames)}")
-    return frames, fps_saida
+def carregar_de_video(caminho_video="Entrada.mp4", fps_destino=3, tamanho_saida=(640, 640)):
+    """
+    Lê um vídeo do disco, reduz o FPS e redimensiona para tamanho_saida.
+    Retorna a lista de frames e o fps de saída.
+    Guarda todos os frames em memória; para vídeos longos use
+    processar_video, que não guarda.
+    """
+    cap, fps_saida, frame_step = abrir_video(caminho_video, fps_destino)
+    if cap is None:
+        return [], fps_saida
+    return list(ler_frames(cap, frame_step, tamanho_saida)), fps_saida
+
+
+def marcar_movimento(frames, limiar_pix_diff=25, limiar_qtd_pixels=5000, com_regioes=True,
+                     lado_proxy=movimento.LADO_PROXY):
+    """
+    Gerador: para cada frame, (frame, movimento, regioes), comparando com
+    o frame anterior (ver movimento.marcar). regioes são as caixas de
+    movimento.regioes_de_movimento (None no primeiro frame, que não tem
+    anterior, ou com com_regioes=False).
+    """
+    return movimento.marcar(frames, limiar_pix_diff, limiar_qtd_pixels, com_regioes, lado_proxy)
 
 
 def detectar_frames_com_movimento(frames,
                                   limiar_pix_diff=25,
                                   limiar_qtd_pixels=5000,
                                   min_seq_movimento=3,
-                                  padding=3):
+                                  padding=3,
+                                  regioes=None,
+                                  lado_proxy=movimento.LADO_PROXY,
+                                  workers=movimento.WORKERS):
     """
     Recebe uma lista de frames e devolve uma máscara booleana
     indicando quais frames devem ser mantidos (com movimento).
+    Se regioes for uma lista, recebe as caixas de movimento de cada frame
+    (ver movimento.regioes_de_movimento); o primeiro frame, sem anterior, fica None.
     """
-    if not frames:
-        return []
-
-    motion_flags = []
-    prev_gray = None
-
-    for frame in frames:
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-
-        if prev_gray is None:
-            prev_gray = gray
-            motion_flags.append(False)
-            continue
-
-        frame_delta = cv2.absdiff(prev_gray, gray)
-        _, thresh = cv2.threshold(frame_delta, limiar_pix_diff, 255, cv2.THRESH_BINARY)
-        thresh = cv2.dilate(thresh, None, iterations=2)
-
-        motion_pixels = cv2.countNonZero(thresh)
-
-        motion = motion_pixels > limiar_qtd_pixels
-        motion_flags.append(motion)
-
-        prev_gray = gray
-
-    # Suaviza a máscara para formar trechos contínuos com padding
-    n = len(motion_flags)
-    keep = [False] * n
-    i = 0
-    while i < n:
-        if motion_flags[i]:
-            inicio = i
-            while i < n and motion_flags[i]:
-                i += 1
-            fim = i - 1
-
-            if fim - inicio + 1 >= min_seq_movimento:
-                ks = max(0, inicio - padding)
-                ke = min(n - 1, fim + padding)
-                for j in range(ks, ke + 1):
-                    keep[j] = True
-        else:
-            i += 1
-
-    if not any(keep):
-        keep = [True] * n
-
-    return keep
+    return movimento.detectar_movimento(frames, limiar_pix_diff, limiar_qtd_pixels, min_seq_movimento,
+                                        padding, regioes=regioes, lado_proxy=lado_proxy, workers=workers)
 
 
 def salvar_video_mp4(frames, mask_keep, fps=3, nome_arquivo="saida.mp4"):
@@ -135,26 +136,130 @@ def salvar_video_mp4(frames, mask_keep, fps=3, nome_arquivo="saida.mp4"):
     print(f"Vídeo salvo como {nome_arquivo}. Frames mantidos: {kept_count}, fps={fps}")
 
 
-def main():
-    fps_destino = 3
+def caminho_regioes(caminho_video):
+    return os.path.splitext(caminho_video)[0] + EXTENSAO_REGIOES
 
-    # 1) Carregar o vídeo Entrada.mp4, reduzir FPS e redimensionar para 640x640
-    frames, fps_saida = carregar_de_video("Entrada.mp4",
-                                          fps_destino=fps_destino,
-                                          tamanho_saida=(640, 640))
 
-    if not frames:
-        return
+def caminho_segmento(caminho_video):
+    return os.path.splitext(caminho_video)[0] + EXTENSAO_SEGMENTO
+
+
+def salvar_segmento(sessao, seq, inicio, nome_arquivo):
+    """
+    Grava ao lado do vídeo os dados do trecho: sessão, número de sequência
+    (0, 1, ...) e início do trecho em segundos desde o começo da sessão.
+    """
+    with open(caminho_segmento(nome_arquivo), "w", encoding="utf-8") as f:
+        json.dump({"sessao": sessao, "seq": seq, "inicio": round(inicio, 3)}, f)
+
+
+def salvar_regioes(regioes, mask_keep, tamanho, nome_arquivo="saida.mp4"):
+    """
+    Grava ao lado do vídeo as regiões de movimento dos frames mantidos,
+    na mesma ordem em que eles estão no vídeo.
+    tamanho: (largura, altura) dos frames.
+    """
+    caminho = caminho_regioes(nome_arquivo)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({
+            "tamanho": list(tamanho),
+            "frames": [r for r, keep in zip(regioes, mask_keep) if keep],
+        }, f, separators=(",", ":"))
+    print(f"Regiões de movimento salvas em {caminho}")
+
+
+def _gravar(caminho_video, parcial, parcial_regioes, fps_destino, tamanho_saida,
+            filtrar=True, limiar_pix_diff=25, limiar_qtd_pixels=5000,
+            min_seq_movimento=3, padding=3, lado_proxy=movimento.LADO_PROXY):
+    """
+    Uma passada pelo vídeo: lê, detecta movimento e grava os frames
+    mantidos (e as regiões deles, se parcial_regioes) à medida que saem da
+    janela de movimento.filtrar. Com filtrar=False, grava todos.
+    Retorna (frames usados, frames mantidos).
+    """
+    cap, fps_saida, frame_step = abrir_video(caminho_video, fps_destino)
+    if cap is None:
+        return 0, 0
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # codec MP4
+    out = cv2.VideoWriter(parcial, fourcc, fps_saida, tamanho_saida)
+    f_regioes = open(parcial_regioes, "w", encoding="utf-8") if parcial_regioes else None
+
+    usados = 0
+    mantidos = 0
+    try:
+        if f_regioes:
+            f_regioes.write('{"tamanho":%s,"frames":[' % json.dumps(list(tamanho_saida), separators=(",", ":")))
+
+        marcados = marcar_movimento(ler_frames(cap, frame_step, tamanho_saida),
+                                    limiar_pix_diff, limiar_qtd_pixels, com_regioes=f_regioes is not None,
+                                    lado_proxy=lado_proxy)
+        for frame, regioes, manter in movimento.filtrar(marcados, min_seq_movimento, padding):
+            usados += 1
+            if filtrar and not manter:
+                continue
+            out.write(frame)
+            if f_regioes:
+                f_regioes.write(("," if mantidos else "") + json.dumps(regioes, separators=(",", ":")))
+            mantidos += 1
+
+        if f_regioes:
+            f_regioes.write("]}")
+    finally:
+        out.release()
+        if f_regioes:
+            f_regioes.close()
+    return usados, mantidos
 
-    # 2) Detectar quais frames têm movimento (opcional, pode pular se quiser manter tudo)
-    print("Detectando movimento e filtrando trechos sem nada...")
-    mask_keep = detectar_frames_com_movimento(frames)
 
-    # Se não quiser filtrar por movimento, basta usar:
-    # mask_keep = [True] * len(frames)
+def processar_video(caminho_video="Entrada.mp4", nome_arquivo="saida.mp4", fps_destino=3,
+                    tamanho_saida=(640, 640), com_regioes=True, **parametros_movimento):
+    """
+    Faz o mesmo que carregar_de_video + detectar_frames_com_movimento +
+    salvar_video_mp4 (+ salvar_regioes, se com_regioes), mas em fluxo: cada
+    frame é lido, redimensionado, comparado e gravado sem que o vídeo
+    inteiro fique em memória, então o pico de memória não depende da
+    duração do vídeo. Os frames pulados pela redução de FPS nem são
+    decodificados.
+
+    Se nenhum trecho tiver movimento, o vídeo é lido de novo e gravado
+    inteiro, como em detectar_frames_com_movimento.
+    Retorna (frames usados, frames mantidos).
+    """
+    pasta_parcial = os.path.join(os.path.dirname(nome_arquivo) or ".", PASTA_PARCIAL)
+    os.makedirs(pasta_parcial, exist_ok=True)
+    parcial = os.path.join(pasta_parcial, os.path.basename(nome_arquivo))
+    parcial_regioes = caminho_regioes(parcial) if com_regioes else None
+
+    usados, mantidos = _gravar(caminho_video, parcial, parcial_regioes, fps_destino, tamanho_saida,
+                               **parametros_movimento)
+    if usados and not mantidos:
+        print("Nenhum trecho com movimento; mantendo o vídeo inteiro.")
+        usados, mantidos = _gravar(caminho_video, parcial, parcial_regioes, fps_destino, tamanho_saida,
+                                   filtrar=False, **parametros_movimento)
+
+    if not usados:
+        print("Nenhum frame para salvar.")
+        for caminho in (parcial, parcial_regioes):
+            if caminho and os.path.exists(caminho):
+                os.remove(caminho)
+        return 0, 0
+
+    # Regiões primeiro: quando o .mp4 aparece na pasta, elas já estão ao lado
+    if parcial_regioes:
+        os.replace(parcial_regioes, caminho_regioes(nome_arquivo))
+        print(f"Regiões de movimento salvas em {caminho_regioes(nome_arquivo)}")
+    os.replace(parcial, nome_arquivo)
+    print(f"Vídeo salvo como {nome_arquivo}. Frames mantidos: {mantidos} de {usados}")
+    return usados, mantidos
 
-    # 3) Salvar vídeo de saída
-    salvar_video_mp4(frames, mask_keep, fps=fps_saida, nome_arquivo="saida.mp4")
+
+def main():
+    # Lê Entrada.mp4, reduz o FPS, redimensiona para 640x640, filtra os
+    # trechos sem movimento e salva saida.mp4 com as regiões de movimento
+    # para o servidor, tudo em fluxo (ver processar_video)
+    print("Detectando movimento e filtrando trechos sem nada...")
+    processar_video("Entrada.mp4", "saida.mp4", fps_destino=3, tamanho_saida=(640, 640))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+import os
+import cv2
+import time
+import argparse
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Detecção de movimento dos clientes (Retira_Qualidade e Deteccao).
+# A diferença entre frames é feita numa cópia reduzida de cada frame
+# (proxy, maior lado LADO_PROXY), com o blur e os limiares em pixels
+# ajustados para a escala; as regiões de movimento voltam para as
+# coordenadas do frame. Listas longas são divididas em pedaços, cada um
+# com o frame anterior ao seu início, processados em threads (o OpenCV
+# solta o GIL); como cada frame só depende do anterior, juntar os pedaços
+# dá o mesmo resultado de uma passada só.
+LADO_PROXY = 320        # maior lado da cópia reduzida; None = resolução cheia
+KERNEL_BLUR = 21        # lado do GaussianBlur em resolução cheia
+FRAMES_POR_PEDACO = 64  # frames por tarefa nas threads
+WORKERS = os.cpu_count() or 1
+
+
+def escala_proxy(largura, altura, lado_proxy=LADO_PROXY):
+    """
+    Fator (<= 1) entre o proxy e o frame.
+    """
+    if not lado_proxy:
+        return 1.0
+    return min(1.0, lado_proxy / max(largura, altura))
+
+
+def preparar(frame, escala=1.0):
+    """
+    Frame em cinza, reduzido pela escala e com blur, pronto para comparar.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    kernel = KERNEL_BLUR
+    if escala < 1.0:
+        gray = cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        kernel = max(3, int(round(KERNEL_BLUR * escala)) | 1)
+    return cv2.GaussianBlur(gray, (kernel, kernel), 0)
+
+
+def regioes_de_movimento(thresh, area_min=200, margem=8, escala=1.0):
+    """
+    Caixas [x1, y1, x2, y2] das regiões conectadas de uma máscara de
+    movimento com pelo menos area_min pixels, com margem em volta.
+    Com escala < 1 a máscara é a do proxy: area_min vale em pixels do
+    frame e as caixas voltam para as coordenadas do frame.
+    """
+    h, w = thresh.shape[:2]
+    h, w = int(round(h / escala)), int(round(w / escala))
+    n, _, stats, _ = cv2.connectedComponentsWithStats(thresh)
+    caixas = []
+    for x, y, cw, ch, area in stats[1:n]:
+        if area >= area_min * escala * escala:
+            caixas.append([max(0, int(x / escala) - margem), max(0, int(y / escala) - margem),
+                           min(w, int(round((x + cw) / escala)) + margem),
+                           min(h, int(round((y + ch) / escala)) + margem)])
+    return caixas
+
+
+def marcar(frames, limiar_pix_diff=25, limiar_qtd_pixels=5000, com_regioes=False,
+           lado_proxy=LADO_PROXY, anterior=None):
+    """
+    Gerador: para cada frame, (frame, movimento, regioes), comparando com
+    o frame anterior. limiar_qtd_pixels vale em pixels do frame. anterior
+    é o frame antes do primeiro (ao continuar de outro pedaço); sem ele o
+    primeiro frame sai sem movimento. regioes são as caixas de
+    regioes_de_movimento, ou None no primeiro frame e com com_regioes=False.
+    """
+    escala = None
+    prev = None
+
+    for frame in frames:
+        if escala is None:
+            altura, largura = frame.shape[:2]
+            escala = escala_proxy(largura, altura, lado_proxy)
+            limiar_proxy = limiar_qtd_pixels * escala * escala
+            if anterior is not None:
+                prev = preparar(anterior, escala)
+
+        atual = preparar(frame, escala)
+        if prev is None:
+            prev = atual
+            yield frame, False, None
+            continue
+
+        frame_delta = cv2.absdiff(prev, atual)
+        _, thresh = cv2.threshold(frame_delta, limiar_pix_diff, 255, cv2.THRESH_BINARY)
+        thresh = cv2.dilate(thresh, None, iterations=2)
+
+        # Considera que há movimento se pixels suficientes mudaram
+        movimento = cv2.countNonZero(thresh) > limiar_proxy
+        yield frame, movimento, regioes_de_movimento(thresh, escala=escala) if com_regioes else None
+
+        # Atualiza "background" para próxima comparação
+        prev = atual
+
+
+def mascara_manter(flags, min_seq_movimento=3, padding=3):
+    """
+    Máscara dos frames a manter: trechos com pelo menos min_seq_movimento
+    frames seguidos com movimento, com padding frames antes e depois.
+    """
+    flags = np.asarray(flags, dtype=bool)
+    n = len(flags)
+    bordas = np.diff(np.concatenate(([0], flags.view(np.int8), [0])))
+    inicios = np.flatnonzero(bordas == 1)
+    fins = np.flatnonzero(bordas == -1)  # exclusivo
+    validos = fins - inicios >= min_seq_movimento
+
+    # +1 no começo de cada trecho (com padding), -1 logo depois do fim
+    contagem = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(contagem, np.maximum(inicios[validos] - padding, 0), 1)
+    np.add.at(contagem, np.minimum(fins[validos] + padding, n), -1)
+    return np.cumsum(contagem[:n]) > 0
+
+
+def filtrar(marcados, min_seq_movimento=3, padding=3):
+    """
+    Gerador: recebe (frame, movimento, regioes) em ordem (ver marcar) e
+    devolve (frame, regioes, manter) para cada frame, com a mesma regra de
+    mascara_manter, mas sem ter o vídeo inteiro.
+
+    Só os últimos padding + min_seq_movimento frames ficam em memória:
+    um frame sai da janela quando nenhum trecho que ainda pode ser
+    confirmado alcança ele.
+    """
+    atraso = padding + min_seq_movimento - 1
+    janela = deque()   # [indice, frame, regioes, manter]
+    seguidos = 0       # frames seguidos com movimento até o atual
+    manter_ate = -1    # último índice coberto pelo padding de um trecho confirmado
+
+    for indice, (frame, movimento, regioes) in enumerate(marcados):
+        janela.append([indice, frame, regioes, indice <= manter_ate])
+        seguidos = seguidos + 1 if movimento else 0
+
+        if seguidos >= min_seq_movimento:
+            # Trecho confirmado: do padding antes dele até o frame atual
+            inicio = indice - seguidos + 1 - padding
+            for item in janela:
+                if item[0] >= inicio:
+                    item[3] = True
+            manter_ate = indice + padding
+
+        while len(janela) > atraso:
+            _, frame_saida, regioes_saida, manter = janela.popleft()
+            yield frame_saida, regioes_saida, manter
+
+    while janela:
+        _, frame_saida, regioes_saida, manter = janela.popleft()
+        yield frame_saida, regioes_saida, manter
+
+
+def _marcar_pedaco(frames, inicio, fim, parametros):
+    anterior = frames[inicio - 1] if inicio > 0 else None
+    return [(m, r) for _, m, r in marcar(frames[inicio:fim], anterior=anterior, **parametros)]
+
+
+def detectar_movimento(frames,
+                       limiar_pix_diff=25,
+                       limiar_qtd_pixels=5000,
+                       min_seq_movimento=3,
+                       padding=3,
+                       regioes=None,
+                       lado_proxy=LADO_PROXY,
+                       workers=WORKERS):
+    """
+    Recebe uma lista de frames e devolve uma máscara booleana (lista)
+    indicando quais frames devem ser mantidos (com movimento). Se nada
+    tiver movimento, mantém tudo.
+    Se regioes for uma lista, recebe as caixas de movimento de cada frame
+    (o primeiro, sem anterior, fica None).
+    """
+    if not len(frames):
+        return []
+
+    parametros = {"limiar_pix_diff": limiar_pix_diff, "limiar_qtd_pixels": limiar_qtd_pixels,
+                  "com_regioes": regioes is not None, "lado_proxy": lado_proxy}
+    limites = [(i, min(i + FRAMES_POR_PEDACO, len(frames))) for i in range(0, len(frames), FRAMES_POR_PEDACO)]
+    if workers > 1 and len(limites) > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            pedacos = list(executor.map(lambda l: _marcar_pedaco(frames, *l, parametros), limites))
+    else:
+        pedacos = [_marcar_pedaco(frames, *l, parametros) for l in limites]
+
+    marcados = [item for pedaco in pedacos for item in pedaco]
+    if regioes is not None:
+        regioes.extend(r for _, r in marcados)
+
+    keep = mascara_manter([m for m, _ in marcados], min_seq_movimento, padding)
+    if not keep.any():
+        keep[:] = True
+    return keep.tolist()
+
+
+def _frames_sinteticos(largura, altura, total, seed=0):
+    """
+    Frames com dois retângulos que andam, param no meio e voltam a andar.
+    """
+    rng = np.random.default_rng(seed)
+    lado = min(largura, altura) // 6
+    pos = rng.uniform(0, [largura - lado, altura - lado], size=(2, 2))
+    vel = rng.uniform(0.01, 0.03, size=(2, 2)) * [largura, altura]
+    frames = []
+    for n in range(total):
+        frame = np.full((altura, largura, 3), 40, dtype=np.uint8)
+        if not 0.4 <= n / total < 0.6:
+            pos += vel
+            for k in range(2):
+                for e, limite in enumerate((largura - lado, altura - lado)):
+                    if not 0 <= pos[k, e] <= limite:
+                        vel[k, e] *= -1
+                        pos[k, e] = min(max(pos[k, e], 0), limite)
+        for (x, y), cor in zip(pos.astype(int), ((0, 0, 220), (0, 200, 0))):
+            cv2.rectangle(frame, (x, y), (x + lado, y + lado), cor, -1)
+        frames.append(frame)
+    return frames
+
+
+def benchmark(resolucoes=((640, 640), (1920, 1080)), total=300, lado_proxy=LADO_PROXY,
+              workers=WORKERS, repeticoes=3):
+    """
+    Compara a detecção em resolução cheia e um frame por vez (o jeito
+    anterior) com o proxy e com o proxy em threads, em frames sintéticos.
+    """
+    modos = [
+        ("cheia, 1 thread", {"lado_proxy": None, "workers": 1}),
+        (f"proxy {lado_proxy}, 1 thread", {"lado_proxy": lado_proxy, "workers": 1}),
+    ]
+    if workers > 1:
+        modos.append((f"proxy {lado_proxy}, {workers} threads", {"lado_proxy": lado_proxy, "workers": workers}))
+    resultado = {}
+    for largura, altura in resolucoes:
+        frames = _frames_sinteticos(largura, altura, total)
+        referencia = None
+        print(f"\n[BENCH] {total} frames {largura}x{altura}")
+        print(f"{'modo':<24} {'ms/frame':>9} {'ganho':>6} {'máscara igual':>14}")
+        for nome, opcoes in modos:
+            melhor = float("inf")
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                keep = detectar_movimento(frames, **opcoes)
+                melhor = min(melhor, time.perf_counter() - inicio)
+            if referencia is None:
+                referencia, tempo_referencia = keep, melhor
+            iguais = sum(a == b for a, b in zip(keep, referencia)) / len(keep)
+            print(f"{nome:<24} {1000 * melhor / total:>9.2f} {tempo_referencia / melhor:>5.2f}x {iguais:>14.1%}")
+            resultado[f"{largura}x{altura} {nome}"] = {"ms_por_frame": 1000 * melhor / total,
+                                                     "mascara_igual": iguais}
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detecção de movimento dos clientes.")
+    parser.add_argument("--benchmark", action="store_true", help="compara os modos em frames sintéticos")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--lado-proxy", type=int, default=LADO_PROXY)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(total=args.frames, lado_proxy=args.lado_proxy, workers=args.workers)
+    else:
+        parser.print_help()
@@ -0,0 +1,425 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import platform
+import argparse
+import threading
+import contextlib
+import queue
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # resource não existe no Windows: o pico de memória não é medido
+    resource = None
+
+# Benchmark de ponta a ponta com vídeos sintéticos:
+#   Retira_Qualidade -> Envia_Arquivo -> HTTP_listener -> fila de jobs ->
+#   Ativa_Yolo (recognize + análise da cena + jogadas) -> modelo de linguagem (stub)
+# Tudo roda localmente; o resultado vai para um JSON comparável entre execuções.
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+PASTA_SERVIDOR = os.path.join(RAIZ, "Yolo_Server")
+PASTA_CLIENTE = os.path.join(RAIZ, "Yolo_client")
+
+# Formas sintéticas: cor BGR por classe (Rock, Paper, Scissors)
+CORES = [(0, 0, 255), (0, 255, 0), (255, 0, 0)]
+NOMES = {0: "Rock", 1: "Paper", 2: "Scissors"}
+FUNDO = 128
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def gerar_video(caminho, largura=640, altura=480, fps=30, duracao=10.0, objetos=3, seed=0):
+    """
+    Grava um MP4 com `objetos` formas coloridas (retângulo vermelho, elipse
+    verde, triângulo azul) que quicam pela tela. Entre 40% e 60% da duração
+    as formas ficam paradas, para o filtro de movimento ter o que cortar.
+    """
+    rng = random.Random(seed)
+    lado = max(16, min(largura, altura) // 6)
+    formas = []
+    for i in range(objetos):
+        formas.append({
+            "cls": i % 3,
+            "x": rng.uniform(0, largura - lado),
+            "y": rng.uniform(0, altura - lado),
+            "vx": rng.choice([-1, 1]) * rng.uniform(0.1, 0.3) * largura / fps,
+            "vy": rng.choice([-1, 1]) * rng.uniform(0.1, 0.3) * altura / fps,
+        })
+
+    out = cv2.VideoWriter(caminho, cv2.VideoWriter_fourcc(*"mp4v"), fps, (largura, altura))
+    total = int(round(duracao * fps))
+    for n in range(total):
+        frame = np.full((altura, largura, 3), FUNDO, dtype=np.uint8)
+        parado = 0.4 <= n / total < 0.6
+
+        for forma in formas:
+            if not parado:
+                forma["x"] += forma["vx"]
+                forma["y"] += forma["vy"]
+                if not 0 <= forma["x"] <= largura - lado:
+                    forma["vx"] *= -1
+                    forma["x"] = min(max(forma["x"], 0), largura - lado)
+                if not 0 <= forma["y"] <= altura - lado:
+                    forma["vy"] *= -1
+                    forma["y"] = min(max(forma["y"], 0), altura - lado)
+
+            x, y = int(forma["x"]), int(forma["y"])
+            cor = CORES[forma["cls"]]
+            if forma["cls"] == 0:
+                cv2.rectangle(frame, (x, y), (x + lado, y + lado), cor, -1)
+            elif forma["cls"] == 1:
+                cv2.ellipse(frame, (x + lado // 2, y + lado // 2), (lado // 2, lado // 3), 0, 0, 360, cor, -1)
+            else:
+                pontos = np.array([[x + lado // 2, y], [x, y + lado], [x + lado, y + lado]], dtype=np.int32)
+                cv2.fillPoly(frame, [pontos], cor)
+
+        out.write(frame)
+    out.release()
+    return total
+
+
+class _Caixa:
+    def __init__(self, x1, y1, x2, y2, obj_id, conf, cls):
+        self.xyxy = [(x1, y1, x2, y2)]
+        self.id = [obj_id]
+        self.conf = [conf]
+        self.cls = [cls]
+
+
+class _Caixas(list):
+    @property
+    def id(self):
+        return [c.id[0] for c in self] if self else None
+
+
+class _Resultado:
+    def __init__(self, caixas):
+        self.boxes = _Caixas(caixas)
+
+
+class _TrackerStub:
+    """
+    Associa cada forma à trilha mais próxima da mesma classe no frame anterior.
+    """
+
+    def __init__(self, distancia_max=80):
+        self.distancia_max = distancia_max
+        self.reset()
+
+    def reset(self):
+        self.trilhas = {}  # id -> (cls, cx, cy)
+        self.proximo_id = 1
+
+    def atualizar(self, deteccoes):
+        livres = dict(self.trilhas)
+        novas = {}
+        caixas = []
+        for cls, x1, y1, x2, y2 in deteccoes:
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            melhor = None
+            for obj_id, (c, tx, ty) in livres.items():
+                d = abs(cx - tx) + abs(cy - ty)
+                if c == cls and d <= self.distancia_max and (melhor is None or d < melhor[0]):
+                    melhor = (d, obj_id)
+            if melhor is None:
+                obj_id = self.proximo_id
+                self.proximo_id += 1
+            else:
+                obj_id = melhor[1]
+                del livres[obj_id]
+            novas[obj_id] = (cls, cx, cy)
+            caixas.append(_Caixa(x1, y1, x2, y2, obj_id, 1.0, cls))
+        self.trilhas = novas
+        return caixas
+
+
+class DetectorStub:
+    """
+    Substitui o YOLO no benchmark: acha as formas sintéticas por cor
+    (limiar + componentes conexos) e dá IDs com um tracker de centróide.
+    Tem a interface que o track_yolo usa (names, predictor.trackers, track()).
+    """
+
+    def __init__(self, area_min=100):
+        self.names = dict(NOMES)
+        self.area_min = area_min
+        self.predictor = type("PredictorStub", (), {})()
+        self.predictor.trackers = [_TrackerStub()]
+
+    def _detectar(self, frame):
+        deteccoes = []
+        for cls, cor in enumerate(CORES):
+            baixo = np.array([max(0, c - 70) for c in cor], dtype=np.uint8)
+            alto = np.array([min(255, c + 70) for c in cor], dtype=np.uint8)
+            mascara = cv2.inRange(frame, baixo, alto)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mascara)
+            for x, y, w, h, area in stats[1:n]:
+                if area >= self.area_min:
+                    deteccoes.append((cls, int(x), int(y), int(x + w), int(y + h)))
+        return deteccoes
+
+    def track(self, frames, **_):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        tracker = self.predictor.trackers[0]
+        return [_Resultado(tracker.atualizar(self._detectar(frame))) for frame in frames]
+
+
+def _percentis(valores):
+    if not valores:
+        return {"n": 0}
+    v = np.asarray(valores, dtype=np.float64)
+    return {
+        "n": int(v.size),
+        "media": float(v.mean()),
+        "p50": float(np.percentile(v, 50)),
+        "p95": float(np.percentile(v, 95)),
+        "p99": float(np.percentile(v, 99)),
+    }
+
+
+def _pico_rss_mb():
+    if resource is None:
+        return None
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return max(proprio, filhos) / divisor
+
+
+@contextlib.contextmanager
+def _silencio(ativo):
+    if not ativo:
+        yield
+        return
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+def executar(args):
+    pasta = os.path.abspath(args.pasta)
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.makedirs(os.path.join(pasta, "sinteticos"))
+    os.makedirs(os.path.join(pasta, "envio"))
+
+    # Serviços locais em portas livres; precisa vir antes de importar os módulos
+    porta_http = _porta_livre()
+    porta_stub = _porta_livre()
+    os.environ["FILA_JOBS_PORTA"] = str(_porta_livre())
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{porta_stub}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["CACHE_LLM_PASTA"] = os.path.join(pasta, "cache_llm")
+    os.environ["MODO_ANALISE"] = "local"
+
+    os.chdir(pasta)
+    sys.path[:0] = [PASTA_SERVIDOR, PASTA_CLIENTE]
+
+    import Retira_Qualidade
+    import Envia_Arquivo
+    import HTTP_listener
+    import Ativa_Yolo
+    import stub_llm
+    from fila_jobs import iniciar_servidor_jobs
+    from api_gpt import enviar_para_llm
+    from track_yolo import carregar_modelo
+    from werkzeug.serving import make_server
+
+    servidor_http = make_server("127.0.0.1", porta_http, HTTP_listener.app, threaded=True)
+    threading.Thread(target=servidor_http.serve_forever, daemon=True).start()
+    Envia_Arquivo.URL_DESTINO = f"http://127.0.0.1:{porta_http}/upload"
+
+    fila = queue.Queue()
+    iniciar_servidor_jobs(fila, HTTP_listener.UPLOAD_FOLDER)
+
+    stub = None
+    if not args.sem_llm:
+        stub = stub_llm.iniciar_stub(stub_llm.ConfigStub(latencia=args.latencia_llm, jitter=0.0),
+                                     porta=porta_stub)
+
+    # Vídeos gerados antes de medir (e usados na calibração INT8, se pedida)
+    largura, altura = (int(v) for v in args.resolucao.lower().split("x"))
+    brutos = []
+    for n in range(args.videos):
+        brutos.append(os.path.join(pasta, "sinteticos", f"video_{n}.mp4"))
+        gerar_video(brutos[-1], largura, altura, args.fps, args.duracao, args.objetos, seed=n)
+
+    if args.modelo:
+        Ativa_Yolo._modelo = carregar_modelo(args.modelo, backend=args.backend, int8=args.int8,
+                                             calibracao=brutos)
+    else:
+        Ativa_Yolo._modelo = DetectorStub()
+    if args.sem_cache or not args.modelo:
+        # O cache avança o tracker do Ultralytics, que o stub não tem
+        Ativa_Yolo.CACHE_FRAMES = None
+
+    tempos = {nome: [] for nome in (
+        "retira_qualidade", "upload", "espera_job", "tracking", "cena", "jogadas", "llm", "total",
+    )}
+    por_frame = {"decode": [], "inferencia": [], "registro": []}
+    frames_servidor = 0
+    bytes_enviados = 0
+
+    inicio_total = time.perf_counter()
+    for n, bruto in enumerate(brutos):
+        with _silencio(not args.verboso):
+            inicio_video = time.perf_counter()
+
+            marca = time.perf_counter()
+            saida = os.path.join(pasta, "envio", f"saida_{n}.mp4")
+            Retira_Qualidade.processar_video(bruto, saida, fps_destino=args.fps_cliente, com_regioes=args.roi)
+            tempos["retira_qualidade"].append(time.perf_counter() - marca)
+
+            bytes_enviados += os.path.getsize(saida)
+            marca = time.perf_counter()
+            if not Envia_Arquivo.enviar_arquivo(saida):
+                raise RuntimeError(f"Upload falhou: {saida}")
+            tempos["upload"].append(time.perf_counter() - marca)
+
+            mensagem = fila.get(timeout=30)
+            tempos["espera_job"].append(time.time() - mensagem["pronto_em"])
+
+            resumo = Ativa_Yolo.processar_job(Ativa_Yolo.preparar_job(mensagem["video"]))
+            for nome, valor in resumo["tempos"].items():
+                tempos[nome].append(valor)
+
+            estatisticas = resumo["estatisticas"]
+            frames_servidor += estatisticas["frames_decodificados"]
+            for nome, chave in (("decode", "decode"), ("inferencia", "inferência"), ("registro", "registro")):
+                estagio = estatisticas["estagios"][chave]
+                if estagio["frames"]:
+                    por_frame[nome].append(estagio["tempo"] / estagio["frames"])
+
+            if stub is not None:
+                marca = time.perf_counter()
+                enviar_para_llm(resumo["cena"]).result()
+                tempos["llm"].append(time.perf_counter() - marca)
+
+            tempos["total"].append(time.perf_counter() - inicio_video)
+
+        print(f"[BENCH] vídeo {n + 1}/{args.videos}: {tempos['total'][-1]:.2f}s "
+              f"({estatisticas['frames_decodificados']} frames no servidor)")
+
+    tempo_total = time.perf_counter() - inicio_total
+    servidor_http.shutdown()
+    if stub is not None:
+        stub.shutdown()
+
+    return {
+        "config": {
+            "videos": args.videos,
+            "resolucao": args.resolucao,
+            "fps": args.fps,
+            "duracao": args.duracao,
+            "objetos": args.objetos,
+            "fps_cliente": args.fps_cliente,
+            "detector": args.modelo or "stub",
+            "backend": f"{args.backend}{' int8' if args.int8 else ''}" if args.modelo else None,
+            "roi": args.roi,
+            "cache_frames": Ativa_Yolo.CACHE_FRAMES is not None,
+            "llm": None if args.sem_llm else f"stub ({args.latencia_llm}s)",
+        },
+        "ambiente": {
+            "python": platform.python_version(),
+            "sistema": platform.platform(),
+            "cpus": os.cpu_count(),
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resultado": {
+            "tempo_total": tempo_total,
+            "videos_por_s": args.videos / tempo_total,
+            "frames_por_s": frames_servidor / tempo_total,
+            "mb_enviados": bytes_enviados / 1024 / 1024,
+            "pico_rss_mb": _pico_rss_mb(),
+            "estagios_s": {nome: _percentis(v) for nome, v in tempos.items()},
+            "por_frame_s": {nome: _percentis(v) for nome, v in por_frame.items()},
+        },
+    }
+
+
+def imprimir(resultado):
+    r = resultado["resultado"]
+    print(f"\n{resultado['config']}")
+    print(f"{r['videos_por_s']:.3f} vídeos/s | {r['frames_por_s']:.1f} frames/s | "
+          f"pico RSS {r['pico_rss_mb'] or 0:.0f} MB | {r['tempo_total']:.2f}s no total")
+    for grupo, unidade, escala in (("estagios_s", "ms", 1000), ("por_frame_s", "ms/frame", 1000)):
+        for nome, p in r[grupo].items():
+            if p["n"]:
+                print(f"  {nome:17s} p50 {p['p50'] * escala:9.2f} | p95 {p['p95'] * escala:9.2f} | "
+                      f"p99 {p['p99'] * escala:9.2f} {unidade}")
+
+
+def comparar(atual, caminho_anterior):
+    """
+    Mostra a variação das métricas principais em relação a um resultado anterior.
+    """
+    with open(caminho_anterior, "r", encoding="utf-8") as f:
+        anterior = json.load(f)["resultado"]
+    atual = atual["resultado"]
+
+    def linha(nome, a, b, maior_melhor):
+        if not a or not b:
+            return
+        razao = b / a
+        pior = razao < 1 if maior_melhor else razao > 1
+        aviso = "  <-- pior" if pior and abs(razao - 1) > 0.1 else ""
+        print(f"  {nome:30s} {a:10.3f} -> {b:10.3f} ({razao:5.2f}x){aviso}")
+
+    print(f"\nComparado com {caminho_anterior}:")
+    linha("vídeos/s", anterior["videos_por_s"], atual["videos_por_s"], True)
+    linha("frames/s", anterior["frames_por_s"], atual["frames_por_s"], True)
+    linha("pico RSS (MB)", anterior["pico_rss_mb"], atual["pico_rss_mb"], False)
+    for grupo in ("estagios_s", "por_frame_s"):
+        for nome, p in atual[grupo].items():
+            antes = anterior.get(grupo, {}).get(nome, {})
+            if p.get("n") and antes.get("n"):
+                linha(f"{nome} p95", antes["p95"], p["p95"], False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta com vídeos sintéticos.")
+    parser.add_argument("--videos", type=int, default=5)
+    parser.add_argument("--resolucao", default="640x480")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos por vídeo")
+    parser.add_argument("--objetos", type=int, default=3)
+    parser.add_argument("--fps-cliente", type=int, default=3, help="fps_destino do Retira_Qualidade")
+    parser.add_argument("--modelo", help="pesos do YOLO; sem isso usa o detector stub por cor")
+    parser.add_argument("--backend", default="pytorch", choices=("pytorch", "onnx", "openvino"),
+                        help="backend do --modelo (ver Yolo_Server/exportar_modelo.py)")
+    parser.add_argument("--int8", action="store_true", help="modelo exportado em INT8, calibrado com os vídeos gerados")
+    parser.add_argument("--roi", action="store_true",
+                        help="cliente manda as regiões de movimento e o --modelo roda só nelas")
+    parser.add_argument("--sem-cache", action="store_true", help="desliga o cache de frames quase iguais do servidor")
+    parser.add_argument("--sem-llm", action="store_true", help="não chama o stub do modelo de linguagem")
+    parser.add_argument("--latencia-llm", type=float, default=0.5)
+    parser.add_argument("--pasta", default="./bench_pipeline", help="pasta de trabalho (apagada no início)")
+    parser.add_argument("--saida", default="bench_pipeline.json")
+    parser.add_argument("--comparar", metavar="ANTERIOR.json", help="resultado anterior para comparar")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída de cada estágio")
+    args = parser.parse_args()
+    if args.roi and not args.modelo:
+        parser.error("--roi precisa de --modelo")
+
+    saida = os.path.abspath(args.saida)
+    anterior = os.path.abspath(args.comparar) if args.comparar else None
+
+    resultado = executar(args)
+    imprimir(resultado)
+
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado salvo em {saida}")
+
+    if anterior:
+        comparar(resultado, anterior)
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import shutil
+import hashlib
+import argparse
+import threading
+import contextlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmark dos envios do cliente (Envia_Arquivo) contra um HTTP_listener
+# local, através de um proxy TCP que derruba conexões no meio do envio:
+#   simples     -> um POST /upload por vídeo, um de cada vez; uma queda
+#                  recomeça o vídeo do zero (como antes)
+#   retomável   -> PUTs em pedaços em /uploads, continuando de onde parou
+#   paralelo    -> o retomável com vários vídeos ao mesmo tempo
+# O proxy também limita a banda de cada conexão (como num link real, em
+# que uma conexão sozinha não enche o caminho); em localhost sem limite o
+# tempo é só de CPU e disco.
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+PASTA_SERVIDOR = os.path.join(RAIZ, "Yolo_Server")
+PASTA_CLIENTE = os.path.join(RAIZ, "Yolo_client")
+MB = 1024 * 1024
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def _silencio(ativo):
+    if not ativo:
+        yield
+        return
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+class ProxyComFalhas:
+    """
+    Proxy TCP entre o cliente e o servidor que limita a banda de cada
+    conexão (banda bytes/s, 0 = sem limite) e derruba conexões no meio do
+    envio, em média uma vez a cada 1 / taxa_falhas MB enviados ao servidor.
+    """
+
+    def __init__(self, destino, taxa_falhas, banda, seed=0):
+        self.destino = destino
+        self.taxa_falhas = taxa_falhas
+        self.banda = banda
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.zerar()
+        self.socket = socket.create_server(("127.0.0.1", 0))
+        self.porta = self.socket.getsockname()[1]
+        threading.Thread(target=self._aceitar, daemon=True).start()
+
+    def zerar(self):
+        """
+        Zera as contagens e volta a mesma sequência de quedas, para que
+        todos os modos enfrentem as mesmas falhas.
+        """
+        with self.lock:
+            self.contagem = {"bytes": 0, "conexoes": 0, "quedas": 0}
+            self.rng = random.Random(self.seed)
+
+    def _aceitar(self):
+        while True:
+            cliente, _ = self.socket.accept()
+            threading.Thread(target=self._atender, args=(cliente,), daemon=True).start()
+
+    @staticmethod
+    def _fechar(*conexoes):
+        for conexao in conexoes:
+            with contextlib.suppress(OSError):
+                conexao.shutdown(socket.SHUT_RDWR)
+            conexao.close()
+
+    def _respostas(self, servidor, cliente):
+        with contextlib.suppress(OSError):
+            while True:
+                dados = servidor.recv(64 * 1024)
+                if not dados:
+                    break
+                cliente.sendall(dados)
+        self._fechar(cliente, servidor)
+
+    def _atender(self, cliente):
+        servidor = socket.create_connection(self.destino)
+        with self.lock:
+            self.contagem["conexoes"] += 1
+            falha_em = int(self.rng.expovariate(self.taxa_falhas) * MB) if self.taxa_falhas else None
+        threading.Thread(target=self._respostas, args=(servidor, cliente), daemon=True).start()
+
+        enviados = 0
+        inicio = time.perf_counter()
+        with contextlib.suppress(OSError):
+            while True:
+                dados = cliente.recv(64 * 1024)
+                if not dados:
+                    break
+                if falha_em is not None and enviados + len(dados) > falha_em:
+                    servidor.sendall(dados[:falha_em - enviados])
+                    with self.lock:
+                        self.contagem["bytes"] += falha_em - enviados
+                        self.contagem["quedas"] += 1
+                    break
+                servidor.sendall(dados)
+                enviados += len(dados)
+                with self.lock:
+                    self.contagem["bytes"] += len(dados)
+                if self.banda:
+                    atraso = enviados / self.banda - (time.perf_counter() - inicio)
+                    if atraso > 0:
+                        time.sleep(atraso)
+        self._fechar(cliente, servidor)
+
+
+def _md5(caminho):
+    h = hashlib.md5()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(MB), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def executar(args):
+    pasta = os.path.abspath(args.pasta)
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.makedirs(os.path.join(pasta, "envio"))
+
+    porta_http = _porta_livre()
+    os.environ["FILA_JOBS_PORTA"] = str(_porta_livre())
+    os.chdir(pasta)
+    sys.path[:0] = [PASTA_SERVIDOR, PASTA_CLIENTE]
+
+    import Envia_Arquivo
+    import HTTP_listener
+    from fila_jobs import iniciar_servidor_jobs
+
+    # O servidor de desenvolvimento do Flask fecha a conexão a cada
+    # resposta; o waitress (o de produção) mantém aberta
+    if HTTP_listener.serve is not None and not args.werkzeug:
+        from waitress import create_server
+        servidor_http = create_server(HTTP_listener.app, host="127.0.0.1", port=porta_http, threads=16,
+                                      **HTTP_listener.OPCOES_WAITRESS)
+        threading.Thread(target=servidor_http.run, daemon=True).start()
+    else:
+        from werkzeug.serving import make_server
+        servidor_http = make_server("127.0.0.1", porta_http, HTTP_listener.app, threaded=True)
+        threading.Thread(target=servidor_http.serve_forever, daemon=True).start()
+    iniciar_servidor_jobs(queue.Queue())  # os jobs não são processados aqui
+
+    proxy = ProxyComFalhas(("127.0.0.1", porta_http), args.taxa_falhas, args.banda * MB, seed=args.seed)
+    url_simples = f"http://127.0.0.1:{proxy.porta}/upload"
+    url_uploads = f"http://127.0.0.1:{proxy.porta}/uploads"
+    Envia_Arquivo.TAMANHO_PEDACO = args.pedaco * MB
+
+    rng = random.Random(args.seed)
+    originais = {}
+    for n in range(args.videos):
+        dados = rng.randbytes(int(args.tamanho * MB))
+        originais[f"video_{n}"] = hashlib.md5(dados).hexdigest()
+        with open(os.path.join(pasta, f"video_{n}.mp4"), "wb") as f:
+            f.write(dados)
+    total = args.videos * int(args.tamanho * MB)
+
+    def simples(caminho):
+        # Como o monitor antes: cada falha recomeça o vídeo do zero
+        for tentativa in range(args.max_tentativas):
+            if Envia_Arquivo.enviar_arquivo(caminho, url_simples):
+                return True
+            time.sleep(Envia_Arquivo.espera_tentativa(tentativa))
+        return False
+
+    def retomavel(caminho):
+        for _ in range(args.max_tentativas):
+            if Envia_Arquivo.enviar_retomavel(caminho, url_uploads):
+                return True
+        return False
+
+    modos = [
+        ("simples, 1 por vez", simples, 1),
+        ("retomável, 1 por vez", retomavel, 1),
+        (f"retomável, {args.envios} por vez", retomavel, args.envios),
+    ]
+    resultado = {}
+    for nome, enviar, envios in modos:
+        envio = os.path.join(pasta, "envio")
+        shutil.rmtree(envio)
+        os.makedirs(envio)
+        caminhos = []
+        for video in originais:
+            caminhos.append(os.path.join(envio, f"{video}.mp4"))
+            shutil.copyfile(os.path.join(pasta, f"{video}.mp4"), caminhos[-1])
+        shutil.rmtree(HTTP_listener.UPLOAD_FOLDER, ignore_errors=True)
+        os.makedirs(HTTP_listener.UPLOAD_FOLDER)
+        # Cada modo começa sem conexões abertas
+        if Envia_Arquivo._sessao is not None:
+            Envia_Arquivo._sessao.close()
+            Envia_Arquivo._sessao = None
+        Envia_Arquivo.sessao_http(envios)
+        proxy.zerar()
+
+        inicio = time.perf_counter()
+        with _silencio(not args.verboso):
+            if envios == 1:
+                oks = [enviar(caminho) for caminho in caminhos]
+            else:
+                with ThreadPoolExecutor(envios) as executor:
+                    oks = list(executor.map(enviar, caminhos))
+        duracao = time.perf_counter() - inicio
+
+        # Confere que cada vídeo chegou inteiro, byte a byte
+        recebidos = {}
+        for entrada in os.scandir(HTTP_listener.UPLOAD_FOLDER):
+            if entrada.is_file() and entrada.name.endswith(".mp4"):
+                recebidos[entrada.name.rsplit("_", 1)[0]] = _md5(entrada.path)
+        integros = sum(recebidos.get(video) == md5 for video, md5 in originais.items())
+
+        resultado[nome] = {
+            "tempo_s": duracao,
+            "mb_por_s": total / MB / duracao,
+            "bytes_enviados_por_byte_util": proxy.contagem["bytes"] / total,
+            "conexoes": proxy.contagem["conexoes"],
+            "quedas": proxy.contagem["quedas"],
+            "enviados": sum(oks),
+            "integros": integros,
+        }
+
+    return {
+        "config": {"videos": args.videos, "tamanho_mb": args.tamanho, "pedaco_mb": args.pedaco,
+                   "banda_mb_s_por_conexao": args.banda, "quedas_por_mb": args.taxa_falhas,
+                   "servidor": type(servidor_http).__module__.split(".")[0], "cpus": os.cpu_count()},
+        "resultado": resultado,
+    }
+
+
+def imprimir(resultado):
+    c = resultado["config"]
+    print(f"\n[BENCH] {c['videos']} vídeos de {c['tamanho_mb']} MB, pedaços de {c['pedaco_mb']} MB, "
+          f"{c['banda_mb_s_por_conexao']} MB/s por conexão, {c['quedas_por_mb']} quedas/MB, "
+          f"servidor {c['servidor']}, {c['cpus']} CPU(s)")
+    print(f"{'modo':<22} {'tempo':>7} {'MB/s':>6} {'enviado':>8} {'conexões':>9} {'quedas':>7} {'íntegros':>9}")
+    for nome, r in resultado["resultado"].items():
+        print(f"{nome:<22} {r['tempo_s']:>6.1f}s {r['mb_por_s']:>6.2f} "
+              f"{r['bytes_enviados_por_byte_util']:>7.2f}x {r['conexoes']:>9} "
+              f"{r['quedas']:>7} {r['integros']:>5}/{c['videos']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dos envios com quedas de conexão injetadas.")
+    parser.add_argument("--videos", type=int, default=8)
+    parser.add_argument("--tamanho", type=float, default=24, help="MB por vídeo")
+    parser.add_argument("--pedaco", type=int, default=8, help="MB por PUT no envio retomável")
+    parser.add_argument("--envios", type=int, default=4, help="uploads ao mesmo tempo no modo paralelo")
+    parser.add_argument("--banda", type=float, default=20, help="MB/s por conexão (0 = sem limite)")
+    parser.add_argument("--taxa-falhas", type=float, default=0.02,
+                        help="quedas por MB recebido (0.02 = uma a cada 50 MB, em média)")
+    parser.add_argument("--max-tentativas", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--werkzeug", action="store_true",
+                        help="servidor do Flask em vez do waitress (recebe o corpo aos poucos, mas sem keep-alive)")
+    parser.add_argument("--pasta", default="./bench_upload", help="pasta de trabalho (apagada no início)")
+    parser.add_argument("--saida", help="grava o resultado neste JSON")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída do Envia_Arquivo")
+    args = parser.parse_args()
+
+    saida = os.path.abspath(args.saida) if args.saida else None
+    resultado = executar(args)
+    imprimir(resultado)
+    if saida:
+        with open(saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado salvo em {saida}")